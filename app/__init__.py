@@ -1,3 +1,9 @@
+import os
+import threading
+import time
+import click
+from contextlib import contextmanager
+from importlib import import_module
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -5,18 +11,55 @@ from flask_jwt_extended import JWTManager
 from flask_marshmallow import Marshmallow
 from flask_cors import CORS
 from app.config import get_config
+from app.common.services.db_routing_service import RoutingSession
 from datetime import timedelta
 
 # Initialisation des extensions
-db = SQLAlchemy()
+# Session routant les lectures des requêtes GET vers les réplicas (SQLALCHEMY_BINDS)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 ma = Marshmallow()
 
+# Blueprints de l'application : (module, attribut, préfixe d'URL, optionnel)
+# Un blueprint optionnel dont le module est absent est ignoré
+BLUEPRINTS = (
+    # Blueprints communs
+    ('app.common.routes.health', 'health_bp', '/api/health', False),
+    ('app.common.routes.auth', 'auth_bp', '/api/auth', False),
+    ('app.common.routes.roles', 'role_bp', '/api/roles', False),
+    ('app.common.routes.permissions', 'permission_bp', '/api/permissions', False),
+    ('app.common.routes.permission_page', 'permission_page_bp', '/api/permissions_page', False),
+    ('app.common.routes.fonctions_api', 'fonction_api_bp', '/api/fonctions_api', False),
+    ('app.common.routes.trace', 'trace_bp', '/api/traces', False),
+    ('app.common.routes.page', 'page_bp', '/api/pages', False),
+    ('app.common.routes.application', 'application_bp', '/api/applications', False),
+    ('app.common.routes.entite', 'entite_bp', '/api/entites', False),
+    ('app.common.routes.utilisateur', 'utilisateur_bp', '/api/utilisateurs', False),
+    ('app.common.routes.blacklist', 'blacklist_bp', '/api/blacklist', False),
+    ('app.common.routes.codification', 'codification_bp', '/api/codifications', False),
+    ('app.common.routes.settings', 'settings_bp', '/api/settings', False),
+    ('app.common.routes.objectif', 'objectif_bp', '/api/objectifs', False),
+    # Blueprints des applications
+    ('app.apps.gestion_demande.demande', 'demande_bp', '/api/demandes', False),
+    ('app.apps.gestion_demande.type_demande', 'type_demande_bp', '/api/type_demandes', False),
+    # Blueprints KPI et consultation
+    ('app.apps.kpi_dde.routes', 'kpi_bp', '/api/kpi', True),
+    ('app.apps.consultation.routes', 'consultation_bp', '/api/consultation', True),
+)
+
+# Commandes flask intégrées qui lisent la table des routes : blueprints chargés dès la
+# création de l'application (les commandes de l'application appellent load_blueprints)
+ROUTES_COMMANDS = ('routes',)
+
 class Application:
     def __init__(self, config_class=None):
         """Constructeur de l'application"""
+        debut = time.perf_counter()
         self.app = Flask(__name__)
+        # Durées des étapes du démarrage : [(étape, ms)] (flask startup-profile)
+        self.startup_profile = []
+        self.app.extensions['startup_profile'] = self.startup_profile
         
         # Charger la configuration
         if config_class is None:
@@ -24,21 +67,76 @@ class Application:
         self.app.config.from_object(config_class)
         
         # Initialiser les extensions
-        self.init_extensions()
+        with self.profile('init_extensions'):
+            self.init_extensions()
+        
+        # Invalidation des caches en mémoire entre processus
+        with self.profile('configure_cache_invalidation'):
+            self.configure_cache_invalidation()
+        
+        # Écriture asynchrone et politiques des traces
+        with self.profile('configure_trace_writer'):
+            self.configure_trace_writer()
+        
+        # Métriques Prometheus (/metrics) et diagnostic des requêtes SQL
+        with self.profile('configure_metrics'):
+            self.configure_metrics()
+        
+        # Enregistrer les commandes CLI
+        with self.profile('register_commands'):
+            self.register_commands()
         
-        # Enregistrer les blueprints
-        self.register_blueprints()
+        # Enregistrer les blueprints : tout de suite (serveur, master gunicorn --preload),
+        # ou à la première requête (commandes flask : aucun module de routes importé)
+        self._blueprints_lock = threading.Lock()
+        self.blueprints_loaded = False
+        self.app.extensions['load_blueprints'] = self.load_blueprints
+        if self.lazy_blueprints():
+            self.app.wsgi_app = _LazyBlueprints(self, self.app.wsgi_app)
+        else:
+            self.load_blueprints()
+        
+        self.app.extensions['startup_total_ms'] = (time.perf_counter() - debut) * 1000
+        self.app.logger.debug(f"Application démarrée en {self.app.extensions['startup_total_ms']:.0f} ms")
+    
+    @contextmanager
+    def profile(self, etape):
+        """Mesure la durée d'une étape du démarrage"""
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_profile.append((etape, (time.perf_counter() - debut) * 1000))
     
     def init_extensions(self):
         """Initialise les extensions Flask avec l'application"""
+        # Options du pool de connexions et pool mesuré, fixés avant la création de l'engine
+        from app.common.services.db_pool_service import db_pool
+        db_pool.configure_engine(self.app)
         db.init_app(self.app)
+        migrate.init_app(self.app, db)
+        # Routage des lectures vers les réplicas en lecture (DB_REPLICA_URLS)
+        from app.common.services.db_routing_service import db_router
+        db_router.init_app(self.app)
         
-        # Créer les tables dans un contexte d'application
-        with self.app.app_context():
-            db.create_all()
+        if self.app.config.get('DB_CREATE_ALL', True):
+            # Développement : créer les tables manquantes dans un contexte d'application
+            with self.profile('init_extensions.create_all'), self.app.app_context():
+                # Modèles déclarés avant create_all
+                import app.common.models  # noqa: F401
+                db.create_all()
+                # Index plein texte FTS5 des traces (SQLite) ; FULLTEXT MySQL créé par migration
+                if self.app.config.get('TRACE_SEARCH_FULLTEXT', True) and db.engine.dialect.name == 'sqlite':
+                    from app.common.services.trace_search_service import trace_search
+                    trace_search.create_index()
         
-        # Initialiser les autres extensions après la création des tables
-        migrate.init_app(self.app, db)
+        if self.app.config.get('DB_CHECK_MIGRATIONS', False) and not self.cli_process():
+            # Production : schéma géré par Alembic, révision contrôlée au démarrage du serveur (résultat en cache).
+            # Pas pour les commandes flask : flask db upgrade doit pouvoir mettre à jour une base en retard
+            with self.profile('init_extensions.check_migrations'):
+                self.check_migrations()
+        
+        # Initialiser les autres extensions
         self.configure_jwt()
         ma.init_app(self.app)
         
@@ -135,82 +233,201 @@ class Application:
                 }
             }), 401
 
+        @self.jwt.token_in_blocklist_loader
+        def check_if_token_revoked(jwt_header, jwt_payload):
+            # Filtre de Bloom en mémoire devant la table token_blocklist :
+            # aucune requête pour un token non révoqué
+            if not self.app.config.get('TOKEN_BLOCKLIST_ENABLED', True):
+                return False
+            from app.common.services.token_blocklist_service import token_blocklist
+            return token_blocklist.is_revoked(
+                jwt_payload['jti'],
+                refresh_interval=self.app.config.get('TOKEN_BLOCKLIST_REFRESH_SECONDS', 30),
+                prune_interval=self.app.config.get('TOKEN_BLOCKLIST_PRUNE_SECONDS', 3600)
+            )
+
         # Configuration JWT
         self.app.config['JWT_SECRET_KEY'] = self.app.config['SECRET_KEY']
         self.app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
         self.app.config['JWT_REFRESH_TOKEN_EXPIRES'] = timedelta(days=30)
     
-    def register_blueprints(self):
-        """Enregistre tous les blueprints de l'application"""
-        # Blueprints communs
-        
-        from app.common.routes.auth import auth_bp
-        self.app.register_blueprint(auth_bp, url_prefix='/api/auth')
-
-
-        from app.common.routes.roles import role_bp
-        self.app.register_blueprint(role_bp, url_prefix='/api/roles')
-           
-        from app.common.routes.permissions import permission_bp
-        self.app.register_blueprint(permission_bp, url_prefix='/api/permissions')
-        
-        from app.common.routes.permission_page import permission_page_bp
-        self.app.register_blueprint(permission_page_bp, url_prefix='/api/permissions_page')
-        
-        from app.common.routes.fonctions_api import fonction_api_bp
-        self.app.register_blueprint(fonction_api_bp, url_prefix='/api/fonctions_api')
-        
-        from app.common.routes.trace import trace_bp
-        self.app.register_blueprint(trace_bp, url_prefix='/api/traces')
-        
-        from app.common.routes.page import page_bp
-        self.app.register_blueprint(page_bp, url_prefix='/api/pages')
-        
-        from app.common.routes.application import application_bp
-        self.app.register_blueprint(application_bp, url_prefix='/api/applications')
+    def configure_cache_invalidation(self):
+        """
+        Relit la table cache_version avant les requêtes (au plus une fois par
+        CACHE_VERSION_POLL_INTERVAL_MS) pour invalider les caches modifiés par
+        les autres workers.
+        """
+        if not self.app.config.get('CACHE_VERSION_ENABLED', True):
+            return
+        from app.common.services.cache_version_service import cache_versions
         
-        from app.common.routes.entite import entite_bp
-        self.app.register_blueprint(entite_bp, url_prefix='/api/entites')
-        
-        from app.common.routes.utilisateur import utilisateur_bp
-        self.app.register_blueprint(utilisateur_bp, url_prefix='/api/utilisateurs')
-        
-        from app.common.routes.blacklist import blacklist_bp
-        self.app.register_blueprint(blacklist_bp, url_prefix='/api/blacklist')
-        
-        from app.common.routes.codification import codification_bp
-        self.app.register_blueprint(codification_bp, url_prefix='/api/codifications')
-        
-        from app.common.routes.settings import settings_bp
-        self.app.register_blueprint(settings_bp, url_prefix='/api/settings')
-        
-        from app.common.routes.objectif import objectif_bp
-        self.app.register_blueprint(objectif_bp, url_prefix='/api/objectifs')
-                
-        # Blueprints des applications
-        from app.apps.gestion_demande.demande import demande_bp
-        self.app.register_blueprint(demande_bp, url_prefix='/api/demandes')
+        with self.app.app_context():
+            try:
+                cache_versions.ensure_domains()
+            except Exception as e:
+                self.app.logger.warning(f"Initialisation de la table cache_version impossible: {str(e)}")
         
-        from app.apps.gestion_demande.type_demande import type_demande_bp
-        self.app.register_blueprint(type_demande_bp, url_prefix='/api/type_demandes')
+        interval_ms = self.app.config.get('CACHE_VERSION_POLL_INTERVAL_MS', 1000)
         
-        # Blueprints KPI et consultation
-        try:
-            from app.apps.kpi_dde.routes import kpi_bp
-            self.app.register_blueprint(kpi_bp, url_prefix='/api/kpi')
-        except ImportError:
-            pass
+        @self.app.before_request
+        def poll_cache_versions():
+            try:
+                cache_versions.poll(interval_ms)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f"Lecture de la table cache_version impossible: {str(e)}")
+    
+    def configure_trace_writer(self):
+        """
+        Prépare l'écriture asynchrone groupée des traces (thread démarré à la
+        première trace), le spool local utilisé quand la base est indisponible,
+        les politiques d'enregistrement des traces, leurs agrégats horaires et
+        les mesures de performance des requêtes
+        """
+        from app.common.services.trace_writer_service import trace_writer
+        from app.common.services.trace_policy_service import trace_policy
+        from app.common.services.trace_rollup_service import trace_rollup
+        from app.common.services.trace_spool_service import trace_spool
+        trace_spool.init_app(self.app)
+        if self.app.config.get('TRACE_ASYNC_ENABLED', True):
+            trace_writer.init_app(self.app)
+        trace_policy.init_app(self.app)
+        trace_rollup.init_app(self.app)
+        # Mesures de performance par requête, écrites par le même thread
+        from app.common.services.request_metrics_service import request_metrics
+        request_metrics.init_app(self.app)
+    
+    def configure_metrics(self):
+        """
+        Expose les métriques Prometheus si prometheus_client est installé et active
+        le diagnostic SQL (requêtes lentes, N+1, budgets de requêtes)
+        """
+        from app.common.services.prometheus_service import prometheus_metrics
+        from app.common.services.sql_diagnostics_service import sql_diagnostics
+        prometheus_metrics.init_app(self.app)
+        sql_diagnostics.init_app(self.app)
+    
+    @staticmethod
+    def cli_process():
+        """Application construite par une commande flask (migrations, seeding, ...) et non par le serveur"""
+        return os.environ.get('FLASK_RUN_FROM_CLI') == 'true'
+    
+    @staticmethod
+    def cli_command():
+        """Commande flask en cours d'exécution, si elle est déjà résolue (flask routes : 'routes')"""
+        contexte = click.get_current_context(silent=True)
+        return contexte.info_name if contexte is not None else None
+    
+    def lazy_blueprints(self):
+        """Mode de chargement des blueprints (BLUEPRINTS_LOADING : auto, eager ou lazy)"""
+        mode = self.app.config.get('BLUEPRINTS_LOADING', 'auto')
+        if mode == 'auto':
+            # Commandes flask : routes chargées seulement si une requête arrive,
+            # sauf pour celles qui inspectent url_map
+            return self.cli_process() and self.cli_command() not in ROUTES_COMMANDS
+        return mode == 'lazy'
+    
+    def load_blueprints(self):
+        """
+        Importe et enregistre les blueprints puis synchronise les fonctions API
+        qu'ils déclarent (une seule fois)
+        """
+        if self.blueprints_loaded:
+            return
+        with self._blueprints_lock:
+            if self.blueprints_loaded:
+                return
+            debut = time.perf_counter()
+            if self.app.config.get('STARTUP_IMPORT_PROFILE', False):
+                from app.common.utils.import_profiler import ImportProfiler
+                with ImportProfiler() as profiler:
+                    self.register_blueprints()
+                self.app.extensions['import_profile'] = profiler
+            else:
+                self.register_blueprints()
+            self.check_import_budget()
             
+            # Synchroniser les fonctions API déclarées (auto_register) avec la base
+            if self.app.config.get('RBAC_SYNC_ON_STARTUP', True):
+                with self.profile('sync_fonctions_api'):
+                    self.sync_fonctions_api()
+            self.blueprints_loaded = True
+            if 'startup_total_ms' in self.app.extensions:
+                # Chargement différé : compté dans la durée totale du démarrage
+                self.app.extensions['startup_total_ms'] += (time.perf_counter() - debut) * 1000
+    
+    def check_import_budget(self):
+        """Signale un import des modules de routes plus long que BLUEPRINTS_IMPORT_BUDGET_MS"""
+        budget = self.app.config.get('BLUEPRINTS_IMPORT_BUDGET_MS', 0)
+        imports = [(etape[len('import '):], duree) for etape, duree in self.startup_profile if etape.startswith('import ')]
+        total = sum(duree for _, duree in imports)
+        if budget and total > budget:
+            plus_lents = ', '.join(f"{module} ({duree:.0f} ms)" for module, duree in sorted(imports, key=lambda item: -item[1])[:5])
+            self.app.logger.warning(
+                f"Import des blueprints en {total:.0f} ms, au-delà du budget de {budget} ms : {plus_lents}"
+            )
+    
+    def register_blueprints(self):
+        """Enregistre tous les blueprints de l'application (BLUEPRINTS)"""
+        for module, attribut, url_prefix, optionnel in BLUEPRINTS:
+            try:
+                with self.profile(f"import {module}"):
+                    blueprint = getattr(import_module(module), attribut)
+            except (ImportError, AttributeError):
+                # Comme « from module import attribut » : nom absent = ImportError
+                if not optionnel:
+                    raise
+                continue
+            with self.profile(f"register {blueprint.name}"):
+                self.app.register_blueprint(blueprint, url_prefix=url_prefix)
+    
+    def register_commands(self):
+        """Enregistre les commandes CLI de l'application"""
+        from app.common.cli import rbac_cli, traces_cli, dedupe_command, startup_profile
+        self.app.cli.add_command(rbac_cli)
+        self.app.cli.add_command(traces_cli)
+        self.app.cli.add_command(dedupe_command)
+        self.app.cli.add_command(startup_profile)
+    
+    def check_migrations(self):
+        """Vérifie que la base est à la dernière révision Alembic (sans bloquer si elle est injoignable)"""
+        from app.common.services.schema_service import schema_check
         try:
-            from app.apps.consultation.routes import consultation_bp
-            self.app.register_blueprint(consultation_bp, url_prefix='/api/consultation')
-        except ImportError:
-            pass
+            schema_check.verify(self.app, db)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            self.app.logger.warning(f"Vérification de la révision du schéma impossible: {str(e)}")
+    
+    def sync_fonctions_api(self):
+        """Insère en masse les fonctions API déclarées par les routes et absentes de la base"""
+        from app.common.services.fonction_registry_service import FonctionRegistryService
+        with self.app.app_context():
+            try:
+                resultat = FonctionRegistryService().sync()
+                if resultat['creees']:
+                    self.app.logger.info(f"{resultat['creees']} fonction(s) API enregistrée(s) automatiquement")
+            except Exception as e:
+                # Base non migrée ou indisponible : ne pas empêcher le démarrage
+                db.session.rollback()
+                self.app.logger.warning(f"Synchronisation des fonctions API impossible: {str(e)}")
     
     def get_app(self):
         """Retourne l'instance de l'application Flask"""
         return self.app
 
+class _LazyBlueprints:
+    """Middleware WSGI : charge les blueprints à la première requête, puis se retire"""
+    
+    def __init__(self, application, wsgi_app):
+        self.application = application
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        self.application.load_blueprints()
+        self.application.app.wsgi_app = self.wsgi_app
+        return self.wsgi_app(environ, start_response)
+
 # Fonction de compatibilité pour maintenir l'API existante
 def create_app(config_class=None):
     """Crée et configure l'application Flask"""
@@ -45,7 +45,7 @@ class Demande(db.Model):
     description = db.Column(db.Text, nullable=True)
     contenu_sql = db.Column(db.Text, nullable=True)
     chemin_fichier = db.Column(db.String(255), nullable=True)
-    statut = db.Column(db.String(50), nullable=False)
+    statut = db.Column(db.String(50), nullable=False, index=True)
     niveau_priorite = db.Column(db.String(50), nullable=False)
     date_initiation = db.Column(db.DateTime, nullable=False)
     date_prise_en_charge = db.Column(db.DateTime, nullable=True)
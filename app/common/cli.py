@@ -0,0 +1,158 @@
+import click
+from flask.cli import AppGroup, with_appcontext
+
+rbac_cli = AppGroup('rbac', help='Gestion du contrôle d\'accès (fonctions API, permissions)')
+
+
+@rbac_cli.command('sync')
+@click.option('--utilisateur-id', default=1, show_default=True, type=int,
+              help='ID renseigné dans creer_par / modifier_par des fonctions créées')
+def rbac_sync(utilisateur_id):
+    """Synchronise en masse les fonctions API déclarées (auto_register) avec la table fonction_api"""
+    from flask import current_app
+    from app.common.services.fonction_registry_service import FonctionRegistryService
+    
+    # Fonctions déclarées par les modules de routes (non importés par défaut par les commandes flask)
+    current_app.extensions['load_blueprints']()
+    resultat = FonctionRegistryService().sync(utilisateur_id)
+    click.echo(
+        f"{resultat['declarees']} fonction(s) déclarée(s) : "
+        f"{resultat['creees']} créée(s), {resultat['existantes']} déjà présente(s)"
+    )
+
+
+traces_cli = AppGroup('traces', help='Gestion des traces (rétention, archivage)')
+
+
+@traces_cli.command('archive')
+@click.option('--days', default=None, type=int,
+              help='Fenêtre de rétention en jours (TRACE_RETENTION_DAYS par défaut)')
+@click.option('--batch-size', default=None, type=int,
+              help='Nombre de traces déplacées par lot (TRACE_ARCHIVE_BATCH_SIZE par défaut)')
+@click.option('--dry-run', is_flag=True, help='Compter les traces à archiver sans rien modifier')
+def traces_archive(days, batch_size, dry_run):
+    """
+    Déplace les traces anciennes dans des segments NDJSON compressés puis les supprime de la base,
+    et purge les mesures de requêtes plus anciennes que REQUEST_METRICS_RETENTION_DAYS
+    """
+    from app.common.services.trace_archive_service import trace_archive
+    from app.common.services.request_metrics_service import request_metrics
+    
+    resultat = trace_archive.archive(retention_days=days, batch_size=batch_size, dry_run=dry_run)
+    if dry_run:
+        click.echo(f"{resultat['archivees']} trace(s) antérieure(s) au {resultat['limite']:%Y-%m-%d} à archiver")
+    else:
+        click.echo(
+            f"{resultat['archivees']} trace(s) antérieure(s) au {resultat['limite']:%Y-%m-%d} archivée(s) "
+            f"dans {len(resultat['segments'])} segment(s)"
+        )
+    
+    purge = request_metrics.purge(batch_size=batch_size, dry_run=dry_run)
+    if purge['limite'] is not None:
+        click.echo(
+            f"{purge['supprimees']} mesure(s) de requêtes antérieure(s) au {purge['limite']:%Y-%m-%d} "
+            f"{'à supprimer' if dry_run else 'supprimée(s)'}"
+        )
+
+
+@traces_cli.command('reindex')
+@click.option('--drop', is_flag=True, help='Supprimer l\'index plein texte au lieu de le reconstruire')
+def traces_reindex(drop):
+    """Crée ou reconstruit l'index plein texte des traces (FTS5 sous SQLite, FULLTEXT sous MySQL)"""
+    from app.common.services.trace_search_service import trace_search
+    
+    if drop:
+        trace_search.drop_index()
+        click.echo("Index plein texte des traces supprimé")
+        return
+    backend = trace_search.create_index(rebuild=True)
+    if backend is None:
+        click.echo("Aucun index plein texte pour ce moteur : la recherche utilise ilike")
+    else:
+        click.echo(f"Index plein texte des traces reconstruit ({backend})")
+
+
+@traces_cli.command('rollup')
+@click.option('--since', default=None, help='Début de la plage recalculée (AAAA-MM-JJ), plus ancienne trace de la table par défaut')
+@click.option('--until', default=None, help='Fin (exclue) de la plage recalculée (AAAA-MM-JJ)')
+def traces_rollup(since, until):
+    """Recalcule les agrégats horaires (trace_rollup) depuis la table trace (heures archivées conservées)"""
+    from datetime import datetime
+    from flask import current_app
+    from app.common.services.trace_rollup_service import trace_rollup
+    
+    # Table des routes : rattache à leur route les traces antérieures à la colonne route
+    current_app.extensions['load_blueprints']()
+    resultat = trace_rollup.rebuild(
+        datetime.fromisoformat(since) if since else None,
+        datetime.fromisoformat(until) if until else None
+    )
+    click.echo(f"{resultat['traces']} trace(s) agrégée(s) en {resultat['agregats']} ligne(s) horaire(s)")
+
+
+@traces_cli.command('replay')
+def traces_replay():
+    """Rejoue le spool local des traces dans la table trace (traces déjà présentes ignorées)"""
+    from app.common.services.trace_spool_service import trace_spool
+    
+    restant = trace_spool.replay()
+    click.echo(
+        f"{trace_spool.replayed} trace(s) rejouée(s), {trace_spool.duplicates} doublon(s) ignoré(s), "
+        f"{restant} restante(s)"
+    )
+
+
+@click.command('dedupe')
+@click.option('--table', 'tables', multiple=True,
+              help='Table à examiner (répétable), toutes les associations uniques par défaut')
+@click.option('--apply', 'appliquer', is_flag=True, help='Supprimer les doublons listés (sinon simple rapport)')
+@with_appcontext
+def dedupe_command(tables, appliquer):
+    """Liste (et supprime avec --apply) les doublons qui bloquent les contraintes d'unicité (add_hot_path_indexes)"""
+    from app.common.services.dedupe_service import dedupe
+    
+    groupes = dedupe.find(tables)
+    for groupe in groupes:
+        cle = ', '.join(f"{colonne}={valeur}" for colonne, valeur in groupe['cle'].items())
+        click.echo(f"{groupe['table']} ({cle}) : ligne {groupe['conservee']} conservée"
+                   f"{', CONFLIT (valeurs différentes), à corriger à la main' if groupe['conflit'] else ''}")
+        for ligne in groupe['supprimees']:
+            details = ', '.join(f"{colonne}={valeur!r}" for colonne, valeur in ligne.items())
+            click.echo(f"  {'en conflit' if groupe['conflit'] else 'supprimée'} : {details}")
+    if not groupes:
+        click.echo("Aucun doublon")
+        return
+    conflits = sum(1 for groupe in groupes if groupe['conflit'])
+    if appliquer:
+        supprimees = dedupe.remove(groupes)
+        click.echo(f"{supprimees} ligne(s) supprimée(s), {conflits} groupe(s) en conflit laissé(s) en place")
+    else:
+        click.echo(f"{len(groupes)} groupe(s) de doublons dont {conflits} en conflit : relancer avec --apply pour supprimer")
+
+
+@click.command('startup-profile')
+@click.option('--top', default=None, type=int, help='Nombre d\'étapes affichées (les plus longues)')
+@click.option('--imports', default=0, type=int,
+              help='Afficher aussi les N modules les plus longs à importer (STARTUP_IMPORT_PROFILE)')
+@with_appcontext
+def startup_profile(top, imports):
+    """Affiche la durée des étapes du démarrage de l'application (imports et enregistrement des blueprints)"""
+    from flask import current_app
+    
+    # Les commandes flask n'importent pas les routes : les charger pour les mesurer
+    if imports:
+        current_app.config['STARTUP_IMPORT_PROFILE'] = True
+    current_app.extensions['load_blueprints']()
+    
+    etapes = current_app.extensions.get('startup_profile', [])
+    for etape, duree in sorted(etapes, key=lambda item: -item[1])[:top]:
+        click.echo(f"{duree:9.1f} ms  {etape}")
+    # Les étapes imbriquées (init_extensions.*) sont comprises dans leur étape parente
+    click.echo(f"{current_app.extensions.get('startup_total_ms', 0):9.1f} ms  total")
+    
+    profiler = current_app.extensions.get('import_profile')
+    if imports and profiler is not None:
+        click.echo('')
+        click.echo('   cumulé     propre  module')
+        for module, cumule, propre in profiler.top(imports):
+            click.echo(f"{cumule:9.1f} {propre:9.1f}  {module}")
@@ -58,6 +58,29 @@ class AuthController:
             }
         }, 200
 
+    def logout(self, jwt_payload):
+        """
+        Gère la déconnexion (révocation du token courant)
+        """
+        _, status = self.auth_service.logout(jwt_payload)
+
+        if status != "success":
+            return {
+                "error": True,
+                "message": {
+                    "en": "System error during logout",
+                    "fr": "Erreur système lors de la déconnexion"
+                }
+            }, 500
+
+        return {
+            "error": False,
+            "message": {
+                "en": "Logout successful",
+                "fr": "Déconnexion réussie"
+            }
+        }, 200
+
     def _get_status_code(self, status):
         """
         Détermine le code HTTP approprié selon le statut
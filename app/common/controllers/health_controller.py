@@ -0,0 +1,19 @@
+from app.common.models import db
+from app.common.services.db_pool_service import db_pool
+from app.common.services.db_routing_service import db_router
+
+class HealthController:
+    def get_health(self):
+        """État de la base principale (SELECT 1), du pool de connexions et des réplicas du processus"""
+        ok, duree_ms, erreur = db_pool.ping(db.session)
+        etat = {
+            'database': {
+                'ok': ok,
+                'latence_ms': duree_ms,
+                'erreur': erreur
+            },
+            'pool': db_pool.status(db.engine)
+        }
+        if db_router.enabled:
+            etat['replicas'] = db_router.status()
+        return etat
@@ -1,8 +1,10 @@
 from app.common.services.page_service import PageService
+from app.common.services.page_navigation_service import PageNavigationService
 
 class PageController:
     def __init__(self):
         self.page_service = PageService()
+        self.page_navigation_service = PageNavigationService()
     
     def get_all_pages(self):
         return self.page_service.get_all_pages()
@@ -26,4 +28,7 @@ class PageController:
         return self.page_service.add_pages_to_application(app_id, page_ids)
     
     def remove_pages_from_application(self, app_id, page_ids):
-        return self.page_service.remove_pages_from_application(app_id, page_ids) 
\ No newline at end of file
+        return self.page_service.remove_pages_from_application(app_id, page_ids) 
+
+    def get_navigation(self, utilisateur):
+        return self.page_navigation_service.get_navigation(utilisateur)
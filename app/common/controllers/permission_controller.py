@@ -24,4 +24,7 @@ class PermissionController:
         return self.permission_service.get_roles_with_permission(permission_id) 
 
     def search_permissions(self, query, page, per_page):
-        return self.permission_service.search_permissions(query, page, per_page)
\ No newline at end of file
+        return self.permission_service.search_permissions(query, page, per_page)
+
+    def evaluate_fonctions(self, utilisateur, demandes, use_matrix=True):
+        return self.permission_service.evaluate_fonctions(utilisateur, demandes, use_matrix)
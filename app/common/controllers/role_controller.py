@@ -14,7 +14,9 @@ class RoleController:
     
     def get_roles_by_app_paginated(self, app_id, page, per_page):
         """Lister tous les rôles d'une application avec pagination"""
-        return self.role_service.get_roles_by_app_paginated(app_id, page, per_page)
+        return Role.query.options(
+            joinedload(Role.role_permissions).joinedload(RolePermission.permission)
+        ).filter_by(app_id=app_id).paginate(page=page, per_page=per_page, error_out=False)
     
     def get_role_by_id(self, role_id):
         """Afficher un rôle spécifique"""
@@ -1,4 +1,6 @@
 from app.common.services.trace_service import TraceService
+from app.common.services.trace_rollup_service import trace_rollup
+from app.common.services.request_metrics_service import request_metrics
 
 class TraceController:
     def __init__(self):
@@ -42,4 +44,37 @@ class TraceController:
     
     def search_traces_paginated(self, search_term, page, per_page):
         """Rechercher des traces avec pagination"""
-        return self.trace_service.search_traces_paginated(search_term, page, per_page) 
\ No newline at end of file
+        return self.trace_service.search_traces_paginated(search_term, page, per_page)
+    
+    def get_traces_keyset(self, cursor, per_page, with_total=False):
+        return self.trace_service.get_traces_keyset(cursor, per_page, with_total)
+    
+    def get_traces_by_utilisateur_keyset(self, utilisateur_id, cursor, per_page, with_total=False):
+        return self.trace_service.get_traces_by_utilisateur_keyset(utilisateur_id, cursor, per_page, with_total)
+    
+    def get_traces_by_action_keyset(self, action, cursor, per_page, with_total=False):
+        return self.trace_service.get_traces_by_action_keyset(action, cursor, per_page, with_total)
+    
+    def get_traces_by_date_range_keyset(self, start_date, end_date, cursor, per_page, with_total=False):
+        return self.trace_service.get_traces_by_date_range_keyset(start_date, end_date, cursor, per_page, with_total)
+    
+    def search_traces_keyset(self, search_term, cursor, per_page, with_total=False):
+        """Rechercher des traces avec pagination par curseur"""
+        return self.trace_service.search_traces_keyset(search_term, cursor, per_page, with_total)
+    
+    def iter_export(self, format_export='ndjson', utilisateur_id=None, action=None, start_date=None, end_date=None,
+                    chunk_size=1000):
+        """Exporter les traces en flux (NDJSON ou CSV)"""
+        return self.trace_service.iter_export(format_export, utilisateur_id, action, start_date, end_date, chunk_size)
+    
+    def get_stats(self, start_date, end_date, granularite=None, group_by=None, filtres=None, limit=None):
+        """Statistiques d'activité lues dans les agrégats horaires"""
+        return trace_rollup.stats(start_date, end_date, granularite, group_by, filtres, limit)
+    
+    def get_top(self, dimension, start_date, end_date, filtres=None, limit=10):
+        """Valeurs les plus fréquentes d'une dimension (action, end_point, utilisateur)"""
+        return trace_rollup.top(dimension, start_date, end_date, filtres, limit)
+    
+    def get_request_metrics(self, start_date, end_date, group_by='blueprint', limit=None):
+        """Percentiles de durée et de temps SQL des requêtes HTTP"""
+        return request_metrics.summary(start_date, end_date, group_by, limit)
@@ -0,0 +1,103 @@
+from flask import g, current_app
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy.orm import joinedload
+from app.common.models import Utilisateur, UtilisateurRole
+from app.common.services.security_epoch_service import security_epochs
+
+# Marqueur distinguant « pas encore résolu » de « utilisateur introuvable » (None)
+_NON_RESOLU = object()
+
+
+class ClaimsIdentity:
+    """
+    Identité de l'utilisateur connecté construite depuis les claims du token JWT.
+
+    Expose les attributs utilisés par les décorateurs (id_utilisateur, login, profil,
+    id_entite) sans charger l'utilisateur en base.
+    """
+    __slots__ = ('id_utilisateur', 'login', 'profil', 'id_entite')
+
+    def __init__(self, id_utilisateur, login, profil, id_entite):
+        self.id_utilisateur = id_utilisateur
+        self.login = login
+        self.profil = profil
+        self.id_entite = id_entite
+
+    def has_permission_for_fonction_single_query(self, app_id, nom_fonction):
+        """Même vérification que Utilisateur.has_permission_for_fonction_single_query"""
+        return Utilisateur.has_permission_for_fonction_single_query(self, app_id, nom_fonction)
+
+
+def get_current_utilisateur():
+    """
+    Retourne l'utilisateur connecté (identité JWT), ou None s'il n'existe pas.
+
+    L'utilisateur est chargé au plus une fois par requête, avec ses rôles et leurs
+    applications, puis mémorisé sur flask.g : les décorateurs (api_fonction,
+    trace_action, auto_set_user_fields) et les routes partagent la même instance.
+    Doit être appelé après la vérification du token (jwt_required / verify_jwt_in_request).
+    """
+    utilisateur = g.get('_current_utilisateur', _NON_RESOLU)
+    if utilisateur is _NON_RESOLU:
+        login = get_jwt_identity()
+        utilisateur = None
+        if login:
+            utilisateur = Utilisateur.query.options(
+                joinedload(Utilisateur.utilisateur_roles).joinedload(UtilisateurRole.application),
+                joinedload(Utilisateur.roles)
+            ).filter_by(login=login).first()
+        g._current_utilisateur = utilisateur
+    return utilisateur
+
+
+def get_current_identity():
+    """
+    Retourne l'identité de l'utilisateur connecté, ou None.
+
+    Si JWT_CLAIMS_AUTH_ENABLED est actif et que le token porte une époque de
+    sécurité (claim sec_epoch), l'identité est construite depuis les claims et
+    l'époque est contrôlée dans la table en mémoire (aucune requête sur un cache
+    chaud). Un token dont l'époque ne correspond plus, ou d'un compte inactif ou
+    expiré, est révoqué : None est retourné et is_current_token_revoked() vaut True.
+    Sinon (anciens tokens, mode désactivé), l'utilisateur est chargé en base.
+    """
+    identity = g.get('_current_identity', _NON_RESOLU)
+    if identity is _NON_RESOLU:
+        claims = get_jwt()
+        claims_auth = current_app.config.get('JWT_CLAIMS_AUTH_ENABLED', True)
+        if claims_auth and 'sec_epoch' in claims and claims.get('id_utilisateur') is not None:
+            ttl = current_app.config.get('SECURITY_EPOCH_TTL', 30)
+            if security_epochs.is_valid(claims.get('id_utilisateur'), claims['sec_epoch'], ttl):
+                identity = ClaimsIdentity(
+                    id_utilisateur=claims['id_utilisateur'],
+                    login=get_jwt_identity(),
+                    profil=claims.get('profil'),
+                    id_entite=claims.get('id_entite')
+                )
+            else:
+                identity = None
+                g._current_token_revoked = True
+        else:
+            identity = get_current_utilisateur()
+        g._current_identity = identity
+    return identity
+
+
+def is_current_token_revoked():
+    """Indique si le token de la requête a été révoqué par un changement d'époque de sécurité"""
+    return g.get('_current_token_revoked', False)
+
+
+def get_current_utilisateur_id():
+    """
+    Retourne l'ID de l'utilisateur connecté, ou None.
+
+    Mémorisé sur flask.g : après un commit de la requête (trace écrite en
+    synchrone), l'utilisateur chargé est expiré et relire son ID le rechargerait.
+    """
+    id_utilisateur = g.get('_current_utilisateur_id', _NON_RESOLU)
+    if id_utilisateur is _NON_RESOLU:
+        identity = get_current_identity()
+        id_utilisateur = identity.id_utilisateur if identity else None
+        g._current_utilisateur_id = id_utilisateur
+    return id_utilisateur
@@ -1,8 +1,25 @@
 from functools import wraps
 from flask import request, jsonify, g, current_app
-from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
-from app.common.models import FonctionAPI, Utilisateur
-from app.common.services.trace_service import TraceService
+from flask_jwt_extended import verify_jwt_in_request
+from app.common.current_user import get_current_identity, get_current_utilisateur_id, is_current_token_revoked
+from app.common.services.trace_service import TraceService, route_courante
+from app.common.services.trace_policy_service import trace_policy, KEEP, AGGREGATE
+from app.common.services.request_metrics_service import request_metrics
+from app.common.services.permission_matrix_service import permission_matrix
+from app.common.services.fonction_registry_service import register_fonction
+
+def user_has_fonction_permission(utilisateur, app_id, nom_fonction):
+    """
+    Vérifie la permission via la matrice compilée en mémoire (aucune requête SQL
+    sur un cache chaud), ou en une seule requête SQL si la matrice est désactivée.
+    """
+    if current_app.config.get('PERMISSION_MATRIX_ENABLED', True):
+        try:
+            return permission_matrix.is_allowed(utilisateur.id_utilisateur, app_id, nom_fonction)
+        except (TypeError, ValueError):
+            # app_id non numérique : laisser la base trancher
+            pass
+    return utilisateur.has_permission_for_fonction_single_query(app_id, nom_fonction)
 
 def require_fonction_permission(nom_fonction, app_id=None):
     """
@@ -20,6 +37,9 @@ def require_fonction_permission(nom_fonction, app_id=None):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            # Fonction API appelée, reprise dans les mesures de la requête (request_metrics)
+            g.nom_fonction = nom_fonction
+            
             # Vérifier si le token JWT est valide
             try:
                 # Cette fonction vérifie si un token JWT valide est présent dans la requête
@@ -35,12 +55,17 @@ def require_fonction_permission(nom_fonction, app_id=None):
                     'details': str(e)
                 }), 401
             
-            # Récupérer l'identité de l'utilisateur à partir du token JWT
-            # get_jwt_identity() retourne l'identité stockée dans le token JWT (généralement le login)
-            login = get_jwt_identity()
-            
-            # Récupérer l'utilisateur à partir de la base de données
-            utilisateur = Utilisateur.query.filter_by(login=login).first()
+            # Récupérer l'identité du token JWT : depuis les claims contrôlés par l'époque
+            # de sécurité, sinon l'utilisateur chargé une seule fois par requête
+            utilisateur = get_current_identity()
+            if is_current_token_revoked():
+                return jsonify({
+                    'error': True,
+                    'message': {
+                        'fr': 'Session révoquée, veuillez vous reconnecter',
+                        'en': 'Session revoked, please login again'
+                    }
+                }), 401
             if not utilisateur:
                 return jsonify({
                     'error': True,
@@ -66,24 +91,10 @@ def require_fonction_permission(nom_fonction, app_id=None):
                     }
                 }), 400
             
-            # Vérifier si la fonction vient d'être créée automatiquement (via register_fonction_api)
-            from flask import g
-            fonction_auto_created = getattr(g, 'fonction_auto_created', False)
-            fonction_name = getattr(g, 'fonction_name', None)
-            fonction_app_id = getattr(g, 'fonction_app_id', None)
-            
-            # Si la fonction vient d'être créée avec auto_register, permettre l'accès
-            # (logique : si aucune permission n'est définie pour cette nouvelle fonction, elle est accessible)
-            if fonction_auto_created and fonction_name == nom_fonction and fonction_app_id == check_app_id:
-                current_app.logger.info(f"Fonction '{nom_fonction}' vient d'être créée automatiquement, accès autorisé")
-                # Nettoyer le flag
-                g.fonction_auto_created = False
-                return f(*args, **kwargs)
-            
             # Vérifier si l'utilisateur a la permission pour cette fonction
-            # La méthode has_permission_for_fonction vérifie si l'utilisateur a un rôle
-            # qui possède une permission associée à cette fonction API
-            if not utilisateur.has_permission_for_fonction(check_app_id, nom_fonction):
+            # (rôle de l'utilisateur possédant une permission associée à cette fonction API,
+            # résolu depuis la matrice de permissions compilée)
+            if not user_has_fonction_permission(utilisateur, check_app_id, nom_fonction):
                 current_app.logger.error(f"Accès refusé à {nom_fonction} de l'application {check_app_id} pour l'utilisateur {utilisateur.login} (ID: {utilisateur.id_utilisateur})")
                 return jsonify({
                     'error': True,
@@ -103,7 +114,10 @@ def require_fonction_permission(nom_fonction, app_id=None):
 def register_fonction_api(app_id, description=None, nom_fonction=None):
     """
     Décorateur pour enregistrer automatiquement une fonction API dans la base de données.
-    Utile lors du développement pour créer automatiquement les fonctions API.
+    
+    La fonction est ajoutée au registre à l'import du module de routes ; l'insertion
+    en base est faite en masse au démarrage de l'application (ou via `flask rbac sync`),
+    sans aucun travail d'enregistrement pendant les requêtes.
     
     Args:
         app_id (int): ID de l'application
@@ -114,48 +128,11 @@ def register_fonction_api(app_id, description=None, nom_fonction=None):
         function: Décorateur qui enregistre la fonction API
     """
     def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            from app import db
-            # Utiliser le nom_fonction fourni ou le nom de la fonction Python
-            func_name = nom_fonction or f.__name__
-            
-            # Vérifier si la fonction existe déjà (avec refresh de la session pour éviter les problèmes de cache)
-            db.session.expire_all()
-            fonction = FonctionAPI.query.filter_by(
-                nom_fonction=func_name,
-                app_id=app_id
-            ).first()
-            
-            # Si la fonction n'existe pas, la créer
-            if not fonction:
-                # Utiliser la docstring de la fonction comme description si non spécifiée
-                func_description = description or f.__doc__ or f"Fonction {func_name}"
-                
-                # Créer la fonction API
-                fonction = FonctionAPI(
-                    nom_fonction=func_name,
-                    description=func_description,
-                    app_id=app_id,
-                    creer_par=1,  # Utilisateur système par défaut
-                    modifier_par=1
-                )
-                
-                db.session.add(fonction)
-                db.session.commit()
-                
-                # Marquer que la fonction vient d'être créée dans le contexte Flask
-                from flask import g
-                g.fonction_auto_created = True
-                g.fonction_name = func_name
-                g.fonction_app_id = app_id
-                
-                current_app.logger.info(f"Fonction API '{func_name}' enregistrée automatiquement")
-            
-            # Exécuter la fonction originale
-            return f(*args, **kwargs)
-        
-        return decorated_function
+        # Utiliser le nom_fonction fourni ou le nom de la fonction Python
+        func_name = nom_fonction or f.__name__
+        # Utiliser la docstring de la fonction comme description si non spécifiée
+        register_fonction(func_name, app_id, description or f.__doc__ or f"Fonction {func_name}")
+        return f
     
     return decorator
 
@@ -179,88 +156,44 @@ def api_fonction(nom_fonction=None, app_id=None, description=None, auto_register
         # Utiliser l'app_id fourni dans le décorateur
         check_app_id = app_id
         
-        # Si auto_register est True, créer un décorateur personnalisé qui combine les deux
+        # Si auto_register est True, déclarer la fonction dans le registre (synchronisé au démarrage)
         if auto_register and app_id:
-            @wraps(f)
-            def combined_decorator(*args, **kwargs):
-                from app import db
-                from flask import g
-                
-                # Étape 1 : Créer la fonction si elle n'existe pas
-                db.session.expire_all()
-                fonction = FonctionAPI.query.filter_by(
-                    nom_fonction=func_name,
-                    app_id=check_app_id
-                ).first()
-                
-                fonction_just_created = False
-                if not fonction:
-                    func_description = description or f.__doc__ or f"Fonction {func_name}"
-                    fonction = FonctionAPI(
-                        nom_fonction=func_name,
-                        description=func_description,
-                        app_id=check_app_id,
-                        creer_par=1,
-                        modifier_par=1
-                    )
-                    db.session.add(fonction)
-                    db.session.commit()
-                    fonction_just_created = True
-                    current_app.logger.info(f"Fonction API '{func_name}' enregistrée automatiquement")
-                
-                # Étape 2 : Vérifier les permissions SEULEMENT si la fonction existait déjà
-                # Si elle vient d'être créée, permettre l'accès (logique: pas de permissions = accessible)
-                if fonction_just_created:
-                    current_app.logger.info(f"Fonction '{func_name}' vient d'être créée, accès autorisé")
-                    return f(*args, **kwargs)
-                
-                # Vérifier les permissions pour les fonctions existantes
-                verify_jwt_in_request()
-                login = get_jwt_identity()
-                utilisateur = Utilisateur.query.filter_by(login=login).first()
-                if not utilisateur:
-                    return jsonify({
-                        'error': True,
-                        'message': {
-                            'fr': 'Utilisateur non trouvé',
-                            'en': 'User not found'
-                        }
-                    }), 404
-                
-                # Bypass contrôle pour les administrateurs
-                if getattr(utilisateur, 'profil', None) == 'Administrateur':
-                    return f(*args, **kwargs)
-                
-                if not utilisateur.has_permission_for_fonction(check_app_id, func_name):
-                    current_app.logger.error(f"Accès refusé à {func_name} de l'application {check_app_id} pour l'utilisateur {utilisateur.login}")
-                    return jsonify({
-                        'error': True,
-                        'message': {
-                            'fr': 'Accès non autorisé à cette fonction',
-                            'en': 'Unauthorized access to this function'
-                        }
-                    }), 403
-                
-                return f(*args, **kwargs)
-            
-            return combined_decorator
-        else:
-            # Appliquer le décorateur de permission avec l'app_id si fourni
-            decorated = require_fonction_permission(func_name, check_app_id)(f)
-            return decorated
+            register_fonction(func_name, check_app_id, description or f.__doc__ or f"Fonction {func_name}")
+        
+        # Appliquer le décorateur de permission avec l'app_id si fourni
+        return require_fonction_permission(func_name, check_app_id)(f)
     
     return decorator 
 
+def query_budget(max_requetes):
+    """
+    Fixe le budget de requêtes SQL d'une route (prioritaire sur SQL_QUERY_BUDGETS).
+    Au-delà, le diagnostic SQL journalise le dépassement, ou lève
+    QueryBudgetExceeded en mode strict (SQL_DIAGNOSTICS_STRICT).
+    
+    Args:
+        max_requetes (int): Nombre maximal d'instructions SQL par requête
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            g.sql_budget = max_requetes
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def _response_status(response):
+    """Retourne le code HTTP d'une réponse de vue (objet Response ou tuple (corps, statut))"""
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return getattr(response, 'status_code', 200)
+
 def trace_action(action_type, code_prefix):
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Récupérer le login de l'utilisateur depuis le JWT
-            current_user_login = get_jwt_identity()
-            
-            # Récupérer l'ID de l'utilisateur à partir du login
-            user = Utilisateur.query.filter_by(login=current_user_login).first()
-            current_user_id = user.id_utilisateur if user else None       
+            # Récupérer l'ID de l'utilisateur connecté (chargé une seule fois par requête)
+            current_user_id = get_current_utilisateur_id()
                  
             # Préparer les paramètres de la trace
             method = request.method
@@ -283,16 +216,29 @@ def trace_action(action_type, code_prefix):
                 response = f(*args, **kwargs)
                 
                 # Ajouter le statut de la réponse aux paramètres
-                params['status'] = response.status_code if hasattr(response, 'status_code') else 200
+                status = _response_status(response)
+                params['status'] = status
                 
-                # Tracer l'action réussie
-                TraceService.ajouter_trace(
-                    action=f"{action_type}_{method}",
-                    detail=detail,
-                    code=code,
-                    id_utilisateur=current_user_id,
-                    params=params
-                )
+                # Politique de trace : garder, échantillonner ou agréger les lectures
+                # (les écritures et les erreurs sont toujours tracées)
+                mode, taux = trace_policy.decide(action_type, code_prefix, method, status)
+                if mode == KEEP:
+                    if taux < 1.0:
+                        params['sample_rate'] = taux
+                    # Durée et requêtes SQL de la requête jusqu'ici
+                    perf = request_metrics.snapshot()
+                    if perf:
+                        params['perf'] = perf
+                    # Tracer l'action réussie
+                    TraceService.ajouter_trace(
+                        action=f"{action_type}_{method}",
+                        detail=detail,
+                        code=code,
+                        id_utilisateur=current_user_id,
+                        params=params
+                    )
+                elif mode == AGGREGATE:
+                    trace_policy.aggregate(f"{action_type}_{method}", code, route_courante(), status, current_user_id)
                 
                 return response
                 
@@ -322,11 +268,8 @@ def auto_set_user_fields():
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Récupérer le login de l'utilisateur depuis le JWT
-            current_user_login = get_jwt_identity()
-            
-            # Récupérer l'utilisateur à partir du login
-            user = Utilisateur.query.filter_by(login=current_user_login).first()
+            # Récupérer l'identité de l'utilisateur connecté (résolue une seule fois par requête)
+            user = get_current_identity()
             if not user:
                 return jsonify({
                     'error': True,
@@ -1,4 +1,8 @@
+import uuid
 from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import and_, or_, exists, select, literal, bindparam
+from sqlalchemy.orm import aliased
 from app import db
 
 class Application(db.Model):
@@ -50,6 +54,12 @@ class FonctionAPI(db.Model):
     creer_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     modifier_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Recherche d'une fonction par nom dans une application (vérification des permissions) ;
+    # unique : la synchronisation concurrente des workers ne peut pas créer de doublon
+    __table_args__ = (
+        db.UniqueConstraint('nom_fonction', 'app_id', name='uq_fonction_api_nom_app'),
+    )
+    
     # Relations
     application = db.relationship('Application', backref=db.backref('fonctions_api', lazy=True))
     fonction_permissions = db.relationship('FonctionPermission', back_populates='fonction', cascade='all, delete-orphan')
@@ -65,6 +75,10 @@ class FonctionPermission(db.Model):
     creer_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     modifier_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.UniqueConstraint('fonction_id', 'permission_id', name='uq_fonction_permission_fonction_permission'),
+    )
+    
     # Relations
     fonction = db.relationship('FonctionAPI', back_populates='fonction_permissions')
     permission = db.relationship('Permission', back_populates='fonction_permissions')
@@ -122,6 +136,10 @@ class RolePermission(db.Model):
     creer_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     modifier_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.UniqueConstraint('role_id', 'permission_id', name='uq_role_permission_role_permission'),
+    )
+    
     # Relations
     role = db.relationship('Role', backref=db.backref('role_permissions', lazy=True))
     permission = db.relationship('Permission', backref=db.backref('role_permissions', lazy=True))
@@ -150,6 +168,11 @@ class UtilisateurRole(db.Model):
     creer_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     modifier_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Rôles d'un utilisateur par application (vérification des permissions, navigation)
+    __table_args__ = (
+        db.UniqueConstraint('id_utilisateur', 'app_id', 'role_id', name='uq_utilisateur_role_utilisateur_app_role'),
+    )
+    
     # Relations avec back_populates pour éviter les chevauchements
     utilisateur = db.relationship('Utilisateur', back_populates='utilisateur_roles')
     role = db.relationship('Role', back_populates='utilisateur_roles')
@@ -171,6 +194,9 @@ class Utilisateur(db.Model):
     creer_a = db.Column(db.DateTime, default=datetime.utcnow)
     modifier_a = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     id_entite = db.Column(db.Integer, db.ForeignKey('entite.id'), nullable=False)
+    # Incrémenté à chaque changement de statut, profil, date d'expiration ou rôles :
+    # les tokens portant une époque antérieure sont rejetés
+    security_epoch = db.Column(db.Integer, nullable=False, default=0, server_default='0')
         
     # Relations
     utilisateur_roles = db.relationship('UtilisateurRole', back_populates='utilisateur', cascade='all, delete-orphan')
@@ -234,6 +260,59 @@ class Utilisateur(db.Model):
         ).first()
         
         return role_permissions is not None
+    
+    def has_permission_for_fonction_single_query(self, app_id, nom_fonction):
+        """
+        Même vérification que has_permission_for_fonction, en une seule requête SQL.
+        
+        Parcourt utilisateur_role → role_permission → fonction_permission → fonction_api
+        pour l'utilisateur, l'application et la fonction donnés. Conserve la règle :
+        une fonction sans FonctionPermission est accessible à tout utilisateur ayant
+        au moins un rôle dans l'application.
+        
+        Args:
+            app_id (int): ID de l'application
+            nom_fonction (str): Nom de la fonction API
+            
+        Returns:
+            bool: True si l'utilisateur a la permission, False sinon
+        """
+        statement = _permission_check_statement()
+        return db.session.execute(statement, {
+            'id_utilisateur': self.id_utilisateur,
+            'app_id': app_id,
+            'nom_fonction': nom_fonction
+        }).first() is not None
+
+@lru_cache(maxsize=1)
+def _permission_check_statement():
+    """
+    Requête unique de vérification de permission, construite une seule fois.
+    
+    Parcourt utilisateur_role → role_permission → fonction_permission → fonction_api ;
+    les valeurs sont passées en paramètres liés à l'exécution.
+    """
+    fp_requise = aliased(FonctionPermission)
+    return select(literal(1)).select_from(UtilisateurRole).join(
+        FonctionAPI,
+        and_(
+            FonctionAPI.app_id == UtilisateurRole.app_id,
+            FonctionAPI.nom_fonction == bindparam('nom_fonction')
+        )
+    ).where(
+        UtilisateurRole.id_utilisateur == bindparam('id_utilisateur'),
+        UtilisateurRole.app_id == bindparam('app_id'),
+        or_(
+            # Aucune permission associée à la fonction : accès autorisé
+            ~exists().where(fp_requise.fonction_id == FonctionAPI.fonction_id),
+            # Sinon, un rôle de l'utilisateur doit porter l'une des permissions de la fonction
+            exists().where(
+                RolePermission.role_id == UtilisateurRole.role_id,
+                FonctionPermission.permission_id == RolePermission.permission_id,
+                FonctionPermission.fonction_id == FonctionAPI.fonction_id
+            )
+        )
+    ).limit(1)
 
 class Trace(db.Model):
     __tablename__ = 'trace'
@@ -246,7 +325,18 @@ class Trace(db.Model):
     param = db.Column(db.Text, nullable=True)
     code_sql = db.Column(db.Text, nullable=True)
     end_point = db.Column(db.String(400), nullable=True)
+    # Modèle de la route Flask (/api/utilisateurs/<int:id>) : clé des agrégats trace_rollup
+    route = db.Column(db.String(400), nullable=True)
     id_utilisateur = db.Column(db.Integer, db.ForeignKey('utilisateur.id_utilisateur'), nullable=True)
+    # Identifiant généré à la création : dédoublonne les traces rejouées depuis le spool
+    trace_uuid = db.Column(db.String(36), nullable=True, unique=True, index=True, default=lambda: str(uuid.uuid4()))
+    
+    # Index composites de la pagination par curseur (tri sur date, id décroissants)
+    __table_args__ = (
+        db.Index('ix_trace_date_id', 'date', 'id'),
+        db.Index('ix_trace_utilisateur_date_id', 'id_utilisateur', 'date', 'id'),
+        db.Index('ix_trace_action_date_id', 'action', 'date', 'id'),
+    )
     
     # Relations
     utilisateur = db.relationship('Utilisateur', backref='traces', lazy=True)
@@ -255,7 +345,7 @@ class BlackList(db.Model):
     __tablename__ = 'black_list'
     
     id = db.Column(db.Integer, primary_key=True)
-    numero = db.Column(db.String(20), nullable=False)
+    numero = db.Column(db.String(20), nullable=False, index=True)
     nom = db.Column(db.String(200), nullable=False)
     structure = db.Column(db.String(200), nullable=False)
     date_ajout = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -292,6 +382,11 @@ class Settings(db.Model):
     creer_a = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
     modifier_a = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Un paramètre par codification et par utilisateur
+    __table_args__ = (
+        db.UniqueConstraint('id_utilisateur', 'id_codification', name='uq_settings_utilisateur_codification'),
+    )
+    
     # Ajouter les relations
     utilisateur = db.relationship('Utilisateur', backref='settings')
     codification = db.relationship('Codification', backref='settings')
@@ -318,4 +413,66 @@ class Objectif(db.Model):
     
     # Relations
     utilisateur = db.relationship('Utilisateur', backref='objectifs', lazy=True)
-    application = db.relationship('Application', backref='objectifs', lazy=True) 
\ No newline at end of file
+    application = db.relationship('Application', backref='objectifs', lazy=True) 
+
+class TokenBlocklist(db.Model):
+    __tablename__ = 'token_blocklist'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=False, unique=True, index=True)
+    type_token = db.Column(db.String(16), nullable=False, default='access')
+    id_utilisateur = db.Column(db.Integer, db.ForeignKey('utilisateur.id_utilisateur', ondelete='CASCADE'), nullable=True)
+    # Date d'expiration du token : au-delà, l'entrée est inutile et peut être purgée
+    expire_a = db.Column(db.DateTime, nullable=False, index=True)
+    creer_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+    
+    # Domaine de cache (rbac, settings, codification, pages, blacklist, tokens)
+    domaine = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modifier_a = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TraceRollup(db.Model):
+    __tablename__ = 'trace_rollup'
+    
+    # Agrégat horaire des traces par action, point d'entrée et utilisateur,
+    # tenu à jour par le thread d'écriture des traces (conservé après archivage)
+    id = db.Column(db.Integer, primary_key=True)
+    heure = db.Column(db.DateTime, nullable=False)
+    action = db.Column(db.String(100), nullable=False)
+    # Point d'entrée : modèle de route de la trace (Trace.route), pas son chemin.
+    # '' pour les traces sans point d'entrée, 0 pour les traces sans utilisateur
+    # (valeurs non nulles : la contrainte d'unicité sert aux upserts)
+    end_point = db.Column(db.String(400), nullable=False, default='')
+    id_utilisateur = db.Column(db.Integer, nullable=False, default=0)
+    nombre = db.Column(db.Integer, nullable=False, default=0)
+    erreurs = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('heure', 'action', 'end_point', 'id_utilisateur', name='uq_trace_rollup_cle'),
+        db.Index('ix_trace_rollup_utilisateur_heure', 'id_utilisateur', 'heure'),
+    )
+
+class RequestMetric(db.Model):
+    __tablename__ = 'request_metrics'
+    
+    # Mesures d'une requête HTTP (temps total, temps et nombre de requêtes SQL, taille de la réponse)
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    methode = db.Column(db.String(10), nullable=False)
+    blueprint = db.Column(db.String(100), nullable=True)
+    endpoint = db.Column(db.String(200), nullable=True)
+    nom_fonction = db.Column(db.String(100), nullable=True)
+    statut = db.Column(db.Integer, nullable=False)
+    duree_ms = db.Column(db.Float, nullable=False)
+    db_ms = db.Column(db.Float, nullable=False, default=0)
+    requetes = db.Column(db.Integer, nullable=False, default=0)
+    taille = db.Column(db.Integer, nullable=True)
+    id_utilisateur = db.Column(db.Integer, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_request_metrics_blueprint_date', 'blueprint', 'date'),
+        db.Index('ix_request_metrics_fonction_date', 'nom_fonction', 'date'),
+    )
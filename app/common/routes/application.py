@@ -1,13 +1,12 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.common.controllers.utilisateur_controller import UtilisateurController
+from flask_jwt_extended import jwt_required
 from app.common.controllers.application_controller import ApplicationController
 from app.common.schemas import ApplicationSchema, UtilisateurSchema
-from app.common.decorators import api_fonction, trace_action, auto_set_user_fields
+from app.common.decorators import api_fonction, query_budget, trace_action, auto_set_user_fields
+from app.common.current_user import get_current_utilisateur
 
 application_bp = Blueprint('application', __name__)
 application_controller = ApplicationController()
-utilisateur_controller = UtilisateurController()
 application_schema = ApplicationSchema()
 applications_schema = ApplicationSchema(many=True)
 utilisateur_schema = UtilisateurSchema()
@@ -39,12 +38,12 @@ def get_applications():
         }), 500
 
 @application_bp.route('/mes-apps', methods=['GET'])
+@query_budget(15)
 @jwt_required()
 @trace_action(action_type="APPLICATION", code_prefix="APP_MY")
 def get_my_applications():
     try:
-        login = get_jwt_identity()
-        user = utilisateur_controller.get_utilisateur_by_login(login)
+        user = get_current_utilisateur()
         if not user:
             return jsonify({
                 'error': True,
@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt
 from app.common.controllers.auth_controller import AuthController
 from app.common.schemas import UtilisateurSchema
 from app.common.controllers.trace_controller import TraceController
@@ -65,4 +66,35 @@ def login():
                 'fr': 'Erreur lors de l\'authentification'
             },
             'details': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    """Déconnecter l'utilisateur en révoquant son token"""
+    try:
+        jwt_payload = get_jwt()
+        result, status_code = auth_controller.logout(jwt_payload)
+
+        # Tracer la déconnexion
+        if not result.get('error') and jwt_payload.get('id_utilisateur'):
+            trace_controller.create_trace({
+                'id_utilisateur': jwt_payload['id_utilisateur'],
+                'action': 'AUTH',
+                'code': "AUTH_LOGOUT",
+                'detail': f"Déconnexion de l'utilisateur {jwt_payload.get('sub')}",
+                'end_point': "/api/auth/logout",
+                'param': f"username={jwt_payload.get('sub')}"
+            })
+
+        return jsonify(result), status_code
+
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': {
+                'en': 'Error during logout',
+                'fr': 'Erreur lors de la déconnexion'
+            },
+            'details': str(e)
+        }), 500
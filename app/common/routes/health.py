@@ -0,0 +1,29 @@
+import os
+from flask import Blueprint, jsonify
+from app.common.controllers.health_controller import HealthController
+
+health_bp = Blueprint('health', __name__)
+health_controller = HealthController()
+
+@health_bp.route('', methods=['GET'])
+def get_health():
+    # Sans authentification : interrogé par les sondes et le répartiteur de charge
+    health = health_controller.get_health()
+    health['pid'] = os.getpid()
+    if not health['database']['ok']:
+        return jsonify({
+            "error": True,
+            "message": {
+                "en": "Database unavailable",
+                "fr": "Base de données indisponible"
+            },
+            "data": health
+        }), 503
+    return jsonify({
+        "error": False,
+        "message": {
+            "en": "Service healthy",
+            "fr": "Service opérationnel"
+        },
+        "data": health
+    })
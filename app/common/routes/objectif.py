@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from app.common.controllers.objectif_controller import ObjectifController
 from app.common.schemas import ObjectifSchema
 from app.common.decorators import api_fonction, trace_action, auto_set_user_fields
+from app.common.current_user import get_current_utilisateur
 
 objectif_bp = Blueprint('objectif', __name__)
 objectif_controller = ObjectifController()
@@ -15,9 +16,7 @@ objectifs_schema = ObjectifSchema(many=True)
 @trace_action(action_type="OBJECTIF", code_prefix="OBJ")
 def get_objectifs():
     # Récupérer l'utilisateur courant
-    from app.common.models import Utilisateur
-    current_user_login = get_jwt_identity()
-    current_user = Utilisateur.query.filter_by(login=current_user_login).first()
+    current_user = get_current_utilisateur()
     if not current_user:
         return jsonify({
             "error": True,
@@ -69,9 +68,7 @@ def get_objectifs():
 @trace_action(action_type="OBJECTIF", code_prefix="OBJ_USERS")
 def get_available_users():
     # Récupérer l'utilisateur courant
-    from app.common.models import Utilisateur
-    current_user_login = get_jwt_identity()
-    current_user = Utilisateur.query.filter_by(login=current_user_login).first()
+    current_user = get_current_utilisateur()
     if not current_user:
         return jsonify({
             "error": True,
@@ -133,9 +130,7 @@ def create_objectif():
     data = request.get_json()
     
     # Récupérer l'utilisateur courant
-    from app.common.models import Utilisateur
-    current_user_login = get_jwt_identity()
-    current_user = Utilisateur.query.filter_by(login=current_user_login).first()
+    current_user = get_current_utilisateur()
     if not current_user:
         return jsonify({
             "error": True,
@@ -191,9 +186,7 @@ def update_objectif(id):
     data = request.get_json()
     
     # Récupérer l'utilisateur courant
-    from app.common.models import Utilisateur
-    current_user_login = get_jwt_identity()
-    current_user = Utilisateur.query.filter_by(login=current_user_login).first()
+    current_user = get_current_utilisateur()
     if not current_user:
         return jsonify({
             "error": True,
@@ -1,8 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
+from app.common.current_user import get_current_identity, is_current_token_revoked
 from app.common.controllers.page_controller import PageController
 from app.common.schemas import PageSchema
-from app.common.decorators import api_fonction, trace_action
+from app.common.decorators import api_fonction, query_budget, trace_action
 from app.common.decorators import auto_set_user_fields
 
 page_bp = Blueprint('page', __name__)
@@ -35,6 +36,52 @@ def get_pages():
             'details': str(e)
         }), 500
 
+@page_bp.route('/me', methods=['GET'])
+@query_budget(15)
+@jwt_required()
+def get_my_pages():
+    """
+    Récupérer l'arbre de navigation de l'utilisateur connecté : ses applications
+    et, pour chacune, les pages accessibles triées par ordre.
+    Pas de contrôle api_fonction : chaque utilisateur peut connaître ses propres pages.
+    """
+    try:
+        utilisateur = get_current_identity()
+        if is_current_token_revoked():
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': 'Session revoked, please login again',
+                    'fr': 'Session révoquée, veuillez vous reconnecter'
+                }
+            }), 401
+        if not utilisateur:
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': 'User not found',
+                    'fr': 'Utilisateur non trouvé'
+                }
+            }), 404
+        
+        return jsonify({
+            'error': False,
+            'message': {
+                'en': 'Navigation retrieved successfully',
+                'fr': 'Navigation récupérée avec succès'
+            },
+            'data': page_controller.get_navigation(utilisateur)
+        })
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': {
+                'en': 'Error while retrieving navigation',
+                'fr': 'Erreur lors de la récupération de la navigation'
+            },
+            'details': str(e)
+        }), 500
+
 @page_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 @api_fonction(nom_fonction='get_page', app_id=1, description='Récupérer une page par son ID', auto_register=True)
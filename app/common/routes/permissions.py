@@ -1,8 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
+from app.common.current_user import get_current_identity, is_current_token_revoked
 from app.common.controllers.permission_controller import PermissionController
 from app.common.schemas import PermissionSchema, RoleSchema
-from app.common.decorators import api_fonction, trace_action
+from app.common.decorators import api_fonction, query_budget, trace_action
 from app.common.decorators import auto_set_user_fields
 
 
@@ -12,6 +13,9 @@ permission_schema = PermissionSchema()
 permissions_schema = PermissionSchema(many=True)
 roles_schema = RoleSchema(many=True)
 
+# Nombre maximal de fonctions évaluées par appel à /evaluate
+MAX_FONCTIONS_EVALUATION = 500
+
 @permission_bp.route('/', methods=['GET'])
 @jwt_required()
 @api_fonction(nom_fonction='get_permissions', app_id=1, description='Récupérer toutes les permissions avec pagination', auto_register=True)
@@ -281,4 +285,108 @@ def search_permissions():
                 'fr': 'Erreur lors de la recherche des permissions'
             },
             'details': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+@permission_bp.route('/evaluate', methods=['POST'])
+@query_budget(12)
+@jwt_required()
+def evaluate_permissions():
+    """
+    Évaluer en un seul appel les droits de l'utilisateur connecté sur une liste de fonctions API.
+    
+    Corps attendu :
+        {"fonctions": ["get_roles", {"nom_fonction": "get_pages", "app_id": 2}], "app_ids": [1]}
+    Les noms simples sont évalués pour chaque application de app_ids (ou app_id,
+    par défaut DEFAULT_APP_ID). Pas de contrôle api_fonction : chaque utilisateur
+    peut connaître ses propres droits.
+    """
+    try:
+        utilisateur = get_current_identity()
+        if is_current_token_revoked():
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': 'Session revoked, please login again',
+                    'fr': 'Session révoquée, veuillez vous reconnecter'
+                }
+            }), 401
+        if not utilisateur:
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': 'User not found',
+                    'fr': 'Utilisateur non trouvé'
+                }
+            }), 404
+        
+        data = request.get_json(silent=True) or {}
+        fonctions = data.get('fonctions')
+        if not isinstance(fonctions, list) or not fonctions:
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': 'A non-empty list "fonctions" is required',
+                    'fr': 'Une liste "fonctions" non vide est requise'
+                }
+            }), 400
+        
+        app_ids = data.get('app_ids')
+        if app_ids is None:
+            app_ids = [data.get('app_id') or current_app.config.get('DEFAULT_APP_ID')]
+        
+        # Regrouper les fonctions demandées par application
+        demandes = {}
+        try:
+            app_ids = [int(app_id) for app_id in app_ids]
+            for fonction in fonctions:
+                if isinstance(fonction, str):
+                    for app_id in app_ids:
+                        demandes.setdefault(app_id, set()).add(fonction)
+                elif isinstance(fonction, dict) and isinstance(fonction.get('nom_fonction'), str):
+                    fonction_app_ids = [int(fonction['app_id'])] if fonction.get('app_id') is not None else app_ids
+                    for app_id in fonction_app_ids:
+                        demandes.setdefault(app_id, set()).add(fonction['nom_fonction'])
+                else:
+                    raise ValueError(f"Fonction invalide: {fonction}")
+        except (TypeError, ValueError) as e:
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': 'Invalid fonctions or app_ids',
+                    'fr': 'Fonctions ou app_ids invalides'
+                },
+                'details': str(e)
+            }), 400
+        
+        if sum(len(noms) for noms in demandes.values()) > MAX_FONCTIONS_EVALUATION:
+            return jsonify({
+                'error': True,
+                'message': {
+                    'en': f'At most {MAX_FONCTIONS_EVALUATION} functions can be evaluated per call',
+                    'fr': f'Au plus {MAX_FONCTIONS_EVALUATION} fonctions peuvent être évaluées par appel'
+                }
+            }), 400
+        
+        resultat = permissions_controller.evaluate_fonctions(
+            utilisateur,
+            demandes,
+            use_matrix=current_app.config.get('PERMISSION_MATRIX_ENABLED', True)
+        )
+        
+        return jsonify({
+            'error': False,
+            'message': {
+                'en': 'Permissions evaluated successfully',
+                'fr': 'Permissions évaluées avec succès'
+            },
+            'data': {str(app_id): decisions for app_id, decisions in resultat.items()}
+        })
+    except Exception as e:
+        return jsonify({
+            'error': True,
+            'message': {
+                'en': 'Error while evaluating permissions',
+                'fr': 'Erreur lors de l\'évaluation des permissions'
+            },
+            'details': str(e)
+        }), 500
@@ -2,7 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from app.common.controllers.role_controller import RoleController
 from app.common.schemas import RoleSchema, PermissionSchema, RolePermissionSchema
-from app.common.decorators import api_fonction, trace_action
+from app.common.decorators import api_fonction, query_budget, trace_action
 from app.common.decorators import auto_set_user_fields
 
 role_bp = Blueprint('roles', __name__)
@@ -13,6 +13,7 @@ permissions_schema = PermissionSchema(many=True)
 role_permissions_schema = RolePermissionSchema(many=True)
 
 @role_bp.route('/', methods=['GET'])
+@query_budget(15)
 @jwt_required()
 @api_fonction(nom_fonction='get_roles', app_id=1, description='Récupérer tous les rôles avec leurs permissions', auto_register=True)
 @trace_action(action_type="ROLE", code_prefix="ROLE")
@@ -52,6 +53,7 @@ def get_roles():
     return jsonify(result)
 
 @role_bp.route('/application/<int:app_id>', methods=['GET'])
+@query_budget(15)
 @jwt_required()
 @api_fonction(nom_fonction='get_roles_by_app', app_id=1, description='Récupérer les rôles par application', auto_register=True)
 @trace_action(action_type="ROLE", code_prefix="ROLE_APP")
@@ -1,17 +1,70 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required
 from app.common.controllers.trace_controller import TraceController
 from app.common.schemas import TraceSchema
-from datetime import datetime
-from app.common.decorators import api_fonction, trace_action
+from datetime import datetime, timedelta
+from app.common.decorators import api_fonction, query_budget, trace_action
 from app.common.decorators import auto_set_user_fields
+from app.common.utils.keyset_pagination import InvalidCursorError
+from app.common.services.trace_rollup_service import DIMENSIONS, GRANULARITES
+from app.common.services.request_metrics_service import DIMENSIONS as METRICS_DIMENSIONS
 
 trace_bp = Blueprint('trace', __name__)
 trace_controller = TraceController()
 trace_schema = TraceSchema()
 traces_schema = TraceSchema(many=True)
 
+# Formats d'export et type MIME associé
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+def _cursor_mode():
+    """Pagination par curseur demandée (paramètre cursor, vide pour la première page)"""
+    return 'cursor' in request.args
+
+def _keyset_response(get_page, message_en="Trace entries retrieved successfully",
+                     message_fr="Entrées de trace récupérées avec succès"):
+    """Réponse paginée par curseur ; get_page(cursor, with_total) retourne une KeysetPage"""
+    cursor = request.args.get('cursor') or None
+    with_total = request.args.get('with_total', 'false').lower() == 'true'
+    try:
+        traces_page = get_page(cursor, with_total)
+    except InvalidCursorError as e:
+        return jsonify({
+            'error': True,
+            'message': {
+                'en': 'Invalid pagination cursor',
+                'fr': 'Curseur de pagination invalide'
+            },
+            'details': str(e)
+        }), 400
+    
+    pagination_metadata = {
+        "per_page": traces_page.per_page,
+        "has_next": traces_page.has_next,
+        "has_prev": traces_page.has_prev,
+        "next_cursor": traces_page.next_cursor,
+        "prev_cursor": traces_page.prev_cursor
+    }
+    if with_total:
+        pagination_metadata["total_items"] = traces_page.total
+        pagination_metadata["total_is_approximate"] = traces_page.total_approximatif
+    
+    result = {
+        "error": False,
+        "message": {
+            "en": message_en,
+            "fr": message_fr
+        },
+        "data": traces_schema.dump(traces_page.items),
+        "pagination": pagination_metadata
+    }
+    return jsonify(result)
+
 @trace_bp.route('/', methods=['GET'])
+@query_budget(15)
 @jwt_required()
 @api_fonction(nom_fonction='get_traces', app_id=1, description='Récupérer toutes les traces avec pagination', auto_register=True)
 @trace_action(action_type="TRACE", code_prefix="TRC")
@@ -25,6 +78,11 @@ def get_traces():
     if per_page > max_per_page:
         per_page = max_per_page
     
+    if _cursor_mode():
+        return _keyset_response(
+            lambda cursor, with_total: trace_controller.get_traces_keyset(cursor, per_page, with_total)
+        )
+    
     # Récupérer les entrées paginées
     traces_paginated = trace_controller.get_traces_paginated(page, per_page)
     
@@ -51,6 +109,179 @@ def get_traces():
     }
     return jsonify(result)
 
+@trace_bp.route('/export', methods=['GET'])
+@jwt_required()
+@api_fonction(nom_fonction='export_traces', app_id=1, description='Exporter les traces en flux (NDJSON ou CSV)', auto_register=True)
+@trace_action(action_type="TRACE", code_prefix="TRC_EXPORT")
+def export_traces():
+    format_export = request.args.get('format', 'ndjson').lower()
+    if format_export not in EXPORT_FORMATS:
+        result = {
+            "error": True,
+            "message": {
+                "en": "Invalid export format. Use ndjson or csv",
+                "fr": "Format d'export invalide. Utilisez ndjson ou csv"
+            }
+        }
+        return jsonify(result), 400
+    
+    utilisateur_id = request.args.get('utilisateur_id', type=int)
+    action = request.args.get('action')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    try:
+        start_date = datetime.fromisoformat(start_date) if start_date else None
+        end_date = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        result = {
+            "error": True,
+            "message": {
+                "en": "Invalid date format. Use ISO format (YYYY-MM-DD)",
+                "fr": "Format de date invalide. Utilisez le format ISO (AAAA-MM-JJ)"
+            }
+        }
+        return jsonify(result), 400
+    
+    # Flux sans Content-Length : transfert par morceaux (chunked)
+    chunks = trace_controller.iter_export(
+        format_export, utilisateur_id, action, start_date, end_date,
+        current_app.config.get('TRACE_EXPORT_CHUNK_SIZE', 1000)
+    )
+    nom_fichier = f"traces_{datetime.utcnow():%Y%m%d_%H%M%S}.{format_export}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[format_export],
+        headers={'Content-Disposition': f'attachment; filename="{nom_fichier}"'}
+    )
+
+def _stats_params():
+    """
+    Lit la plage (start_date, end_date inclus, 30 derniers jours par défaut) et
+    les filtres des statistiques. Retourne (params, None) ou (None, réponse d'erreur).
+    """
+    try:
+        end_date = request.args.get('end_date')
+        end_date = datetime.fromisoformat(end_date) if end_date else datetime.utcnow()
+        start_date = request.args.get('start_date')
+        start_date = datetime.fromisoformat(start_date) if start_date else end_date - timedelta(days=30)
+    except ValueError:
+        return None, (jsonify({
+            "error": True,
+            "message": {
+                "en": "Invalid date format. Use ISO format (YYYY-MM-DD)",
+                "fr": "Format de date invalide. Utilisez le format ISO (AAAA-MM-JJ)"
+            }
+        }), 400)
+    
+    filtres = {
+        'action': request.args.get('action'),
+        'end_point': request.args.get('end_point'),
+        'utilisateur': request.args.get('utilisateur_id', type=int)
+    }
+    # end_date inclus (comme les autres routes par plage de dates) ; heure précise conservée si fournie
+    if end_date.time() == datetime.min.time():
+        end_date = end_date + timedelta(days=1)
+    return {'start_date': start_date, 'end_date': end_date, 'filtres': filtres}, None
+
+@trace_bp.route('/stats', methods=['GET'])
+@jwt_required()
+@api_fonction(nom_fonction='get_trace_stats', app_id=1, description='Statistiques d\'activité (agrégats horaires des traces)', auto_register=True)
+@trace_action(action_type="TRACE", code_prefix="TRC_STATS")
+def get_trace_stats():
+    params, erreur = _stats_params()
+    if erreur:
+        return erreur
+    
+    granularite = request.args.get('granularity')
+    group_by = [dimension.strip() for dimension in request.args.get('group_by', '').split(',') if dimension.strip()]
+    if (granularite and granularite not in GRANULARITES) or any(dimension not in DIMENSIONS for dimension in group_by):
+        return jsonify({
+            "error": True,
+            "message": {
+                "en": f"Invalid granularity or group_by. Use granularity in {', '.join(GRANULARITES)} and group_by in {', '.join(DIMENSIONS)}",
+                "fr": f"Granularité ou regroupement invalide. Utilisez granularity parmi {', '.join(GRANULARITES)} et group_by parmi {', '.join(DIMENSIONS)}"
+            }
+        }), 400
+    
+    stats = trace_controller.get_stats(
+        params['start_date'], params['end_date'], granularite, group_by, params['filtres'],
+        min(request.args.get('limit', 1000, type=int), 10000)
+    )
+    result = {
+        "error": False,
+        "message": {
+            "en": "Trace statistics retrieved successfully",
+            "fr": "Statistiques des traces récupérées avec succès"
+        },
+        "data": stats
+    }
+    return jsonify(result)
+
+@trace_bp.route('/stats/top', methods=['GET'])
+@jwt_required()
+@api_fonction(nom_fonction='get_trace_stats_top', app_id=1, description='Actions, points d\'entrée ou utilisateurs les plus actifs', auto_register=True)
+@trace_action(action_type="TRACE", code_prefix="TRC_STATS")
+def get_trace_stats_top():
+    params, erreur = _stats_params()
+    if erreur:
+        return erreur
+    
+    dimension = request.args.get('dimension', 'action')
+    if dimension not in DIMENSIONS:
+        return jsonify({
+            "error": True,
+            "message": {
+                "en": f"Invalid dimension. Use one of {', '.join(DIMENSIONS)}",
+                "fr": f"Dimension invalide. Utilisez l'une de {', '.join(DIMENSIONS)}"
+            }
+        }), 400
+    
+    top = trace_controller.get_top(
+        dimension, params['start_date'], params['end_date'], params['filtres'],
+        min(request.args.get('limit', 10, type=int), 1000)
+    )
+    result = {
+        "error": False,
+        "message": {
+            "en": "Trace statistics retrieved successfully",
+            "fr": "Statistiques des traces récupérées avec succès"
+        },
+        "data": top
+    }
+    return jsonify(result)
+
+@trace_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+@api_fonction(nom_fonction='get_request_metrics', app_id=1, description='Percentiles de latence et requêtes SQL par blueprint ou fonction API', auto_register=True)
+def get_request_metrics():
+    params, erreur = _stats_params()
+    if erreur:
+        return erreur
+    
+    group_by = request.args.get('group_by', 'blueprint')
+    if group_by not in METRICS_DIMENSIONS:
+        return jsonify({
+            "error": True,
+            "message": {
+                "en": f"Invalid group_by. Use one of {', '.join(METRICS_DIMENSIONS)}",
+                "fr": f"Regroupement invalide. Utilisez l'un de {', '.join(METRICS_DIMENSIONS)}"
+            }
+        }), 400
+    
+    metrics = trace_controller.get_request_metrics(
+        params['start_date'], params['end_date'], group_by,
+        min(request.args.get('limit', 100, type=int), 1000)
+    )
+    result = {
+        "error": False,
+        "message": {
+            "en": "Request metrics retrieved successfully",
+            "fr": "Mesures des requêtes récupérées avec succès"
+        },
+        "data": metrics
+    }
+    return jsonify(result)
+
 @trace_bp.route('/<int:id>', methods=['GET'])
 @jwt_required()
 @api_fonction(nom_fonction='get_trace', app_id=1, description='Récupérer une trace par son ID', auto_register=True)
@@ -179,6 +410,11 @@ def get_traces_by_utilisateur(utilisateur_id):
     if per_page > max_per_page:
         per_page = max_per_page
     
+    if _cursor_mode():
+        return _keyset_response(
+            lambda cursor, with_total: trace_controller.get_traces_by_utilisateur_keyset(utilisateur_id, cursor, per_page, with_total)
+        )
+    
     # Récupérer les entrées paginées
     traces_paginated = trace_controller.get_traces_by_utilisateur_paginated(utilisateur_id, page, per_page)
     
@@ -219,6 +455,11 @@ def get_traces_by_action(action):
     if per_page > max_per_page:
         per_page = max_per_page
     
+    if _cursor_mode():
+        return _keyset_response(
+            lambda cursor, with_total: trace_controller.get_traces_by_action_keyset(action, cursor, per_page, with_total)
+        )
+    
     # Récupérer les entrées paginées
     traces_paginated = trace_controller.get_traces_by_action_paginated(action, page, per_page)
     
@@ -285,6 +526,11 @@ def get_traces_by_date_range():
     if per_page > max_per_page:
         per_page = max_per_page
     
+    if _cursor_mode():
+        return _keyset_response(
+            lambda cursor, with_total: trace_controller.get_traces_by_date_range_keyset(start_date, end_date, cursor, per_page, with_total)
+        )
+    
     # Récupérer les entrées paginées
     traces_paginated = trace_controller.get_traces_by_date_range_paginated(start_date, end_date, page, per_page)
     
@@ -333,6 +579,13 @@ def search_traces():
                 }
             }), 400
         
+        if _cursor_mode():
+            return _keyset_response(
+                lambda cursor, with_total: trace_controller.search_traces_keyset(search_term, cursor, per_page, with_total),
+                "Search results retrieved successfully",
+                "Résultats de recherche récupérés avec succès"
+            )
+        
         traces_paginated = trace_controller.search_traces_paginated(search_term, page, per_page)
         
         pagination_metadata = {
@@ -131,6 +131,7 @@ class TraceSchema(Schema):
     code_sql = fields.Str(required=False)
     end_point = fields.Str(required=False)
     id_utilisateur = fields.Int(required=False, allow_none=True)
+    trace_uuid = fields.Str(dump_only=True)
     utilisateur = fields.Nested(UtilisateurSchema, dump_only=True)
 
 class BlackListSchema(Schema):
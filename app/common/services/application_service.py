@@ -28,15 +28,10 @@ class ApplicationService:
         if getattr(user, 'profile', None) == 'Administrateur' or getattr(user, 'profil', None) == 'Administrateur':
             return Application.query.all()
 
-        # Récupérer les app_id distincts où l'utilisateur possède au moins un rôle
-        app_ids = db.session.query(UtilisateurRole.app_id).filter_by(id_utilisateur=user.id_utilisateur).distinct().all()
-        app_ids = [row[0] for row in app_ids]
-
-        if not app_ids:
-            return []
-
-        # Retourner les applications correspondantes
-        return Application.query.filter(Application.app_id.in_(app_ids)).all()
+        # Applications où l'utilisateur possède au moins un rôle
+        # (rôles et applications déjà chargés avec l'utilisateur courant)
+        applications = [application for application in user.applications if application is not None]
+        return sorted(applications, key=lambda application: application.app_id)
     
     def get_utilisateurs_by_application_paginated(self, app_id, page, per_page):
         """Récupérer tous les utilisateurs d'une application avec pagination"""
@@ -1,7 +1,10 @@
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 import requests
 from flask_jwt_extended import create_access_token
 from app.common.models import Utilisateur, db
+from app.common.services.token_blocklist_service import token_blocklist
+from app.common.services.prometheus_service import prometheus_metrics
 
 class AuthService:
     def authenticate_user(self, login, password):
@@ -23,23 +26,33 @@ class AuthService:
 
             # Authentification LDAP
             ldap_api_url = "http://10.173.69.41:6003/auth"
-            ldap_response = requests.post(ldap_api_url, json={
-                "login": login,
-                "password": password
-            })
+            debut = time.perf_counter()
+            try:
+                ldap_response = requests.post(ldap_api_url, json={
+                    "login": login,
+                    "password": password
+                })
+            except requests.RequestException:
+                prometheus_metrics.observe_ldap(time.perf_counter() - debut, 'erreur')
+                raise
 
             if ldap_response.status_code != 200:
+                prometheus_metrics.observe_ldap(time.perf_counter() - debut, 'erreur')
                 return None, "ldap_error"
 
             ldap_data = ldap_response.json()
             if ldap_data['code'] != '200':
+                prometheus_metrics.observe_ldap(time.perf_counter() - debut, 'refus')
                 return None, "invalid_credentials"
+            prometheus_metrics.observe_ldap(time.perf_counter() - debut, 'ok')
 
             # Création du token JWT
             additional_claims = {
                 "profil": utilisateur.profil,
                 "id_utilisateur": utilisateur.id_utilisateur,
-                "id_entite": utilisateur.id_entite
+                "id_entite": utilisateur.id_entite,
+                # Époque de sécurité : le token est rejeté dès qu'elle change en base
+                "sec_epoch": utilisateur.security_epoch or 0
             }
 
             access_token = create_access_token(
@@ -55,4 +68,21 @@ class AuthService:
 
         except Exception as e:
             print(f"Authentication error: {str(e)}")
-            return None, "system_error" 
\ No newline at end of file
+            return None, "system_error"
+
+    def logout(self, jwt_payload):
+        """
+        Révoque le token de la requête (ajout de son jti à la liste de blocage)
+        """
+        try:
+            token_blocklist.revoke(
+                jti=jwt_payload['jti'],
+                expire_a=datetime.fromtimestamp(jwt_payload['exp'], timezone.utc).replace(tzinfo=None),
+                id_utilisateur=jwt_payload.get('id_utilisateur'),
+                type_token=jwt_payload.get('type', 'access')
+            )
+            return True, "success"
+        except Exception as e:
+            db.session.rollback()
+            print(f"Logout error: {str(e)}")
+            return False, "system_error"
@@ -0,0 +1,180 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.common.services.db_routing_service import use_primary
+from app.common.models import (
+    db, CacheVersion, UtilisateurRole, FonctionAPI, FonctionPermission, RolePermission,
+    Role, Permission, Page, PermissionPage, Application, Settings, Codification,
+    BlackList, TokenBlocklist
+)
+
+# Domaines de cache et modèles dont l'écriture les invalide
+DOMAINES = {
+    'rbac': (UtilisateurRole, FonctionAPI, FonctionPermission, RolePermission, Role, Permission),
+    'settings': (Settings,),
+    'codification': (Codification,),
+    'pages': (Page, PermissionPage, Application),
+    'blacklist': (BlackList,),
+    # Droits des tokens déjà émis : marqué par security_epoch_service quand une écriture
+    # sur Utilisateur ou UtilisateurRole incrémente une époque de sécurité
+    'tokens': (),
+    # Nouvelles révocations (logout) : seul le filtre de Bloom de la liste de blocage
+    # est complété, sans vider les caches par utilisateur
+    'revocations': (TokenBlocklist,),
+}
+
+_PENDING_KEY = 'cache_version_domaines'
+
+
+class CacheVersionChannel:
+    """
+    Canal d'invalidation des caches entre processus (workers gunicorn).
+
+    Chaque domaine a un numéro de version dans la table cache_version, incrémenté
+    dans la transaction qui modifie un modèle du domaine. Chaque processus relit
+    la table au plus une fois par intervalle (avant une requête) et appelle les
+    fonctions abonnées aux domaines dont la version a changé. Dans le processus
+    qui a écrit, les abonnés sont appelés dès la validation de la transaction.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # domaine -> [callback]
+        self._abonnes = {}
+        # domaine -> dernière version lue (None avant la première lecture)
+        self._versions = None
+        self._dernier_poll = 0.0
+        self.polls = 0
+
+    def subscribe(self, domaine, callback):
+        """Abonne une fonction (sans argument) à l'invalidation d'un domaine"""
+        if domaine not in DOMAINES:
+            raise ValueError(f"Domaine de cache inconnu: {domaine}")
+        self._abonnes.setdefault(domaine, []).append(callback)
+
+    def notify_local(self, domaines):
+        """Appelle les abonnés des domaines donnés dans ce processus"""
+        for domaine in domaines:
+            for callback in self._abonnes.get(domaine, ()):
+                callback()
+
+    @use_primary()
+    def poll(self, interval_ms=1000):
+        """
+        Relit les versions si le dernier passage date de plus de interval_ms et
+        invalide les domaines modifiés par les autres processus.
+
+        Returns:
+            list: Domaines invalidés
+        """
+        now = time.monotonic()
+        if now - self._dernier_poll < interval_ms / 1000:
+            return []
+        with self._lock:
+            # Un seul thread relit la table par intervalle
+            if now - self._dernier_poll < interval_ms / 1000:
+                return []
+            self._dernier_poll = now
+
+        self.polls += 1
+        versions = dict(db.session.execute(select(CacheVersion.domaine, CacheVersion.version)).all())
+        precedentes, self._versions = self._versions, versions
+        if precedentes is None:
+            return []
+
+        modifies = [domaine for domaine, version in versions.items() if precedentes.get(domaine) != version]
+        self.notify_local(modifies)
+        return modifies
+
+    def ensure_domains(self):
+        """Crée les lignes manquantes de cache_version (dans sa propre transaction)"""
+        table = CacheVersion.__table__
+        with db.engine.begin() as connection:
+            existants = set(connection.execute(select(table.c.domaine)).scalars())
+            manquants = [domaine for domaine in DOMAINES if domaine not in existants]
+            if manquants:
+                now = datetime.utcnow()
+                connection.execute(insert(table), [
+                    {'domaine': domaine, 'version': 0, 'modifier_a': now} for domaine in manquants
+                ])
+        return manquants
+
+
+cache_versions = CacheVersionChannel()
+
+
+def mark_domain(session, domaine):
+    """Marque un domaine comme modifié dans la transaction en cours de la session"""
+    session.info.setdefault(_PENDING_KEY, set()).add(domaine)
+
+
+def _mark_objects(session, objects):
+    for obj in objects:
+        for domaine, models in DOMAINES.items():
+            if isinstance(obj, models):
+                mark_domain(session, domaine)
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flush(session, flush_context):
+    _mark_objects(session, session.new)
+    _mark_objects(session, session.dirty)
+    _mark_objects(session, session.deleted)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_bulk(orm_execute_state):
+    # Query.delete() / Query.update() et insert() en masse ne passent pas par le flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    for domaine, models in DOMAINES.items():
+        if issubclass(mapper.class_, models):
+            mark_domain(orm_execute_state.session, domaine)
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_versions(session):
+    # Vider les changements en attente pour que leurs domaines soient marqués
+    session.flush()
+    domaines = session.info.get(_PENDING_KEY)
+    if not domaines:
+        return
+
+    table = CacheVersion.__table__
+    connection = session.connection()
+    now = datetime.utcnow()
+    for domaine in sorted(domaines):
+        result = connection.execute(
+            update(table)
+            .where(table.c.domaine == domaine)
+            .values(version=table.c.version + 1, modifier_a=now)
+        )
+        if result.rowcount == 0:
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(table).values(domaine=domaine, version=1, modifier_a=now))
+            except IntegrityError:
+                # Ligne créée en parallèle par un autre processus
+                connection.execute(
+                    update(table)
+                    .where(table.c.domaine == domaine)
+                    .values(version=table.c.version + 1, modifier_a=now)
+                )
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify_on_commit(session):
+    domaines = session.info.pop(_PENDING_KEY, None)
+    if domaines:
+        cache_versions.notify_local(domaines)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,145 @@
+import threading
+import time
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Options propres à QueuePool, retirées pour les autres pools (SQLite en mémoire)
+_OPTIONS_QUEUE_POOL = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_use_lifo')
+
+
+class MeasuredQueuePool(QueuePool):
+    """QueuePool qui mesure l'attente de chaque emprunt de connexion et compte les délais dépassés"""
+
+    # Journalisé sous sqlalchemy.pool.* comme le pool d'origine (et non sous le logger de l'application)
+    __module__ = QueuePool.__module__
+
+    def _do_get(self):
+        debut = time.perf_counter()
+        try:
+            connexion = super()._do_get()
+        except exc.TimeoutError:
+            db_pool.record_timeout()
+            raise
+        db_pool.record_checkout(time.perf_counter() - debut)
+        return connexion
+
+
+class DbPoolMonitor:
+    """
+    Télémétrie du pool de connexions de l'engine.
+
+    configure_engine, appelé avant la création de l'engine, complète
+    SQLALCHEMY_ENGINE_OPTIONS (taille, débordement, délai d'attente, recyclage,
+    pre-ping de la classe de configuration) et remplace le QueuePool par
+    MeasuredQueuePool, qui mesure l'attente des emprunts et compte les délais
+    dépassés. Les chiffres sont propres au processus : sous gunicorn, chaque
+    worker a son pool (voir /metrics pour l'agrégat des workers).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.attente_totale = 0.0
+        self.attente_max = 0.0
+        # Fonctions appelées avec la durée d'attente de chaque emprunt (métriques Prometheus)
+        self._observateurs = []
+
+    @staticmethod
+    def configure_engine(app):
+        """
+        Prépare les options de l'engine de app (avant db.init_app) ; les bases de
+        SQLALCHEMY_BINDS déclarées par une simple URL (réplicas) reçoivent les mêmes
+        options de pool que la base principale
+        """
+        base = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = DbPoolMonitor._options_pool(app.config['SQLALCHEMY_DATABASE_URI'], base)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for cle, bind in binds.items():
+            if isinstance(bind, str):
+                binds[cle] = {'url': bind, **DbPoolMonitor._options_pool(bind, base)}
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    @staticmethod
+    def _options_pool(url, base):
+        options = dict(base)
+        url = make_url(url)
+        if url.get_dialect().get_pool_class(url) is QueuePool:
+            options.setdefault('poolclass', MeasuredQueuePool)
+        else:
+            # SQLite en mémoire : pool statique, sans taille ni débordement
+            for option in _OPTIONS_QUEUE_POOL:
+                options.pop(option, None)
+        return options
+
+    def add_observer(self, callback):
+        """Enregistre une fonction appelée avec l'attente (secondes) de chaque emprunt"""
+        if callback not in self._observateurs:
+            self._observateurs.append(callback)
+
+    def record_checkout(self, secondes):
+        with self._lock:
+            self.checkouts += 1
+            self.attente_totale += secondes
+            if secondes > self.attente_max:
+                self.attente_max = secondes
+        for callback in self._observateurs:
+            callback(secondes)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def status(self, engine):
+        """
+        État du pool et mesures des emprunts depuis le démarrage du processus.
+
+        Returns:
+            dict: {'classe', 'taille', 'debordement_max', 'en_cours', 'debordement', 'disponibles',
+                   'delai_attente_s', 'saturation', 'emprunts', 'attente_moyenne_ms', 'attente_max_ms',
+                   'delais_depasses'}
+        """
+        pool = engine.pool
+        etat = {'classe': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            taille = pool.size()
+            debordement_max = pool._max_overflow
+            en_cours = pool.checkedout()
+            capacite = taille + debordement_max if debordement_max >= 0 else None
+            etat.update({
+                'taille': taille,
+                'debordement_max': debordement_max,
+                'en_cours': en_cours,
+                'debordement': max(pool.overflow(), 0),
+                'disponibles': pool.checkedin(),
+                'delai_attente_s': pool._timeout,
+                'saturation': round(en_cours / capacite, 3) if capacite else None
+            })
+        with self._lock:
+            etat.update({
+                'emprunts': self.checkouts,
+                'attente_moyenne_ms': round(self.attente_totale / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'attente_max_ms': round(self.attente_max * 1000, 3),
+                'delais_depasses': self.timeouts
+            })
+        return etat
+
+    def ping(self, session):
+        """
+        Vérifie la base par un SELECT 1 dans la session (connexion déjà empruntée
+        par la requête si elle en a une : pas d'emprunt supplémentaire).
+
+        Returns:
+            tuple: (ok, durée en ms, erreur ou None)
+        """
+        debut = time.perf_counter()
+        try:
+            session.execute(text('SELECT 1'))
+        except Exception as e:
+            session.rollback()
+            return False, round((time.perf_counter() - debut) * 1000, 2), str(e)
+        return True, round((time.perf_counter() - debut) * 1000, 2), None
+
+
+db_pool = DbPoolMonitor()
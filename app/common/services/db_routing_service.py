@@ -0,0 +1,301 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session as OrmSession
+
+# Préfixe des clés de SQLALCHEMY_BINDS désignant des réplicas en lecture
+REPLICA_PREFIX = 'replica'
+
+# Méthodes HTTP dont le handler est servi par les réplicas
+METHODES_LECTURE = ('GET', 'HEAD')
+
+# Nombre maximal d'utilisateurs suivis pour la lecture de leurs écritures (purge au-delà)
+MAX_ECRIVAINS = 10000
+
+# Mode de lecture imposé par read_only() / use_primary() : 'replica', 'primary' ou None
+_mode = ContextVar('db_routing_mode', default=None)
+
+
+@contextmanager
+def read_only():
+    """
+    Lectures du bloc (ou de la fonction décorée) servies par un réplica.
+
+        @read_only()
+        def summary(self, ...): ...
+    """
+    jeton = _mode.set('replica')
+    try:
+        yield
+    finally:
+        _mode.reset(jeton)
+
+
+@contextmanager
+def use_primary():
+    """
+    Lectures du bloc (ou de la fonction décorée) servies par la base principale,
+    même pendant une requête GET : chargement des caches du processus, dont le
+    contenu ne doit pas refléter le retard d'un réplica.
+    """
+    jeton = _mode.set('primary')
+    try:
+        yield
+    finally:
+        _mode.reset(jeton)
+
+
+class RoutingSession(Session):
+    """Session qui envoie les SELECT des lectures routées vers un réplica (DbRouter)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and db_router.routable(self, clause):
+            engine = db_router.replica_engine(self)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class _Replica:
+    __slots__ = ('cle', 'disponible', 'retard_s', 'erreur', 'verifie_a', 'lectures')
+
+    def __init__(self, cle):
+        self.cle = cle
+        self.disponible = True
+        self.retard_s = None
+        self.erreur = None
+        self.verifie_a = 0.0
+        self.lectures = 0
+
+
+class DbRouter:
+    """
+    Routage des lectures vers les réplicas déclarés dans SQLALCHEMY_BINDS
+    (clés replica*, alimentées par DB_REPLICA_URLS).
+
+    Sont routés les SELECT (hors FOR UPDATE) des handlers GET et des blocs
+    read_only() ; tout le reste (écritures, SQL textuel, flush, commandes)
+    reste sur la base principale. Une requête garde le même réplica jusqu'à la
+    fin de sa transaction, et repasse sur la base principale dès sa première
+    écriture.
+
+    - Tourniquet entre les réplicas disponibles.
+    - Retard : chaque réplica est contrôlé au plus une fois par
+      DB_REPLICA_CHECK_INTERVAL_S (SHOW REPLICA STATUS sous MySQL, ou
+      DB_REPLICA_LAG_QUERY) ; un réplica injoignable ou en retard de plus de
+      DB_REPLICA_MAX_LAG_S est écarté jusqu'au contrôle suivant, et sans
+      réplica disponible les lectures vont à la base principale.
+    - Lecture de ses écritures : pendant DB_READ_YOUR_WRITES_S après une
+      requête qui a écrit, les lectures de cet utilisateur restent sur la base
+      principale. Le suivi est propre au processus : sous gunicorn, le délai
+      doit couvrir le retard toléré (DB_REPLICA_MAX_LAG_S) pour qu'un autre
+      worker ne serve pas une lecture périmée.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._controle_lock = threading.Lock()
+        self._replicas = []
+        self._suivant = 0
+        # identité JWT -> fin (monotonic) de la fenêtre de lecture de ses écritures
+        self._ecrivains = {}
+        self.enabled = False
+        self.lectures_principales = 0
+        self._ecouteurs = False
+
+    def init_app(self, app):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        self._replicas = [_Replica(cle) for cle in sorted(binds) if cle.startswith(REPLICA_PREFIX)]
+        self.enabled = bool(self._replicas) and app.config.get('DB_READ_REPLICAS_ENABLED', True)
+        self.max_lag = app.config.get('DB_REPLICA_MAX_LAG_S', 5)
+        self.intervalle = app.config.get('DB_REPLICA_CHECK_INTERVAL_S', 5)
+        self.requete_retard = app.config.get('DB_REPLICA_LAG_QUERY') or None
+        self.fenetre = app.config.get('DB_READ_YOUR_WRITES_S', 10)
+        if not self.enabled:
+            return
+
+        app.before_request(self._debut)
+        app.after_request(self._fin)
+        if not self._ecouteurs:
+            event.listen(OrmSession, 'after_flush', self._ecriture_flush)
+            event.listen(OrmSession, 'do_orm_execute', self._ecriture_en_masse)
+            event.listen(OrmSession, 'after_transaction_end', self._fin_transaction)
+            self._ecouteurs = True
+
+    # Décision de routage
+
+    def routable(self, session, clause):
+        """Une instruction de la session peut-elle être servie par un réplica ?"""
+        if not self.enabled or session.info.get('db_ecriture'):
+            return False
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        mode = _mode.get()
+        if mode is None and has_request_context():
+            mode = g.get('db_lecture')
+        if mode != 'replica':
+            return False
+        if has_request_context():
+            # Décidé une fois par requête, dès que le token est vérifié
+            ses_ecritures = g.get('db_ses_ecritures')
+            if ses_ecritures is None:
+                identite = _identite()
+                ses_ecritures = identite is not None and self._dans_fenetre(identite)
+                if identite is not None:
+                    g.db_ses_ecritures = ses_ecritures
+            if ses_ecritures:
+                return False
+        return True
+
+    def replica_engine(self, session):
+        """Engine du réplica de la transaction en cours (choisi à la première lecture), ou None"""
+        cle = session.info.get('db_replica')
+        if cle is None:
+            replica = self._choisir(session._db)
+            if replica is None:
+                with self._lock:
+                    self.lectures_principales += 1
+                return None
+            cle = session.info['db_replica'] = replica.cle
+        return session._db.engines[cle]
+
+    def _choisir(self, db):
+        self._controler(db)
+        with self._lock:
+            disponibles = [replica for replica in self._replicas if replica.disponible]
+            if not disponibles:
+                return None
+            replica = disponibles[self._suivant % len(disponibles)]
+            self._suivant += 1
+            replica.lectures += 1
+            return replica
+
+    # Retard des réplicas
+
+    def _controler(self, db):
+        """Contrôle les réplicas dont le dernier contrôle date de plus de l'intervalle (un seul thread à la fois)"""
+        maintenant = time.monotonic()
+        a_controler = [replica for replica in self._replicas if maintenant - replica.verifie_a >= self.intervalle]
+        if not a_controler or not self._controle_lock.acquire(blocking=False):
+            return
+        try:
+            for replica in a_controler:
+                try:
+                    replica.retard_s = self._retard(db.engines[replica.cle])
+                    replica.erreur = None
+                    replica.disponible = replica.retard_s is not None and replica.retard_s <= self.max_lag
+                except Exception as e:
+                    replica.retard_s = None
+                    replica.erreur = str(e)
+                    replica.disponible = False
+                replica.verifie_a = time.monotonic()
+        finally:
+            self._controle_lock.release()
+
+    def _retard(self, engine):
+        """Retard de réplication en secondes (None : réplication arrêtée)"""
+        with engine.connect() as connection:
+            if self.requete_retard:
+                retard = connection.execute(text(self.requete_retard)).scalar()
+                return None if retard is None else float(retard)
+            if engine.dialect.name in ('mysql', 'mariadb'):
+                ligne = connection.execute(text('SHOW REPLICA STATUS')).mappings().first()
+                if ligne is None:
+                    # Serveur qui n'est pas un réplica (copie, environnement de recette)
+                    return 0.0
+                retard = ligne.get('Seconds_Behind_Source', ligne.get('Seconds_Behind_Master'))
+                return None if retard is None else float(retard)
+            # Autres bases : joignable = à jour
+            connection.execute(text('SELECT 1'))
+            return 0.0
+
+    # Lecture de ses écritures
+
+    def _debut(self):
+        if request.method in METHODES_LECTURE:
+            g.db_lecture = 'replica'
+
+    def _fin(self, response):
+        # Écritures d'une requête de modification (pas celles des traces d'une lecture)
+        if g.get('db_ecriture') and request.method not in METHODES_LECTURE and response.status_code < 400:
+            identite = _identite()
+            if identite is not None:
+                self.record_write(identite)
+        return response
+
+    def record_write(self, identite):
+        """Ouvre la fenêtre de lecture de ses écritures d'un utilisateur (identité JWT)"""
+        if not self.fenetre:
+            return
+        with self._lock:
+            if len(self._ecrivains) >= MAX_ECRIVAINS:
+                maintenant = time.monotonic()
+                self._ecrivains = {cle: fin for cle, fin in self._ecrivains.items() if fin > maintenant}
+            self._ecrivains[identite] = time.monotonic() + self.fenetre
+
+    def _dans_fenetre(self, identite):
+        fin = self._ecrivains.get(identite)
+        return fin is not None and fin > time.monotonic()
+
+    def _ecriture_flush(self, session, flush_context):
+        self._marquer_ecriture(session)
+
+    def _ecriture_en_masse(self, orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            self._marquer_ecriture(orm_execute_state.session)
+
+    @staticmethod
+    def _marquer_ecriture(session):
+        # Suite de la session sur la base principale (voir ses propres écritures)
+        session.info['db_ecriture'] = True
+        if has_request_context():
+            g.db_ecriture = True
+
+    @staticmethod
+    def _fin_transaction(session, transaction):
+        if transaction.parent is None:
+            session.info.pop('db_replica', None)
+
+    def status(self):
+        """
+        État des réplicas du processus.
+
+        Returns:
+            dict: {'actif', 'replicas': [{'cle', 'disponible', 'retard_s', 'erreur', 'lectures'}],
+                   'lectures_principales', 'fenetre_ecritures_s', 'retard_max_s'}
+        """
+        with self._lock:
+            return {
+                'actif': self.enabled,
+                'replicas': [
+                    {
+                        'cle': replica.cle,
+                        'disponible': replica.disponible,
+                        'retard_s': replica.retard_s,
+                        'erreur': replica.erreur,
+                        'lectures': replica.lectures
+                    }
+                    for replica in self._replicas
+                ],
+                'lectures_principales': self.lectures_principales,
+                'fenetre_ecritures_s': self.fenetre,
+                'retard_max_s': self.max_lag
+            }
+
+
+def _identite():
+    """Identité JWT de la requête si le token a été vérifié, sinon None"""
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+db_router = DbRouter()
@@ -0,0 +1,121 @@
+from sqlalchemy import and_, delete, func, select, update
+from app.common.models import db
+from app.common.services.cache_version_service import DOMAINES, mark_domain
+
+# Lignes devenues uniques (migrations add_hot_path_indexes et unique_fonction_api) :
+# (table, clé primaire, colonnes de la contrainte, colonnes dont les valeurs doivent concorder)
+# fonction_api d'abord : la fusion de ses doublons peut dédoublonner fonction_permission
+ASSOCIATIONS = (
+    ('fonction_api', 'fonction_id', ('nom_fonction', 'app_id'), ()),
+    ('utilisateur_role', 'ur_id', ('id_utilisateur', 'app_id', 'role_id'), ()),
+    ('role_permission', 'rp_id', ('role_id', 'permission_id'), ()),
+    ('fonction_permission', 'fp_id', ('fonction_id', 'permission_id'), ()),
+    ('settings', 'id_set', ('id_utilisateur', 'id_codification'), ('value',)),
+)
+
+
+class DedupeService:
+    """
+    Doublons des lignes soumises à une contrainte d'unicité.
+
+    Pour chaque groupe de lignes de même clé, la première (plus petit
+    identifiant, celle que lisaient les services) est conservée et les autres
+    sont proposées à la suppression ; les permissions d'une fonction API
+    supprimée sont reportées sur la fonction conservée. Un groupe dont les
+    lignes portent des valeurs différentes (paramètres utilisateur) est
+    signalé en conflit et n'est jamais supprimé : il doit être corrigé à la
+    main.
+    """
+
+    def find(self, tables=None):
+        """
+        Recherche les doublons.
+
+        Args:
+            tables (list): Tables à examiner (toutes par défaut)
+
+        Returns:
+            list: [{'table', 'cle': {colonne: valeur}, 'conservee': id, 'supprimees': [ligne],
+                    'conflit': bool}]
+        """
+        groupes = []
+        for nom, cle_primaire, colonnes, valeurs in ASSOCIATIONS:
+            if tables and nom not in tables:
+                continue
+            table = db.metadata.tables[nom]
+            pk = table.c[cle_primaire]
+            cles = db.session.execute(
+                select(*(table.c[colonne] for colonne in colonnes))
+                .group_by(*(table.c[colonne] for colonne in colonnes))
+                .having(func.count(pk) > 1)
+            ).all()
+            for cle in cles:
+                lignes = db.session.execute(
+                    select(table)
+                    .where(and_(*(table.c[colonne] == valeur for colonne, valeur in zip(colonnes, cle))))
+                    .order_by(pk)
+                ).mappings().all()
+                premiere = lignes[0]
+                groupes.append({
+                    'table': nom,
+                    'cle': dict(zip(colonnes, cle)),
+                    'conservee': premiere[cle_primaire],
+                    'supprimees': [dict(ligne) for ligne in lignes[1:]],
+                    'conflit': any(ligne[colonne] != premiere[colonne] for ligne in lignes[1:] for colonne in valeurs)
+                })
+        return groupes
+
+    def remove(self, groupes):
+        """
+        Supprime les doublons des groupes sans conflit.
+
+        Returns:
+            int: Nombre de lignes supprimées
+        """
+        cles_primaires = {nom: cle_primaire for nom, cle_primaire, _, _ in ASSOCIATIONS}
+        supprimees = 0
+        for groupe in groupes:
+            if groupe['conflit']:
+                continue
+            table = db.metadata.tables[groupe['table']]
+            pk = table.c[cles_primaires[groupe['table']]]
+            ids = [ligne[pk.name] for ligne in groupe['supprimees']]
+            if groupe['table'] == 'fonction_api':
+                self._fusionner_fonctions(groupe['conservee'], ids)
+            supprimees += db.session.execute(delete(table).where(pk.in_(ids))).rowcount
+            self._invalider(groupe['table'])
+        db.session.commit()
+        return supprimees
+
+    @staticmethod
+    def _fusionner_fonctions(conservee, ids):
+        """Reporte les permissions des fonctions API supprimées sur la fonction conservée"""
+        table = db.metadata.tables['fonction_permission']
+        deja_presentes = select(table.c.permission_id).where(table.c.fonction_id == conservee).scalar_subquery()
+        db.session.execute(
+            delete(table).where(table.c.fonction_id.in_(ids), table.c.permission_id.in_(deja_presentes))
+        )
+        # Une même permission sur plusieurs fonctions supprimées : une seule est reportée
+        restantes = db.session.execute(
+            select(table.c.fp_id, table.c.permission_id).where(table.c.fonction_id.in_(ids)).order_by(table.c.fp_id)
+        ).all()
+        reportees = {}
+        for fp_id, permission_id in restantes:
+            reportees.setdefault(permission_id, fp_id)
+        en_trop = [fp_id for fp_id, _ in restantes if fp_id not in reportees.values()]
+        if en_trop:
+            db.session.execute(delete(table).where(table.c.fp_id.in_(en_trop)))
+        if reportees:
+            db.session.execute(
+                update(table).where(table.c.fp_id.in_(list(reportees.values()))).values(fonction_id=conservee)
+            )
+
+    @staticmethod
+    def _invalider(nom):
+        # Instructions sur les tables (et non les modèles) : domaines de cache marqués à la main
+        for domaine, models in DOMAINES.items():
+            if any(model.__table__.name == nom for model in models):
+                mark_domain(db.session, domaine)
+
+
+dedupe = DedupeService()
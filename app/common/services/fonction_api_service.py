@@ -150,8 +150,8 @@ class FonctionAPIService:
             existing_permissions = FonctionPermission.query.filter_by(fonction_id=fonction_id).all()
             existing_permission_ids = [fp.permission_id for fp in existing_permissions]
             
-            # Ajouter uniquement les nouvelles permissions
-            for permission_id in permission_ids:
+            # Ajouter uniquement les nouvelles permissions (une fois chacune)
+            for permission_id in dict.fromkeys(permission_ids):
                 if permission_id not in existing_permission_ids:
                     # Créer une nouvelle association
                     fonction_permission = FonctionPermission(
@@ -0,0 +1,82 @@
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from app.common.models import FonctionAPI, db
+
+# Fonctions API déclarées par les décorateurs (auto_register) au chargement des routes :
+# (nom_fonction, app_id) -> description
+_registre = {}
+
+
+def register_fonction(nom_fonction, app_id, description):
+    """Ajoute une fonction API au registre (appelé à l'import, par les décorateurs)"""
+    _registre.setdefault((nom_fonction, int(app_id)), description)
+
+
+def registered_fonctions():
+    """Retourne une copie du registre des fonctions API déclarées"""
+    return dict(_registre)
+
+
+class FonctionRegistryService:
+    def sync(self, utilisateur_id=1, _retry=True):
+        """
+        Insère en masse dans fonction_api les fonctions déclarées absentes de la base.
+
+        Les fonctions déjà présentes ne sont pas modifiées (leur description a pu
+        être éditée depuis l'API). Des workers qui démarrent ensemble peuvent
+        synchroniser en parallèle : la contrainte uq_fonction_api_nom_app rejette
+        le second lot, recalculé une fois. Cette reprise suppose la migration
+        unique_fonction_api appliquée : sans la contrainte, les lots concurrents
+        sont tous insérés et créent des doublons.
+
+        Args:
+            utilisateur_id (int): Utilisateur renseigné dans creer_par / modifier_par
+
+        Returns:
+            dict: Nombre de fonctions déclarées, créées et déjà existantes
+        """
+        declarees = registered_fonctions()
+        if not declarees:
+            return {'declarees': 0, 'creees': 0, 'existantes': 0}
+
+        app_ids = {app_id for _, app_id in declarees}
+        existantes = {
+            (nom_fonction, app_id)
+            for nom_fonction, app_id in db.session.execute(
+                select(FonctionAPI.nom_fonction, FonctionAPI.app_id).where(FonctionAPI.app_id.in_(app_ids))
+            ).all()
+            if (nom_fonction, app_id) in declarees
+        }
+
+        now = datetime.utcnow()
+        nouvelles = [
+            {
+                'nom_fonction': nom_fonction,
+                'description': description,
+                'app_id': app_id,
+                'creer_par': utilisateur_id,
+                'modifier_par': utilisateur_id,
+                'creer_a': now,
+                'modifier_a': now
+            }
+            for (nom_fonction, app_id), description in sorted(declarees.items())
+            if (nom_fonction, app_id) not in existantes
+        ]
+
+        if nouvelles:
+            try:
+                db.session.execute(insert(FonctionAPI), nouvelles)
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                if not _retry:
+                    raise
+                # Un autre processus a pu synchroniser en parallèle : recalculer une fois
+                return self.sync(utilisateur_id, _retry=False)
+
+        return {
+            'declarees': len(declarees),
+            'creees': len(nouvelles),
+            'existantes': len(existantes)
+        }
@@ -0,0 +1,171 @@
+import threading
+from sqlalchemy import select
+from app.common.models import db, Application, Page, PermissionPage, RolePermission, UtilisateurRole
+from app.common.services.cache_version_service import cache_versions
+from app.common.services.db_routing_service import use_primary
+
+# Nombre maximal d'utilisateurs gardés en cache (le cache est vidé au-delà)
+MAX_NAVIGATIONS_EN_CACHE = 10000
+
+
+class NavigationCache:
+    """
+    Cache, propre au processus, des arbres de navigation par utilisateur.
+
+    Vidé à chaque changement des domaines 'rbac' (rôles, permissions), 'pages'
+    (pages, permissions des pages, applications) et 'tokens' (profil de
+    l'utilisateur), dans ce processus ou dans un autre (canal cache_version).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        # id_utilisateur -> arbre de navigation
+        self._navigations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._navigations = {}
+
+    def get(self, id_utilisateur):
+        navigation = self._navigations.get(id_utilisateur)
+        if navigation is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return navigation
+
+    def generation(self):
+        return self._generation
+
+    def set(self, id_utilisateur, generation, navigation):
+        with self._lock:
+            # Ne pas publier un arbre calculé sur une génération invalidée entre-temps
+            if generation != self._generation:
+                return
+            if len(self._navigations) >= MAX_NAVIGATIONS_EN_CACHE:
+                self._navigations = {}
+            self._navigations[id_utilisateur] = navigation
+
+
+navigation_cache = NavigationCache()
+
+for _domaine in ('rbac', 'pages', 'tokens'):
+    cache_versions.subscribe(_domaine, navigation_cache.invalidate)
+
+
+class PageNavigationService:
+    def get_navigation(self, utilisateur):
+        """
+        Retourne l'arbre de navigation de l'utilisateur : ses applications, chacune
+        avec les pages accessibles triées par ordre puis par nom.
+
+        Une page est accessible si l'un des rôles de l'utilisateur dans son
+        application possède une permission associée à la page (PermissionPage) ;
+        une page sans permission associée est accessible à tout utilisateur ayant
+        un rôle dans l'application. Un administrateur voit toutes les pages.
+        Calculé en quelques requêtes ensemblistes puis mis en cache par utilisateur
+        jusqu'au prochain changement RBAC ou pages.
+
+        Args:
+            utilisateur: Utilisateur (ou identité) connecté
+
+        Returns:
+            list: [{app_id, nom, description, app_color, app_icon, pages: [...]}]
+        """
+        id_utilisateur = utilisateur.id_utilisateur
+        navigation = navigation_cache.get(id_utilisateur)
+        if navigation is not None:
+            return navigation
+
+        generation = navigation_cache.generation()
+        navigation = self._build_navigation(id_utilisateur, getattr(utilisateur, 'profil', None) == 'Administrateur')
+        navigation_cache.set(id_utilisateur, generation, navigation)
+        return navigation
+
+    @use_primary()
+    def _build_navigation(self, id_utilisateur, est_admin):
+        if est_admin:
+            app_ids = None
+        else:
+            # Rôles de l'utilisateur par application
+            roles_par_app = {}
+            for app_id, role_id in db.session.execute(
+                select(UtilisateurRole.app_id, UtilisateurRole.role_id)
+                .where(UtilisateurRole.id_utilisateur == id_utilisateur)
+            ).all():
+                roles_par_app.setdefault(app_id, set()).add(role_id)
+            if not roles_par_app:
+                return []
+            app_ids = set(roles_par_app)
+
+            # Permissions de l'utilisateur par application (via ses rôles)
+            role_ids = set().union(*roles_par_app.values())
+            permissions_par_role = {}
+            for role_id, permission_id in db.session.execute(
+                select(RolePermission.role_id, RolePermission.permission_id)
+                .where(RolePermission.role_id.in_(role_ids))
+            ).all():
+                permissions_par_role.setdefault(role_id, set()).add(permission_id)
+            permissions_par_app = {
+                app_id: set().union(*(permissions_par_role.get(role_id, set()) for role_id in roles))
+                for app_id, roles in roles_par_app.items()
+            }
+
+        # Pages des applications concernées, avec leurs permissions requises
+        query = (
+            select(Page.page_id, Page.nom, Page.description, Page.lien, Page.icon, Page.ordre, Page.app_id,
+                   PermissionPage.permission_id)
+            .outerjoin(PermissionPage, PermissionPage.page_id == Page.page_id)
+            .where(Page.app_id.is_not(None))
+        )
+        if app_ids is not None:
+            query = query.where(Page.app_id.in_(app_ids))
+        pages = {}
+        permissions_requises = {}
+        for row in db.session.execute(query).all():
+            pages.setdefault(row.page_id, row)
+            if row.permission_id is not None:
+                permissions_requises.setdefault(row.page_id, set()).add(row.permission_id)
+
+        pages_par_app = {}
+        for page_id, page in pages.items():
+            requises = permissions_requises.get(page_id)
+            if not est_admin and requises and requises.isdisjoint(permissions_par_app.get(page.app_id, ())):
+                continue
+            pages_par_app.setdefault(page.app_id, []).append(page)
+
+        applications_query = select(
+            Application.app_id, Application.nom, Application.description, Application.app_color, Application.app_icon
+        ).order_by(Application.nom)
+        if app_ids is not None:
+            applications_query = applications_query.where(Application.app_id.in_(app_ids))
+
+        navigation = []
+        for application in db.session.execute(applications_query).all():
+            pages_app = sorted(
+                pages_par_app.get(application.app_id, []),
+                key=lambda page: (page.ordre is None, page.ordre or 0, page.nom)
+            )
+            navigation.append({
+                'app_id': application.app_id,
+                'nom': application.nom,
+                'description': application.description,
+                'app_color': application.app_color,
+                'app_icon': application.app_icon,
+                'pages': [
+                    {
+                        'page_id': page.page_id,
+                        'nom': page.nom,
+                        'description': page.description,
+                        'lien': page.lien,
+                        'icon': page.icon,
+                        'ordre': page.ordre
+                    }
+                    for page in pages_app
+                ]
+            })
+        return navigation
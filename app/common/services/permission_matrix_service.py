@@ -0,0 +1,142 @@
+import threading
+from sqlalchemy import select
+from app.common.models import (
+    db, UtilisateurRole, FonctionAPI, FonctionPermission, RolePermission
+)
+from app.common.services.cache_version_service import cache_versions
+from app.common.services.db_routing_service import use_primary
+
+
+class PermissionMatrix:
+    """
+    Matrice de permissions compilée, propre au processus.
+
+    Associe chaque couple (id_utilisateur, app_id) à l'ensemble des noms de
+    fonctions API autorisés. Les tables RBAC sont chargées une fois par
+    génération ; une vérification sur un cache chaud ne fait aucune requête SQL.
+    La matrice est vidée dès qu'une écriture du domaine 'rbac' est validée, dans
+    ce processus ou dans un autre (canal cache_version).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._generation = 0
+        # app_id -> {nom_fonction: frozenset(permission_id)}
+        self._fonctions = None
+        # role_id -> frozenset(permission_id)
+        self._role_permissions = None
+        # id_utilisateur -> {app_id: frozenset(role_id)}
+        self._user_roles = {}
+        # (id_utilisateur, app_id) -> frozenset(nom_fonction)
+        self._allowed = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        """Vider la matrice ; elle sera recompilée à la prochaine vérification"""
+        with self._lock:
+            self._generation += 1
+            self._fonctions = None
+            self._role_permissions = None
+            self._user_roles = {}
+            self._allowed = {}
+
+    def is_allowed(self, id_utilisateur, app_id, nom_fonction):
+        """
+        Vérifie si l'utilisateur a accès à la fonction API pour l'application.
+        Mêmes règles que Utilisateur.has_permission_for_fonction.
+        """
+        return nom_fonction in self.get_allowed_fonctions(id_utilisateur, app_id)
+
+    def get_allowed_fonctions(self, id_utilisateur, app_id):
+        """Retourne l'ensemble des noms de fonctions autorisés pour (utilisateur, application)"""
+        key = (int(id_utilisateur), int(app_id))
+        allowed = self._allowed.get(key)
+        if allowed is not None:
+            self.hits += 1
+            return allowed
+
+        self.misses += 1
+        with self._lock:
+            generation = self._generation
+            fonctions, role_permissions = self._load_rbac_tables()
+            user_roles = self._user_roles.get(key[0])
+            if user_roles is None:
+                user_roles = self._load_user_roles(key[0])
+
+            allowed = self._compile(key[1], fonctions, role_permissions, user_roles)
+
+            # Ne pas publier un résultat calculé sur une génération invalidée entre-temps
+            if generation == self._generation:
+                self._fonctions = fonctions
+                self._role_permissions = role_permissions
+                self._user_roles[key[0]] = user_roles
+                self._allowed[key] = allowed
+        return allowed
+
+    @use_primary()
+    def _load_rbac_tables(self):
+        """Charge les fonctions API et les permissions des rôles (une fois par génération)"""
+        if self._fonctions is not None and self._role_permissions is not None:
+            return self._fonctions, self._role_permissions
+
+        fonctions = {}
+        fonction_ids = {}
+        rows = db.session.execute(
+            select(FonctionAPI.fonction_id, FonctionAPI.app_id, FonctionAPI.nom_fonction, FonctionPermission.permission_id)
+            .outerjoin(FonctionPermission, FonctionPermission.fonction_id == FonctionAPI.fonction_id)
+            .order_by(FonctionAPI.fonction_id)
+        ).all()
+        for fonction_id, app_id, nom_fonction, permission_id in rows:
+            # En cas de doublon (même nom, même application), garder la première fonction
+            if fonction_ids.setdefault((app_id, nom_fonction), fonction_id) != fonction_id:
+                continue
+            permissions = fonctions.setdefault(app_id, {}).setdefault(nom_fonction, set())
+            if permission_id is not None:
+                permissions.add(permission_id)
+        fonctions = {
+            app_id: {nom: frozenset(perms) for nom, perms in noms.items()}
+            for app_id, noms in fonctions.items()
+        }
+
+        role_permissions = {}
+        for role_id, permission_id in db.session.execute(
+            select(RolePermission.role_id, RolePermission.permission_id)
+        ).all():
+            role_permissions.setdefault(role_id, set()).add(permission_id)
+
+        return fonctions, {role_id: frozenset(perms) for role_id, perms in role_permissions.items()}
+
+    @use_primary()
+    def _load_user_roles(self, id_utilisateur):
+        """Charge les rôles de l'utilisateur, toutes applications confondues"""
+        user_roles = {}
+        for app_id, role_id in db.session.execute(
+            select(UtilisateurRole.app_id, UtilisateurRole.role_id)
+            .where(UtilisateurRole.id_utilisateur == id_utilisateur)
+        ).all():
+            user_roles.setdefault(app_id, set()).add(role_id)
+        return {app_id: frozenset(roles) for app_id, roles in user_roles.items()}
+
+    @staticmethod
+    def _compile(app_id, fonctions, role_permissions, user_roles):
+        role_ids = user_roles.get(app_id)
+        # Aucun rôle pour cette application : aucun accès
+        if not role_ids:
+            return frozenset()
+
+        permissions = set()
+        for role_id in role_ids:
+            permissions |= role_permissions.get(role_id, frozenset())
+
+        # Une fonction sans permission associée est accessible à tout utilisateur
+        # ayant au moins un rôle dans l'application
+        return frozenset(
+            nom for nom, required in fonctions.get(app_id, {}).items()
+            if not required or not required.isdisjoint(permissions)
+        )
+
+
+permission_matrix = PermissionMatrix()
+
+cache_versions.subscribe('rbac', permission_matrix.invalidate)
@@ -1,4 +1,5 @@
 from app.common.models import Permission, db, RolePermission, Role
+from app.common.services.permission_matrix_service import permission_matrix
 from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError
 
@@ -106,4 +107,36 @@ class PermissionService:
                 Permission.nom.ilike(search_query),
                 Permission.description.ilike(search_query)
             )
-        ).paginate(page=page, per_page=per_page, error_out=False)
\ No newline at end of file
+        ).paginate(page=page, per_page=per_page, error_out=False)
+
+    def evaluate_fonctions(self, utilisateur, demandes, use_matrix=True):
+        """
+        Évalue en une passe les droits de l'utilisateur sur un lot de fonctions API.
+        
+        Mêmes règles que require_fonction_permission : un administrateur a accès à
+        tout ; sinon l'ensemble des fonctions demandées est intersecté avec
+        l'ensemble des fonctions autorisées (rôles → permissions → fonctions) de
+        l'utilisateur pour chaque application.
+        
+        Args:
+            utilisateur: Utilisateur (ou identité) connecté
+            demandes (dict): app_id -> liste de noms de fonctions
+            use_matrix (bool): Utiliser la matrice de permissions compilée en mémoire
+            
+        Returns:
+            dict: app_id -> {nom_fonction: bool}
+        """
+        resultat = {}
+        for app_id, noms in demandes.items():
+            noms = set(noms)
+            if getattr(utilisateur, 'profil', None) == 'Administrateur':
+                autorises = noms
+            elif use_matrix:
+                autorises = noms & permission_matrix.get_allowed_fonctions(utilisateur.id_utilisateur, app_id)
+            else:
+                autorises = {
+                    nom for nom in noms
+                    if utilisateur.has_permission_for_fonction_single_query(app_id, nom)
+                }
+            resultat[app_id] = {nom: nom in autorises for nom in sorted(noms)}
+        return resultat
@@ -0,0 +1,194 @@
+import os
+import time
+from flask import Response, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from app.common.services.db_pool_service import db_pool
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # Dépendance optionnelle : /metrics désactivé
+    prometheus_client = None
+    multiprocess = None
+
+# Secondes entre deux recopies des compteurs en mémoire (cache de permissions, file des traces, pool)
+_INTERVALLE_SYNCHRO = 5
+
+
+class PrometheusMetrics:
+    """
+    Métriques au format Prometheus, servies par GET /metrics.
+
+    Séries : latence des requêtes HTTP (histogramme par blueprint, endpoint et
+    statut), attente d'emprunt et saturation du pool de connexions, profondeur
+    de la file d'écriture des traces, succès et échecs du cache de permissions,
+    latence des appels LDAP.
+
+    Sous gunicorn, PROMETHEUS_MULTIPROC_DIR (positionné par gunicorn.conf.py)
+    active le mode multiprocessus de prometheus_client : chaque worker écrit ses
+    séries dans des fichiers mmap de ce dossier, agrégés à la collecte. Le coût
+    par requête se limite à une observation d'histogramme ; les compteurs déjà
+    tenus en mémoire (cache de permissions, file des traces, délais d'attente du
+    pool) sont recopiés au plus toutes les _INTERVALLE_SYNCHRO secondes.
+
+    Sans prometheus_client installé, rien n'est enregistré.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._metriques = None
+        self._prochaine_synchro = 0.0
+        self._permissions_vues = (0, 0)
+        self._delais_vus = 0
+
+    def init_app(self, app):
+        self.enabled = prometheus_client is not None and app.config.get('PROMETHEUS_ENABLED', True)
+        if not self.enabled:
+            if app.config.get('PROMETHEUS_ENABLED', True):
+                app.logger.warning("prometheus_client n'est pas installé : /metrics désactivé")
+            return
+
+        self.token = app.config.get('PROMETHEUS_METRICS_TOKEN') or None
+        if self.token is None and app.config.get('PROMETHEUS_REQUIRE_TOKEN', False):
+            self.enabled = False
+            app.logger.error("PROMETHEUS_METRICS_TOKEN absent alors que PROMETHEUS_REQUIRE_TOKEN est actif : /metrics désactivé")
+            return
+        self._metriques = _creer_metriques()
+        db_pool.add_observer(self._metriques['pool_attente'].observe)
+
+        app.before_request(self._debut)
+        app.after_request(self._fin)
+        app.add_url_rule('/metrics', 'prometheus_metrics', self.scrape, methods=['GET'])
+
+        from app.common.models import db
+        with app.app_context():
+            moteur = db.engine
+        event.listen(moteur, 'checkout', lambda *args: self._pool(moteur))
+        # checkin est émis avant que le pool ne décompte la connexion rendue
+        event.listen(moteur, 'checkin', lambda *args: self._pool(moteur, rendue=1))
+
+    # Requêtes HTTP
+
+    def _debut(self):
+        g.prometheus_debut = time.perf_counter()
+
+    def _fin(self, response):
+        debut = g.pop('prometheus_debut', None)
+        if debut is not None and request.endpoint != 'prometheus_metrics':
+            self._metriques['latence'].labels(
+                request.blueprint or '', request.endpoint or '', str(response.status_code)
+            ).observe(time.perf_counter() - debut)
+        if time.monotonic() >= self._prochaine_synchro:
+            self._synchroniser()
+        return response
+
+    # Autres séries
+
+    def observe_ldap(self, secondes, resultat):
+        """Latence d'un appel au service LDAP (resultat : ok, refus, erreur)"""
+        if self.enabled:
+            self._metriques['ldap'].labels(resultat).observe(secondes)
+
+    def _pool(self, moteur, rendue=0):
+        pool = moteur.pool
+        if not isinstance(pool, QueuePool):
+            return
+        empruntees = max(pool.checkedout() - rendue, 0)
+        debordement = pool._max_overflow
+        capacite = pool.size() + debordement if debordement >= 0 else 0
+        self._metriques['pool_empruntees'].set(empruntees)
+        self._metriques['pool_capacite'].set(capacite)
+        self._metriques['pool_saturation'].set(empruntees / capacite if capacite else 0)
+
+    def _synchroniser(self):
+        """Recopie les compteurs tenus en mémoire par les services (coût nul par requête)"""
+        from app.common.services.permission_matrix_service import permission_matrix
+        from app.common.services.trace_writer_service import trace_writer
+        self._prochaine_synchro = time.monotonic() + _INTERVALLE_SYNCHRO
+
+        hits, misses = permission_matrix.hits, permission_matrix.misses
+        vus_hits, vus_misses = self._permissions_vues
+        if hits >= vus_hits and misses >= vus_misses:
+            self._metriques['permissions_hits'].inc(hits - vus_hits)
+            self._metriques['permissions_misses'].inc(misses - vus_misses)
+        self._permissions_vues = (hits, misses)
+
+        if db_pool.timeouts > self._delais_vus:
+            self._metriques['pool_delais'].inc(db_pool.timeouts - self._delais_vus)
+        self._delais_vus = db_pool.timeouts
+
+        file = trace_writer._queue
+        if file is not None and trace_writer._pid == os.getpid():
+            self._metriques['file_traces'].set(file.qsize())
+
+    # Collecte
+
+    def scrape(self):
+        """GET /metrics : séries de tous les workers en mode multiprocessus, du processus sinon"""
+        if self.token and request.headers.get('Authorization') != f"Bearer {self.token}":
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        self._synchroniser()
+        if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+            registre = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registre)
+        else:
+            registre = prometheus_client.REGISTRY
+        try:
+            donnees = prometheus_client.generate_latest(registre)
+        except Exception as e:
+            current_app.logger.error(f"Erreur lors de la collecte des métriques Prometheus: {str(e)}")
+            return Response('Metrics collection failed\n', status=500, mimetype='text/plain')
+        return Response(donnees, mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+_METRIQUES = None
+
+
+def _creer_metriques():
+    """Crée les séries une seule fois par processus (le registre par défaut refuse les doublons)"""
+    global _METRIQUES
+    if _METRIQUES is not None:
+        return _METRIQUES
+    from prometheus_client import Counter, Gauge, Histogram
+    _METRIQUES = {
+        'latence': Histogram(
+            'http_request_duration_seconds', 'Durée des requêtes HTTP',
+            ['blueprint', 'endpoint', 'status']
+        ),
+        'pool_attente': Histogram(
+            'db_pool_checkout_seconds', "Attente d'emprunt d'une connexion au pool",
+            buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+        ),
+        'pool_delais': Counter(
+            'db_pool_timeouts', "Emprunts de connexion abandonnés (pool_timeout dépassé)"
+        ),
+        'pool_empruntees': Gauge(
+            'db_pool_checked_out', 'Connexions empruntées au pool', multiprocess_mode='livesum'
+        ),
+        'pool_capacite': Gauge(
+            'db_pool_capacity', 'Connexions disponibles au maximum (pool_size + max_overflow)',
+            multiprocess_mode='livesum'
+        ),
+        'pool_saturation': Gauge(
+            'db_pool_saturation_ratio', 'Part des connexions du pool empruntées (worker le plus chargé)',
+            multiprocess_mode='livemax'
+        ),
+        'file_traces': Gauge(
+            'trace_queue_depth', "Traces en attente dans la file d'écriture", multiprocess_mode='livesum'
+        ),
+        'permissions_hits': Counter(
+            'permission_cache_hits', 'Vérifications de permission servies par la matrice compilée'
+        ),
+        'permissions_misses': Counter(
+            'permission_cache_misses', 'Vérifications de permission ayant compilé la matrice'
+        ),
+        'ldap': Histogram(
+            'ldap_request_duration_seconds', 'Durée des appels au service LDAP', ['resultat'],
+            buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+        ),
+    }
+    return _METRIQUES
+
+
+prometheus_metrics = PrometheusMetrics()
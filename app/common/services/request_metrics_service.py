@@ -0,0 +1,321 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import g, has_request_context, request
+from sqlalchemy import case, delete, func, insert, select
+from app.common.models import db, RequestMetric
+from app.common.services.db_routing_service import read_only
+from app.common.utils.sql_timing import on_sql_executed
+
+# Dimensions de regroupement des mesures -> colonne de request_metrics
+DIMENSIONS = {
+    'blueprint': RequestMetric.blueprint,
+    'nom_fonction': RequestMetric.nom_fonction,
+    'endpoint': RequestMetric.endpoint
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Bornes supérieures (ms) de l'histogramme des durées ; la dernière classe est ouverte
+BORNES_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+def percentiles_histogramme(classes, maximum):
+    """
+    Percentiles d'une distribution donnée par ses classes {indice: nombre}
+    (indices de BORNES_MS), par interpolation linéaire dans la classe.
+
+    Returns:
+        dict: {'p50': ms, 'p90': ms, ...}
+    """
+    total = sum(classes.values())
+    resultat = {}
+    for p in PERCENTILES:
+        if not total:
+            resultat[f"p{p}"] = None
+            continue
+        rang = total * p / 100
+        cumul = 0
+        for indice in sorted(classes):
+            nombre = classes[indice]
+            if cumul + nombre >= rang:
+                bas = BORNES_MS[indice - 1] if indice > 0 else 0
+                haut = BORNES_MS[indice] if indice < len(BORNES_MS) else max(maximum or bas, bas)
+                valeur = bas + (haut - bas) * (rang - cumul) / nombre
+                resultat[f"p{p}"] = round(min(valeur, maximum) if maximum is not None else valeur, 2)
+                break
+            cumul += nombre
+    return resultat
+
+
+def _classe(colonne):
+    """Expression SQL de l'indice de classe d'histogramme d'une durée"""
+    return case(
+        *((colonne <= borne, indice) for indice, borne in enumerate(BORNES_MS)),
+        else_=len(BORNES_MS)
+    )
+
+
+class RequestMetricsService:
+    """
+    Mesures de performance par requête HTTP (table request_metrics).
+
+    Un before_request démarre le chronomètre, le chronométrage des instructions
+    SQL (sql_timing, partagé avec le diagnostic SQL) cumule le temps et le
+    nombre de requêtes SQL exécutées pendant la requête HTTP, et un after_request enregistre la durée
+    totale, le temps SQL, le nombre de requêtes, le statut et la taille de la
+    réponse avec le blueprint et la fonction API (nom_fonction) appelés. Les
+    mesures sont mises en tampon et insérées par le thread d'écriture des traces
+    (ou par lots en écriture synchrone) ; les traces de trace_action reçoivent
+    les mêmes mesures dans param.perf.
+
+    Seule une fraction REQUEST_METRICS_SAMPLE_RATE des requêtes est enregistrée,
+    et jamais celles des chemins REQUEST_METRICS_EXCLUDED_PATHS (/metrics,
+    sondes de santé). Les mesures de plus de REQUEST_METRICS_RETENTION_DAYS jours
+    sont purgées par flask traces archive.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.app = None
+        self.enabled = False
+        self._tampon = []
+        self._dernier_flush = time.monotonic()
+
+    def init_app(self, app):
+        from app.common.services.trace_writer_service import trace_writer
+        self.app = app
+        self.enabled = app.config.get('REQUEST_METRICS_ENABLED', True)
+        self.sample_rate = app.config.get('REQUEST_METRICS_SAMPLE_RATE', 0.1)
+        self.exclus = tuple(
+            chemin.strip() for chemin in app.config.get('REQUEST_METRICS_EXCLUDED_PATHS', '').split(',') if chemin.strip()
+        )
+        self.batch_size = max(app.config.get('TRACE_BATCH_SIZE', 200), 1)
+        self.flush_interval = app.config.get('TRACE_FLUSH_INTERVAL_MS', 500) / 1000
+        if not self.enabled:
+            return
+
+        app.before_request(self._debut)
+        app.after_request(self._fin)
+        on_sql_executed(_mesurer)
+        self.asynchrone = trace_writer.app is not None
+        if self.asynchrone:
+            trace_writer.add_table_collector(RequestMetric.__table__, self.collect)
+
+    # Mesure
+
+    def _debut(self):
+        if request.path.startswith(self.exclus):
+            return
+        g.metrics_debut = time.perf_counter()
+        g.metrics_sql_s = 0.0
+        g.metrics_sql_n = 0
+
+    def snapshot(self):
+        """Mesures de la requête en cours : {'duree_ms', 'sql_ms', 'sql_count'} ou None"""
+        if not has_request_context() or 'metrics_debut' not in g:
+            return None
+        return {
+            'duree_ms': round((time.perf_counter() - g.metrics_debut) * 1000, 2),
+            'sql_ms': round(g.metrics_sql_s * 1000, 2),
+            'sql_count': g.metrics_sql_n
+        }
+
+    def _fin(self, response):
+        mesures = self.snapshot()
+        if mesures is None or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return response
+        try:
+            from app.common.current_user import get_current_utilisateur_id
+            id_utilisateur = get_current_utilisateur_id()
+        except Exception:
+            id_utilisateur = None
+        self._ajouter({
+            'date': datetime.utcnow(),
+            'methode': request.method,
+            'blueprint': request.blueprint,
+            'endpoint': request.endpoint,
+            'nom_fonction': g.get('nom_fonction'),
+            'statut': response.status_code,
+            'duree_ms': mesures['duree_ms'],
+            'db_ms': mesures['sql_ms'],
+            'requetes': mesures['sql_count'],
+            # Réponses en streaming : taille inconnue
+            'taille': None if response.is_streamed else response.content_length,
+            'id_utilisateur': id_utilisateur
+        })
+        return response
+
+    # Écriture
+
+    def _ajouter(self, row):
+        with self._lock:
+            self._tampon.append(row)
+            plein = len(self._tampon) >= self.batch_size
+        if self.asynchrone:
+            from app.common.services.trace_writer_service import trace_writer
+            trace_writer.ensure_started()
+        elif plein or time.monotonic() - self._dernier_flush >= self.flush_interval:
+            self.flush()
+
+    def collect(self, force=False):
+        """Retire et retourne les mesures en attente (collecteur du thread d'écriture)"""
+        with self._lock:
+            rows, self._tampon = self._tampon, []
+            self._dernier_flush = time.monotonic()
+        return rows
+
+    def flush(self):
+        """Insère les mesures en attente (écriture synchrone) ; abandonnées en cas d'échec"""
+        rows = self.collect(force=True)
+        if not rows:
+            return 0
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(insert(RequestMetric.__table__), rows)
+        except Exception as e:
+            self.app.logger.error(f"Erreur lors de l'écriture de {len(rows)} mesure(s) de requêtes: {str(e)}")
+            return 0
+        return len(rows)
+
+    def purge(self, retention_days=None, batch_size=None, dry_run=False):
+        """
+        Supprime par lots les mesures plus anciennes que la fenêtre de rétention.
+
+        Args:
+            retention_days (int): REQUEST_METRICS_RETENTION_DAYS par défaut (0 : aucune purge)
+            batch_size (int): TRACE_ARCHIVE_BATCH_SIZE par défaut
+            dry_run (bool): Compter sans supprimer
+
+        Returns:
+            dict: {'limite', 'supprimees'}
+        """
+        from flask import current_app
+        config = current_app.config
+        if retention_days is None:
+            retention_days = config.get('REQUEST_METRICS_RETENTION_DAYS', 30)
+        if not retention_days:
+            return {'limite': None, 'supprimees': 0}
+        batch_size = max(batch_size or config.get('TRACE_ARCHIVE_BATCH_SIZE', 5000), 1)
+        limite = datetime.combine(datetime.utcnow().date() - timedelta(days=retention_days), datetime.min.time())
+        table = RequestMetric.__table__
+
+        if dry_run:
+            with db.engine.connect() as connection:
+                nombre = connection.execute(
+                    select(func.count()).select_from(table).where(table.c.date < limite)
+                ).scalar()
+            return {'limite': limite, 'supprimees': nombre}
+
+        supprimees = 0
+        while True:
+            with db.engine.begin() as connection:
+                ids = connection.execute(
+                    select(table.c.id).where(table.c.date < limite).order_by(table.c.id).limit(batch_size)
+                ).scalars().all()
+                if not ids:
+                    break
+                connection.execute(delete(table).where(table.c.id.in_(ids)))
+            supprimees += len(ids)
+        return {'limite': limite, 'supprimees': supprimees}
+
+    # Synthèse
+
+    @read_only()
+    def summary(self, start=None, end=None, group_by='blueprint', limit=None):
+        """
+        Percentiles de durée totale et de temps SQL par blueprint, fonction API ou endpoint.
+
+        Les percentiles sont calculés en SQL sur un histogramme (BORNES_MS), sans
+        lire les mesures une à une.
+
+        Args:
+            start, end (datetime): Plage [start, end[
+            group_by (str): blueprint, nom_fonction ou endpoint
+            limit (int, optional): Nombre maximal de groupes (les plus sollicités)
+
+        Returns:
+            list: [{<group_by>, nombre, erreurs, duree_ms: {p50, p90, p95, p99, moyenne, max},
+                    db_ms: {...}, requetes: {moyenne, max}, taille_moyenne}]
+        """
+        dimension = DIMENSIONS[group_by]
+        filtres = []
+        if start is not None:
+            filtres.append(RequestMetric.date >= start)
+        if end is not None:
+            filtres.append(RequestMetric.date < end)
+
+        query = (
+            select(
+                dimension.label('groupe'),
+                func.count().label('nombre'),
+                func.sum(case((RequestMetric.statut >= 400, 1), else_=0)).label('erreurs'),
+                func.avg(RequestMetric.duree_ms).label('duree_moyenne'),
+                func.max(RequestMetric.duree_ms).label('duree_max'),
+                func.avg(RequestMetric.db_ms).label('db_moyenne'),
+                func.max(RequestMetric.db_ms).label('db_max'),
+                func.avg(RequestMetric.requetes).label('requetes_moyenne'),
+                func.max(RequestMetric.requetes).label('requetes_max'),
+                func.avg(RequestMetric.taille).label('taille_moyenne')
+            )
+            .where(*filtres)
+            .group_by(dimension)
+            .order_by(func.count().desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        groupes = db.session.execute(query).mappings().all()
+        if not groupes:
+            return []
+
+        valeurs = [groupe['groupe'] for groupe in groupes]
+        histogrammes = {}
+        for colonne, cle in ((RequestMetric.duree_ms, 'duree_ms'), (RequestMetric.db_ms, 'db_ms')):
+            classe = _classe(colonne)
+            rows = db.session.execute(
+                select(dimension, classe, func.count())
+                .where(*filtres, self._dans(dimension, valeurs))
+                .group_by(dimension, classe)
+            ).all()
+            for groupe, indice, nombre in rows:
+                histogrammes.setdefault((cle, groupe), {})[indice] = nombre
+
+        resultat = []
+        for groupe in groupes:
+            ligne = {
+                group_by: groupe['groupe'],
+                'nombre': int(groupe['nombre']),
+                'erreurs': int(groupe['erreurs'] or 0)
+            }
+            for cle, moyenne, maximum in (('duree_ms', 'duree_moyenne', 'duree_max'), ('db_ms', 'db_moyenne', 'db_max')):
+                ligne[cle] = dict(
+                    percentiles_histogramme(histogrammes.get((cle, groupe['groupe']), {}), groupe[maximum]),
+                    moyenne=round(float(groupe[moyenne] or 0), 2),
+                    max=round(float(groupe[maximum] or 0), 2)
+                )
+            ligne['requetes'] = {
+                'moyenne': round(float(groupe['requetes_moyenne'] or 0), 2),
+                'max': int(groupe['requetes_max'] or 0)
+            }
+            ligne['taille_moyenne'] = int(groupe['taille_moyenne']) if groupe['taille_moyenne'] is not None else None
+            resultat.append(ligne)
+        return resultat
+
+    @staticmethod
+    def _dans(dimension, valeurs):
+        """Filtre sur les groupes retenus (NULL compris : requêtes sans blueprint ou fonction API)"""
+        connues = [valeur for valeur in valeurs if valeur is not None]
+        condition = dimension.in_(connues) if connues else None
+        if None in valeurs:
+            condition = dimension.is_(None) if condition is None else (condition | dimension.is_(None))
+        return condition
+
+
+def _mesurer(statement, parameters, executemany, duree_s):
+    if has_request_context() and 'metrics_debut' in g:
+        g.metrics_sql_s += duree_s
+        g.metrics_sql_n += 1
+
+
+request_metrics = RequestMetricsService()
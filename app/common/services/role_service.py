@@ -147,8 +147,8 @@ class RoleService:
             # Récupérer les permissions existantes
             existing_permissions = set(rp.permission_id for rp in RolePermission.query.filter_by(role_id=role_id).all())
             
-            # Ajouter uniquement les nouvelles permissions
-            for permission_id in permission_ids:
+            # Ajouter uniquement les nouvelles permissions (une fois chacune)
+            for permission_id in dict.fromkeys(permission_ids):
                 if permission_id not in existing_permissions:
                     role_permission = RolePermission(
                         role_id=role_id,
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import time
+
+# Fichier de cache du contrôle de version du schéma (dossier instance)
+CACHE_FICHIER = 'schema_check.json'
+
+
+class SchemaVersionCheck:
+    """
+    Contrôle au démarrage que la base est à la révision Alembic la plus récente
+    (head) des scripts de migrations/versions.
+
+    Le résultat positif est mis en cache dans instance/schema_check.json, par
+    base et par état du dossier des migrations (noms et dates des scripts) :
+    après le premier worker, les suivants ne relisent ni les scripts ni la
+    table alembic_version, tant que le cache a moins de SCHEMA_CHECK_TTL_S
+    secondes. Une base en retard est signalée à chaque démarrage du serveur
+    (erreur si DB_REQUIRE_MIGRATIONS_HEAD) ; les commandes flask, dont
+    flask db upgrade, ne sont pas contrôlées.
+    """
+
+    def verify(self, app, db):
+        """
+        Returns:
+            dict: {'ok', 'heads', 'base', 'cache'}
+
+        Raises:
+            RuntimeError: Base en retard sur les migrations et DB_REQUIRE_MIGRATIONS_HEAD actif
+        """
+        dossier = self._dossier_versions(app)
+        cle = self._cle(app.config['SQLALCHEMY_DATABASE_URI'], dossier)
+        chemin_cache = os.path.join(app.instance_path, CACHE_FICHIER)
+        ttl = app.config.get('SCHEMA_CHECK_TTL_S', 86400)
+
+        cache = self._lire_cache(chemin_cache)
+        entree = cache.get(cle)
+        if entree and time.time() - entree['verifie_le'] < ttl:
+            return {'ok': True, 'heads': entree['heads'], 'base': entree['heads'], 'cache': True}
+
+        heads = self._heads(os.path.dirname(dossier))
+        with app.app_context():
+            with db.engine.connect() as connection:
+                from alembic.runtime.migration import MigrationContext
+                base = sorted(MigrationContext.configure(connection).get_current_heads())
+
+        ok = base == heads
+        if ok:
+            cache[cle] = {'heads': heads, 'verifie_le': time.time()}
+            self._ecrire_cache(chemin_cache, cache)
+        else:
+            message = (
+                f"Base de données en retard sur les migrations : révision {', '.join(base) or 'aucune'}, "
+                f"attendue {', '.join(heads)} (flask db upgrade)"
+            )
+            if app.config.get('DB_REQUIRE_MIGRATIONS_HEAD', False):
+                raise RuntimeError(message)
+            app.logger.error(message)
+        return {'ok': ok, 'heads': heads, 'base': base, 'cache': False}
+
+    @staticmethod
+    def _dossier_versions(app):
+        migrations = app.extensions['migrate'].directory
+        if not os.path.isabs(migrations):
+            # Relatif à la racine du projet (et non au dossier courant)
+            migrations = os.path.join(os.path.dirname(app.root_path), migrations)
+        return os.path.join(migrations, 'versions')
+
+    @staticmethod
+    def _cle(url, dossier):
+        """Empreinte de la base (URL sans mot de passe) et des scripts de migration"""
+        from sqlalchemy.engine import make_url
+        empreinte = hashlib.sha1(make_url(url).render_as_string(hide_password=True).encode('utf-8'))
+        with os.scandir(dossier) as entrees:
+            for entree in sorted(entrees, key=lambda e: e.name):
+                if entree.name.endswith('.py'):
+                    empreinte.update(f"{entree.name}:{entree.stat().st_mtime_ns}".encode('utf-8'))
+        return empreinte.hexdigest()
+
+    @staticmethod
+    def _heads(dossier_migrations):
+        from alembic.script import ScriptDirectory
+        return sorted(ScriptDirectory(dossier_migrations).get_heads())
+
+    @staticmethod
+    def _lire_cache(chemin):
+        try:
+            with open(chemin, encoding='utf-8') as fichier:
+                return json.load(fichier)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _ecrire_cache(chemin, cache):
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(cache, fichier)
+        os.replace(temporaire, chemin)
+
+
+schema_check = SchemaVersionCheck()
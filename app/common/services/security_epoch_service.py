@@ -0,0 +1,247 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event, select, update, inspect as sa_inspect
+from sqlalchemy.orm import Session
+from app.common.models import db, Utilisateur, UtilisateurRole
+from app.common.services.cache_version_service import cache_versions, mark_domain
+from app.common.services.db_routing_service import use_primary
+
+# Attributs de l'utilisateur dont la modification révoque les tokens déjà émis
+SECURITY_ATTRIBUTES = ('statut', 'profil', 'date_expiration')
+
+# Attributs d'une attribution de rôle dont la modification révoque les tokens de l'utilisateur
+# (pas les colonnes d'audit creer_par, modifier_par, ...)
+ROLE_ATTRIBUTES = ('id_utilisateur', 'app_id', 'role_id')
+
+_PENDING_KEY = 'security_epoch_users'
+_ANCIENS_TITULAIRES_KEY = 'security_epoch_anciens_titulaires'
+
+# Marqueur : invalider toute la table des époques (écriture en masse sans IDs connus)
+_ALL = object()
+
+
+class SecurityEpochMap:
+    """
+    Table en mémoire, propre au processus, des époques de sécurité des utilisateurs.
+
+    Associe chaque id_utilisateur à (security_epoch, statut, date_expiration).
+    Une entrée est chargée en une requête puis conservée `ttl` secondes : un token
+    dont l'époque (claim sec_epoch) correspond, pour un utilisateur actif et non
+    expiré, est accepté sans accès à la base. Les écritures validées dans ce
+    processus vident immédiatement les entrées concernées ; celles des autres
+    processus vident la table via le domaine 'tokens' du canal cache_version, et
+    le TTL borne le délai de prise en compte si ce canal est désactivé.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # id_utilisateur -> (security_epoch, statut, date_expiration, chargé_à)
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, ids=None):
+        """Vider les entrées des utilisateurs donnés (toutes si ids est None)"""
+        with self._lock:
+            if ids is None:
+                self._entries = {}
+            else:
+                for id_utilisateur in ids:
+                    self._entries.pop(id_utilisateur, None)
+
+    @use_primary()
+    def get(self, id_utilisateur, ttl=30):
+        """
+        Retourne (security_epoch, statut, date_expiration) de l'utilisateur,
+        ou None s'il n'existe pas.
+        """
+        id_utilisateur = int(id_utilisateur)
+        entry = self._entries.get(id_utilisateur)
+        now = time.monotonic()
+        if entry is not None and now - entry[3] < ttl:
+            self.hits += 1
+            return entry[:3]
+
+        self.misses += 1
+        row = db.session.execute(
+            select(Utilisateur.security_epoch, Utilisateur.statut, Utilisateur.date_expiration)
+            .where(Utilisateur.id_utilisateur == id_utilisateur)
+        ).first()
+        if row is None:
+            with self._lock:
+                self._entries.pop(id_utilisateur, None)
+            return None
+
+        entry = (row.security_epoch or 0, row.statut, row.date_expiration, now)
+        with self._lock:
+            self._entries[id_utilisateur] = entry
+        return entry[:3]
+
+    def is_valid(self, id_utilisateur, epoch, ttl=30):
+        """
+        Vérifie qu'un token portant l'époque `epoch` est toujours valable :
+        même époque que la base, compte actif et non expiré.
+        """
+        state = self.get(id_utilisateur, ttl)
+        if state is None:
+            return False
+        current_epoch, statut, date_expiration = state
+        if current_epoch != epoch or statut != 'Actif':
+            return False
+        return not (date_expiration and date_expiration < datetime.utcnow())
+
+
+security_epochs = SecurityEpochMap()
+
+cache_versions.subscribe('tokens', security_epochs.invalidate)
+
+
+def _pending(session):
+    return session.info.setdefault(_PENDING_KEY, set())
+
+
+def _bump(connection, ids):
+    """Incrémente l'époque de sécurité des utilisateurs donnés (dans la transaction courante)"""
+    table = Utilisateur.__table__
+    connection.execute(
+        update(table)
+        .where(table.c.id_utilisateur.in_(sorted(ids)))
+        .values(security_epoch=table.c.security_epoch + 1)
+    )
+
+
+def _attributes_changed(obj, attributs):
+    state = sa_inspect(obj)
+    return any(state.attrs[attr].history.has_changes() for attr in attributs)
+
+
+def _colonnes_modifiees(orm_execute_state):
+    """Noms des colonnes de la clause SET d'un UPDATE en masse (values() ou paramètres par ligne)"""
+    statement = orm_execute_state.statement
+    cles = list(statement._values or ()) + [cle for cle, _ in statement._ordered_values or ()]
+    parameters = orm_execute_state.parameters or []
+    if isinstance(parameters, dict):
+        parameters = [parameters]
+    for params in parameters:
+        cles += list(params)
+    # Clés : colonne, attribut ORM ou nom
+    return {getattr(cle, 'key', cle) for cle in cles}
+
+
+@event.listens_for(Session, 'before_flush')
+def _anciens_titulaires(session, flush_context, instances):
+    # Rôle réattribué à un autre utilisateur : l'ancien titulaire n'est connu que de la
+    # base quand l'attribut était expiré (après un commit), lu avant son écrasement
+    ur_ids = [
+        obj.ur_id for obj in session.dirty
+        if isinstance(obj, UtilisateurRole) and obj.ur_id is not None
+        and sa_inspect(obj).attrs.id_utilisateur.history.has_changes()
+    ]
+    if not ur_ids:
+        return
+    with session.no_autoflush, use_primary():
+        anciens = session.execute(
+            select(UtilisateurRole.id_utilisateur).where(UtilisateurRole.ur_id.in_(ur_ids))
+        ).scalars()
+        session.info.setdefault(_ANCIENS_TITULAIRES_KEY, set()).update(anciens)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_on_flush(session, flush_context):
+    a_incrementer = session.info.pop(_ANCIENS_TITULAIRES_KEY, set())
+    supprimes = set()
+
+    for obj in session.dirty:
+        if isinstance(obj, Utilisateur) and _attributes_changed(obj, SECURITY_ATTRIBUTES):
+            a_incrementer.add(obj.id_utilisateur)
+        elif isinstance(obj, UtilisateurRole) and _attributes_changed(obj, ROLE_ATTRIBUTES):
+            a_incrementer.add(obj.id_utilisateur)
+    for obj in session.deleted:
+        if isinstance(obj, Utilisateur):
+            supprimes.add(obj.id_utilisateur)
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, UtilisateurRole):
+            a_incrementer.add(obj.id_utilisateur)
+
+    a_incrementer.discard(None)
+
+    a_incrementer -= supprimes
+    if a_incrementer:
+        _bump(session.connection(), a_incrementer)
+    if a_incrementer or supprimes:
+        mark_domain(session, 'tokens')
+        pending = _pending(session)
+        if pending is not _ALL:
+            pending |= a_incrementer | supprimes
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_on_bulk(orm_execute_state):
+    # Query.update() / Query.delete() et insert() en masse ne passent pas par le flush
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    session = orm_execute_state.session
+
+    if issubclass(mapper.class_, Utilisateur):
+        if orm_execute_state.is_insert:
+            return
+        if orm_execute_state.is_update:
+            # Même règle que le flush : seuls les attributs de sécurité révoquent les tokens
+            if not _colonnes_modifiees(orm_execute_state) & set(SECURITY_ATTRIBUTES):
+                return
+            if isinstance(orm_execute_state.parameters, list):
+                # UPDATE par clé primaire (une ligne de paramètres par utilisateur)
+                ids = {
+                    params.get('id_utilisateur') for params in orm_execute_state.parameters
+                    if set(params) & set(SECURITY_ATTRIBUTES)
+                } - {None}
+                _bump(session.connection(), ids)
+                mark_domain(session, 'tokens')
+                pending = _pending(session)
+                if pending is not _ALL:
+                    pending |= ids
+                return
+            # Incrémenter l'époque dans la même instruction UPDATE
+            orm_execute_state.statement = orm_execute_state.statement.values(
+                security_epoch=Utilisateur.security_epoch + 1
+            )
+        mark_domain(session, 'tokens')
+        session.info[_PENDING_KEY] = _ALL
+
+    elif issubclass(mapper.class_, UtilisateurRole):
+        statement = orm_execute_state.statement
+        if orm_execute_state.is_insert:
+            parameters = orm_execute_state.parameters or []
+            if isinstance(parameters, dict):
+                parameters = [parameters]
+            ids = {params.get('id_utilisateur') for params in parameters} - {None}
+        else:
+            query = select(UtilisateurRole.id_utilisateur).distinct()
+            if statement.whereclause is not None:
+                query = query.where(statement.whereclause)
+            ids = set(session.execute(query).scalars())
+        if ids:
+            _bump(session.connection(), ids)
+            mark_domain(session, 'tokens')
+            pending = _pending(session)
+            if pending is not _ALL:
+                pending |= ids
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending is _ALL:
+        security_epochs.invalidate()
+    elif pending:
+        security_epochs.invalidate(pending)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_ANCIENS_TITULAIRES_KEY, None)
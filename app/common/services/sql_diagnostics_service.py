@@ -0,0 +1,137 @@
+import json
+import threading
+from collections import Counter
+from flask import g, has_request_context, request
+from app.common.utils.sql_timing import on_sql_executed
+
+# Longueur maximale d'une instruction SQL dans les journaux
+_LONGUEUR_MAX = 1000
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Budget de requêtes SQL d'un endpoint dépassé ou motif N+1 détecté (mode strict)"""
+
+
+def forme_parametres(parameters, executemany=False):
+    """
+    Forme des paramètres liés d'une instruction (types, sans les valeurs).
+
+    {'id': 3, 'login': 'x'} -> "{id: int, login: str}" ; (3, 'x') -> "(int, str)" ;
+    executemany -> "200 x (int, str)"
+    """
+    if executemany and isinstance(parameters, (list, tuple)):
+        if not parameters:
+            return '0 x ()'
+        return f"{len(parameters)} x {forme_parametres(parameters[0])}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{cle}: {type(valeur).__name__}" for cle, valeur in parameters.items()) + '}'
+    if isinstance(parameters, (list, tuple)):
+        return '(' + ', '.join(type(valeur).__name__ for valeur in parameters) + ')'
+    return type(parameters).__name__
+
+
+def route_courante():
+    """Route à l'origine d'une instruction : 'GET /api/... (endpoint)' ou le thread hors requête"""
+    if has_request_context():
+        return f"{request.method} {request.path} ({request.endpoint})"
+    return f"hors requête ({threading.current_thread().name})"
+
+
+class SqlDiagnostics:
+    """
+    Diagnostic des requêtes SQL.
+
+    - Journal des requêtes lentes : toute instruction plus longue que
+      SQL_SLOW_QUERY_MS est journalisée avec la forme de ses paramètres liés
+      et la route qui l'a émise.
+    - Détection des N+1 : pendant une requête HTTP, les instructions SELECT sont
+      comptées par modèle (le SQL paramétré) ; un modèle exécuté au moins
+      SQL_N_PLUS_ONE_THRESHOLD fois (chargement paresseux de relations dans une
+      boucle) est signalé.
+    - Budget de requêtes : nombre maximal d'instructions par requête HTTP, fixé
+      par le décorateur query_budget, par SQL_QUERY_BUDGETS ({endpoint: n}) ou
+      par SQL_QUERY_BUDGET_DEFAULT.
+
+    En mode strict (SQL_DIAGNOSTICS_STRICT, actif dans la configuration de
+    test), un dépassement de budget ou un N+1 lève QueryBudgetExceeded à la fin
+    de la requête, ce qui fait échouer le test qui l'a émise.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('SQL_DIAGNOSTICS_ENABLED', True)
+        self.slow_ms = app.config.get('SQL_SLOW_QUERY_MS', 500)
+        self.n_plus_one = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', 10)
+        self.budget_defaut = app.config.get('SQL_QUERY_BUDGET_DEFAULT', 0)
+        self.strict = app.config.get('SQL_DIAGNOSTICS_STRICT', False)
+        try:
+            self.budgets = json.loads(app.config.get('SQL_QUERY_BUDGETS') or '{}')
+        except ValueError as e:
+            raise ValueError(f"SQL_QUERY_BUDGETS invalide (JSON attendu): {str(e)}") from e
+        if not self.enabled:
+            return
+
+        app.before_request(self._debut)
+        app.after_request(self._fin)
+        on_sql_executed(self._mesurer)
+
+    # Instructions SQL (chronométrées par sql_timing)
+
+    def _mesurer(self, statement, parameters, executemany, duree_s):
+        duree_ms = duree_s * 1000
+        if duree_ms >= self.slow_ms:
+            self.app.logger.warning(
+                f"Requête SQL lente ({duree_ms:.1f} ms) sur {route_courante()}: "
+                f"{_tronquer(statement)} | paramètres: {forme_parametres(parameters, executemany)}"
+            )
+        if has_request_context() and 'sql_modeles' in g:
+            g.sql_requetes += 1
+            if statement.lstrip()[:6].upper() == 'SELECT':
+                g.sql_modeles[statement] += 1
+
+    # Requêtes HTTP
+
+    def _debut(self):
+        # flask.g survit à la requête si son contexte d'application préexistait (tests)
+        g.pop('sql_budget', None)
+        g.sql_requetes = 0
+        g.sql_modeles = Counter()
+
+    def _fin(self, response):
+        if 'sql_modeles' not in g:
+            return response
+        problemes = []
+
+        repetes = [(modele, nombre) for modele, nombre in g.sql_modeles.items() if nombre >= self.n_plus_one]
+        for modele, nombre in sorted(repetes, key=lambda item: -item[1]):
+            problemes.append(f"N+1 probable : {nombre} exécutions de {_tronquer(modele)}")
+
+        budget = self.budget_pour(request.endpoint)
+        if budget and g.sql_requetes > budget:
+            problemes.append(f"Budget de requêtes SQL dépassé : {g.sql_requetes} > {budget}")
+
+        if problemes:
+            message = f"{route_courante()} : " + ' ; '.join(problemes)
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            self.app.logger.warning(message)
+        return response
+
+    def budget_pour(self, endpoint):
+        """Budget de requêtes SQL d'un endpoint (0 : aucun)"""
+        budget = g.get('sql_budget')
+        if budget is None:
+            budget = self.budgets.get(endpoint, self.budget_defaut)
+        return budget
+
+
+def _tronquer(statement):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= _LONGUEUR_MAX else statement[:_LONGUEUR_MAX] + '...'
+
+
+sql_diagnostics = SqlDiagnostics()
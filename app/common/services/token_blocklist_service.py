@@ -0,0 +1,161 @@
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from app.common.models import db, TokenBlocklist
+from app.common.utils.bloom_filter import BloomFilter
+from app.common.services.cache_version_service import cache_versions
+from app.common.services.db_routing_service import use_primary
+
+# Capacité minimale du filtre (évite de le reconstruire pour quelques révocations)
+CAPACITE_MIN = 1024
+
+
+class TokenBlocklistService:
+    """
+    Révocation des tokens JWT (liste de blocage des jti).
+
+    Un filtre de Bloom en mémoire, propre au processus, contient les jti révoqués
+    non expirés : un token non révoqué (cas courant) est validé sans aucune
+    requête. Seul un jti présent dans le filtre (révoqué ou faux positif) est
+    confirmé en base. Les révocations faites par les autres processus sont
+    ajoutées au filtre dès que le domaine 'revocations' du canal cache_version change
+    (lecture des seules nouvelles entrées) ; le filtre est de plus reconstruit
+    toutes les `refresh_interval` secondes et les entrées expirées sont purgées
+    périodiquement.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._charge_a = 0.0
+        # Plus grand id de token_blocklist présent dans le filtre
+        self._dernier_id = 0
+        self._a_completer = False
+        self._purge_a = time.monotonic()
+        # Révocations faites par ce processus : conservées lors des rechargements
+        # (un rechargement concurrent peut ne pas encore les voir en base)
+        self._revoques_locaux = {}
+        self.negatifs_filtre = 0
+        self.verifications_base = 0
+
+    def is_revoked(self, jti, refresh_interval=30, prune_interval=3600):
+        """
+        Vérifie si le token identifié par jti a été révoqué.
+
+        Chemin courant (token absent du filtre) : une comparaison d'horloge et le
+        test du filtre, sans requête ni changement du mode de routage. La purge
+        n'est évaluée qu'au rechargement du filtre.
+        """
+        bloom = self._bloom
+        if bloom is None or time.monotonic() - self._charge_a >= refresh_interval:
+            bloom = self.refresh(prune_interval)
+        elif self._a_completer:
+            self._completer()
+
+        if jti not in bloom:
+            self.negatifs_filtre += 1
+            return False
+
+        self.verifications_base += 1
+        return self._en_base(jti)
+
+    @use_primary()
+    def _en_base(self, jti):
+        """Confirme en base un jti présent dans le filtre (révoqué ou faux positif)"""
+        return db.session.execute(
+            select(TokenBlocklist.id).where(TokenBlocklist.jti == jti)
+        ).first() is not None
+
+    @use_primary()
+    def refresh(self, prune_interval=3600):
+        """Recharge le filtre depuis la base (et purge les entrées expirées si nécessaire)"""
+        with self._lock:
+            if time.monotonic() - self._purge_a >= prune_interval:
+                self.prune()
+
+            now = datetime.utcnow()
+            self._a_completer = False
+            # Plus grand id de la table (entrées expirées comprises), lu avant les jti : une
+            # révocation concurrente a un id supérieur et sera lue par _completer. Après une
+            # purge, un id libéré peut être réattribué (SQLite, compteur InnoDB au redémarrage)
+            dernier_id = db.session.execute(select(func.max(TokenBlocklist.id))).scalar() or 0
+            rows = db.session.execute(
+                select(TokenBlocklist.jti).where(TokenBlocklist.expire_a >= now, TokenBlocklist.id <= dernier_id)
+            ).all()
+            jtis = [jti for jti, in rows]
+            self._dernier_id = dernier_id
+            self._revoques_locaux = {
+                jti: expire_a for jti, expire_a in self._revoques_locaux.items() if expire_a >= now
+            }
+
+            bloom = BloomFilter(max((len(jtis) + len(self._revoques_locaux)) * 2, CAPACITE_MIN))
+            for jti in jtis:
+                bloom.add(jti)
+            for jti in self._revoques_locaux:
+                bloom.add(jti)
+
+            self._bloom = bloom
+            self._charge_a = time.monotonic()
+            return bloom
+
+    def invalidate(self):
+        """Signale de nouvelles révocations en base (lues à la prochaine vérification)"""
+        self._a_completer = True
+
+    @use_primary()
+    def _completer(self):
+        """Ajoute au filtre les révocations enregistrées depuis le dernier chargement"""
+        with self._lock:
+            self._a_completer = False
+            rows = db.session.execute(
+                select(TokenBlocklist.id, TokenBlocklist.jti).where(TokenBlocklist.id > self._dernier_id)
+            ).all()
+            for id_, jti in rows:
+                self._bloom.add(jti)
+                self._dernier_id = max(self._dernier_id, id_)
+
+    def prune(self):
+        """
+        Supprime les entrées dont le token a expiré.
+        Utilise sa propre transaction pour ne pas valider la session de la requête.
+        """
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                delete(TokenBlocklist.__table__).where(TokenBlocklist.__table__.c.expire_a < datetime.utcnow())
+            )
+        self._purge_a = time.monotonic()
+        return result.rowcount
+
+    def revoke(self, jti, expire_a, id_utilisateur=None, type_token='access'):
+        """
+        Révoque un token.
+
+        Args:
+            jti (str): Identifiant unique du token
+            expire_a (datetime): Date d'expiration du token (UTC)
+            id_utilisateur (int, optional): Propriétaire du token
+            type_token (str): 'access' ou 'refresh'
+        """
+        try:
+            db.session.add(TokenBlocklist(
+                jti=jti,
+                type_token=type_token,
+                id_utilisateur=id_utilisateur,
+                expire_a=expire_a
+            ))
+            db.session.commit()
+        except IntegrityError:
+            # Token déjà révoqué
+            db.session.rollback()
+
+        with self._lock:
+            self._revoques_locaux[jti] = expire_a
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+
+token_blocklist = TokenBlocklistService()
+
+cache_versions.subscribe('revocations', token_blocklist.invalidate)
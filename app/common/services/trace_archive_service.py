@@ -0,0 +1,276 @@
+import gzip
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from app.common.models import db, Trace
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+# Colonnes de Trace conservées dans les segments
+COLONNES = ('id', 'date', 'action', 'detail', 'code', 'param', 'code_sql', 'end_point', 'route', 'id_utilisateur', 'trace_uuid')
+
+INDEX_FICHIER = 'index.json'
+VERROU_FICHIER = '.lock'
+
+
+class ArchivePagination:
+    """Pagination d'une liste de traces fusionnée (base + archives), compatible avec celle de Flask-SQLAlchemy"""
+
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+
+    @property
+    def pages(self):
+        return math.ceil(self.total / self.per_page) if self.per_page else 0
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def has_next(self):
+        return self.page < self.pages
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+class TraceArchiveService:
+    """
+    Archivage des traces anciennes en segments NDJSON compressés.
+
+    Les traces plus anciennes que TRACE_RETENTION_DAYS jours sont déplacées, par
+    lots de TRACE_ARCHIVE_BATCH_SIZE, dans un segment gzip par jour
+    (traces-AAAA-MM-JJ.ndjson.gz) du dossier TRACE_ARCHIVE_DIR, puis supprimées
+    de la table trace. Un index (index.json) garde la plage de dates et le
+    nombre de traces de chaque segment : une lecture par plage de dates n'ouvre
+    que les segments concernés.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _config(self):
+        from flask import current_app
+        config = current_app.config
+        dossier = config.get('TRACE_ARCHIVE_DIR') or os.path.join(current_app.instance_path, 'trace_archive')
+        return dossier, config.get('TRACE_RETENTION_DAYS', 90), max(config.get('TRACE_ARCHIVE_BATCH_SIZE', 5000), 1)
+
+    @staticmethod
+    def _nom_segment(jour):
+        return f"traces-{jour}.ndjson.gz"
+
+    def lire_index(self, dossier=None):
+        """Retourne l'index des segments : {jour: {fichier, debut, fin, nombre}}"""
+        dossier = dossier or self._config()[0]
+        chemin = os.path.join(dossier, INDEX_FICHIER)
+        if not os.path.exists(chemin):
+            return {}
+        with open(chemin, encoding='utf-8') as fichier:
+            return json.load(fichier).get('segments', {})
+
+    def _ecrire_index(self, dossier, segments):
+        chemin = os.path.join(dossier, INDEX_FICHIER)
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump({'segments': segments}, fichier, ensure_ascii=False, indent=1, sort_keys=True)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        os.replace(temporaire, chemin)
+
+    def archive(self, retention_days=None, batch_size=None, dry_run=False):
+        """
+        Archive puis supprime les traces plus anciennes que la fenêtre de rétention.
+
+        Chaque lot est d'abord écrit (et synchronisé sur disque) dans les segments,
+        puis supprimé de la base : une interruption peut au pire dupliquer un lot,
+        les lectures dédoublonnant par id.
+
+        Args:
+            retention_days (int, optional): Fenêtre de rétention en jours (TRACE_RETENTION_DAYS par défaut)
+            batch_size (int, optional): Taille des lots (TRACE_ARCHIVE_BATCH_SIZE par défaut)
+            dry_run (bool): Compter les traces à archiver sans rien modifier
+
+        Returns:
+            dict: {'limite', 'archivees', 'segments'}
+        """
+        dossier, retention_defaut, batch_defaut = self._config()
+        retention_days = retention_defaut if retention_days is None else retention_days
+        batch_size = batch_size or batch_defaut
+        limite = datetime.combine(datetime.utcnow().date() - timedelta(days=retention_days), datetime.min.time())
+        table = Trace.__table__
+
+        if dry_run:
+            nombre = db.session.execute(
+                select(db.func.count()).select_from(table).where(table.c.date < limite)
+            ).scalar()
+            return {'limite': limite, 'archivees': nombre, 'segments': []}
+
+        os.makedirs(dossier, exist_ok=True)
+        archivees = 0
+        jours_modifies = set()
+        with self._verrou(dossier):
+            segments = self.lire_index(dossier)
+            while True:
+                with db.engine.begin() as connection:
+                    rows = connection.execute(
+                        select(*(table.c[colonne] for colonne in COLONNES))
+                        .where(table.c.date < limite)
+                        .order_by(table.c.date, table.c.id)
+                        .limit(batch_size)
+                    ).mappings().all()
+                    if not rows:
+                        break
+
+                    par_jour = {}
+                    for row in rows:
+                        par_jour.setdefault(row['date'].date().isoformat(), []).append(dict(row))
+                    for jour, traces in par_jour.items():
+                        self._ajouter_segment(dossier, segments, jour, traces)
+                        jours_modifies.add(jour)
+                    # L'index doit couvrir les segments avant la suppression en base
+                    self._ecrire_index(dossier, segments)
+
+                    connection.execute(delete(table).where(table.c.id.in_([row['id'] for row in rows])))
+                archivees += len(rows)
+
+        return {'limite': limite, 'archivees': archivees, 'segments': sorted(jours_modifies)}
+
+    def _ajouter_segment(self, dossier, segments, jour, traces):
+        fichier = self._nom_segment(jour)
+        # Ajout d'un membre gzip en fin de fichier : le segment reste lisible d'un bloc
+        with open(os.path.join(dossier, fichier), 'ab') as brut:
+            with gzip.GzipFile(fileobj=brut, mode='ab') as segment:
+                for trace in traces:
+                    segment.write((json.dumps(trace, default=_serialiser, ensure_ascii=False) + '\n').encode('utf-8'))
+            brut.flush()
+            os.fsync(brut.fileno())
+
+        debut = traces[0]['date'].isoformat()
+        fin = traces[-1]['date'].isoformat()
+        entree = segments.get(jour)
+        if entree is None:
+            segments[jour] = {'fichier': fichier, 'debut': debut, 'fin': fin, 'nombre': len(traces)}
+        else:
+            entree['debut'] = min(entree['debut'], debut)
+            entree['fin'] = max(entree['fin'], fin)
+            entree['nombre'] += len(traces)
+
+    def _verrou(self, dossier):
+        return _VerrouArchive(self._lock, os.path.join(dossier, VERROU_FICHIER))
+
+    def _segments_pour(self, start, end):
+        """Segments de l'index recouvrant [start, end[, du plus récent au plus ancien"""
+        dossier = self._config()[0]
+        segments = self.lire_index(dossier)
+        concernes = []
+        for jour in sorted(segments, reverse=True):
+            entree = segments[jour]
+            if datetime.fromisoformat(entree['fin']) < start or datetime.fromisoformat(entree['debut']) >= end:
+                continue
+            concernes.append((dossier, entree))
+        return concernes
+
+    def _lire_segment(self, dossier, entree, start, end):
+        """Traces d'un segment comprises dans [start, end[, de la plus récente à la plus ancienne"""
+        traces = {}
+        chemin = os.path.join(dossier, entree['fichier'])
+        if not os.path.exists(chemin):
+            return []
+        with gzip.open(chemin, 'rt', encoding='utf-8') as segment:
+            for ligne in segment:
+                if not ligne.strip():
+                    continue
+                row = json.loads(ligne)
+                row['date'] = datetime.fromisoformat(row['date'])
+                if start <= row['date'] < end:
+                    traces[row['id']] = row
+        return sorted(traces.values(), key=lambda row: (row['date'], row['id']), reverse=True)
+
+    def _entierement_inclus(self, entree, start, end):
+        return start <= datetime.fromisoformat(entree['debut']) and datetime.fromisoformat(entree['fin']) < end
+
+    def count_range(self, start, end):
+        """Nombre de traces archivées dans [start, end[ (seuls les segments partiels sont lus)"""
+        total = 0
+        for dossier, entree in self._segments_pour(start, end):
+            if self._entierement_inclus(entree, start, end):
+                total += entree['nombre']
+            else:
+                total += len(self._lire_segment(dossier, entree, start, end))
+        return total
+
+    def read_range(self, start, end, offset=0, limit=None):
+        """
+        Traces archivées dans [start, end[, de la plus récente à la plus ancienne.
+
+        Les segments entièrement sautés par offset ne sont pas ouverts.
+
+        Returns:
+            list: dicts des colonnes de Trace
+        """
+        resultat = []
+        for dossier, entree in self._segments_pour(start, end):
+            if limit is not None and len(resultat) >= limit:
+                break
+            if offset and self._entierement_inclus(entree, start, end) and offset >= entree['nombre']:
+                offset -= entree['nombre']
+                continue
+            traces = self._lire_segment(dossier, entree, start, end)
+            if offset:
+                saut = min(offset, len(traces))
+                traces = traces[saut:]
+                offset -= saut
+            resultat.extend(traces)
+        return resultat if limit is None else resultat[:limit]
+
+    def has_archives_before(self, date):
+        """Indique si des segments archivés contiennent des traces antérieures à date"""
+        segments = self.lire_index()
+        return any(datetime.fromisoformat(entree['debut']) < date for entree in segments.values())
+
+
+class _VerrouArchive:
+    """Verrou exclusif de l'archive : entre threads, et entre processus via flock"""
+
+    def __init__(self, lock, chemin):
+        self._lock = lock
+        self._chemin = chemin
+        self._fichier = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            self._fichier = open(self._chemin, 'a')
+            fcntl.flock(self._fichier, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fichier is not None:
+            fcntl.flock(self._fichier, fcntl.LOCK_UN)
+            self._fichier.close()
+            self._fichier = None
+        self._lock.release()
+
+
+def _serialiser(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} non sérialisable")
+
+
+trace_archive = TraceArchiveService()
@@ -0,0 +1,248 @@
+import atexit
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from app.common.models import db, Codification
+from app.common.services.cache_version_service import cache_versions
+from app.common.services.db_routing_service import use_primary
+from app.common.services.trace_writer_service import trace_writer
+from app.common.services.trace_spool_service import trace_spool
+
+# Décisions possibles d'une politique de trace
+KEEP = 'keep'
+SAMPLE = 'sample'
+AGGREGATE = 'aggregate'
+SKIP = 'skip'
+
+# Codifications portant des politiques : libelle = clé, valeur_defaut = décision
+CODIFICATION_PARAM = 'TRACE_POLICY'
+
+# Méthodes en lecture seule : les autres (écritures) sont toujours tracées
+METHODES_LECTURE = ('GET', 'HEAD', 'OPTIONS')
+
+WILDCARD = '*'
+
+
+def parse_decision(valeur):
+    """
+    Convertit une décision textuelle en (mode, taux).
+
+    'keep' -> (keep, 1.0), 'sample:0.05' -> (sample, 0.05), 'aggregate' -> (aggregate, 0.0)
+    """
+    valeur = (valeur or '').strip().lower()
+    if valeur == KEEP:
+        return KEEP, 1.0
+    if valeur == AGGREGATE:
+        return AGGREGATE, 0.0
+    if valeur.startswith(SAMPLE + ':'):
+        taux = float(valeur.split(':', 1)[1])
+        if not 0.0 <= taux <= 1.0:
+            raise ValueError(f"Taux d'échantillonnage hors de [0, 1]: {valeur}")
+        return SAMPLE, taux
+    raise ValueError(f"Politique de trace invalide: {valeur}")
+
+
+def parse_key(cle):
+    """
+    Convertit une clé 'action_type:code_prefix:methode:classe_statut' en tuple.
+    Les segments manquants valent '*'.
+    """
+    segments = [segment.strip() or WILDCARD for segment in cle.split(':')]
+    if len(segments) > 4:
+        raise ValueError(f"Clé de politique de trace invalide: {cle}")
+    segments += [WILDCARD] * (4 - len(segments))
+    action_type, code_prefix, methode, classe_statut = segments
+    return action_type, code_prefix, methode.upper(), classe_statut.lower()
+
+
+class TracePolicyEngine:
+    """
+    Politiques d'enregistrement des traces de @trace_action.
+
+    Une politique associe une clé 'action_type:code_prefix:methode:classe_statut'
+    (chaque segment pouvant valoir '*', la classe de statut s'écrivant '2xx',
+    '3xx'...) à une décision : 'keep', 'sample:p' (trace gardée avec la
+    probabilité p) ou 'aggregate' (requêtes comptées et écrites en une trace
+    par fenêtre de TRACE_AGGREGATE_WINDOW_S secondes). La clé la plus précise
+    l'emporte. Les écritures et les erreurs sont toujours tracées.
+
+    Les politiques viennent de TRACE_POLICIES et des codifications
+    'TRACE_POLICY' ; elles sont rechargées à chaud quand une codification change.
+    La décision résolue est mémorisée par combinaison : une seule consultation
+    de dictionnaire par requête.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.app = None
+        self._policies = None
+        self._resolved = {}
+        self._default = (KEEP, 1.0)
+        # (action, code, route, statut) -> [nombre, utilisateurs, début, fin]
+        self._aggregats = {}
+        self._fenetre_debut = time.monotonic()
+        self.aggregate_window = 60
+
+    def init_app(self, app):
+        self.app = app
+        self.aggregate_window = app.config.get('TRACE_AGGREGATE_WINDOW_S', 60)
+        if trace_writer.app is not None:
+            # Agrégats écrits périodiquement par le thread d'écriture, et à l'arrêt
+            trace_writer.add_periodic(self.collect_aggregates)
+        else:
+            atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        with self.app.app_context():
+            self.flush_aggregates(force=True)
+
+    def invalidate(self):
+        """Recharger les politiques à la prochaine décision"""
+        self._policies = None
+
+    @use_primary()
+    def reload(self):
+        """Recharge les politiques depuis la configuration et les codifications"""
+        config = self.app.config if self.app is not None else {}
+        politiques = {}
+
+        sources = config.get('TRACE_POLICIES') or {}
+        if isinstance(sources, str):
+            sources = json.loads(sources)
+        sources = dict(sources)
+
+        if config.get('TRACE_POLICY_CODIFICATION', True):
+            for libelle, valeur in db.session.execute(
+                select(Codification.libelle, Codification.valeur_defaut)
+                .where(Codification.param == CODIFICATION_PARAM)
+            ).all():
+                # Les codifications priment sur la configuration
+                sources[libelle] = valeur
+
+        for cle, valeur in sources.items():
+            try:
+                politiques[parse_key(cle)] = parse_decision(valeur)
+            except ValueError as e:
+                if self.app is not None:
+                    self.app.logger.warning(f"Politique de trace ignorée ({cle}): {str(e)}")
+
+        default = parse_decision(config.get('TRACE_DEFAULT_POLICY', KEEP))
+        with self._lock:
+            self._policies = politiques
+            self._default = default
+            self._resolved = {}
+        return politiques
+
+    def _resolve(self, politiques, action_type, code_prefix, methode, classe_statut):
+        # Du plus précis au plus général : action_type, code_prefix, méthode, statut
+        for a in (action_type, WILDCARD):
+            for c in (code_prefix, WILDCARD):
+                for m in (methode, WILDCARD):
+                    for s in (classe_statut, WILDCARD):
+                        decision = politiques.get((a, c, m, s))
+                        if decision is not None:
+                            return decision
+        return self._default
+
+    def decide(self, action_type, code_prefix, methode, statut):
+        """
+        Décide du sort de la trace d'une requête.
+
+        Returns:
+            tuple: (mode, taux) avec mode keep, aggregate ou skip ; taux est la
+                   probabilité d'échantillonnage d'une trace gardée
+        """
+        if methode not in METHODES_LECTURE or statut >= 400:
+            return KEEP, 1.0
+
+        politiques = self._policies
+        if politiques is None:
+            politiques = self.reload()
+
+        cle = (action_type, code_prefix, methode, f"{statut // 100}xx")
+        decision = self._resolved.get(cle)
+        if decision is None:
+            decision = self._resolve(politiques, *cle)
+            self._resolved[cle] = decision
+
+        mode, taux = decision
+        if mode == SAMPLE:
+            return (KEEP, taux) if random.random() < taux else (SKIP, taux)
+        return mode, taux
+
+    def aggregate(self, action, code, route, statut, id_utilisateur=None):
+        """
+        Compte une requête agrégée (écrite plus tard en une seule trace).
+        route est le modèle de la route (/api/traces/<int:id>) : une trace par route, pas par ressource.
+        """
+        now = datetime.utcnow()
+        cle = (action, code, route, statut)
+        with self._lock:
+            aggregat = self._aggregats.get(cle)
+            if aggregat is None:
+                self._aggregats[cle] = [1, {id_utilisateur} - {None}, now, now]
+            else:
+                aggregat[0] += 1
+                if id_utilisateur is not None:
+                    aggregat[1].add(id_utilisateur)
+                aggregat[3] = now
+
+        # Sans thread d'écriture, les agrégats sont écrits par les requêtes
+        if trace_writer.app is None:
+            self.flush_aggregates()
+
+    def flush_aggregates(self, force=False):
+        """Écrit directement en base les agrégats dont la fenêtre est écoulée (ou tous si force)"""
+        rows = self.collect_aggregates(force)
+        if rows:
+            try:
+                with db.engine.begin() as connection:
+                    trace_writer.write_rows(connection, rows)
+            except SQLAlchemyError as e:
+                self.app.logger.error(f"Erreur lors de l'écriture des traces agrégées, conservées dans le spool: {str(e)}")
+                trace_spool.record_failure()
+                trace_spool.append(rows)
+        return len(rows)
+
+    def collect_aggregates(self, force=False):
+        """Retourne une trace par agrégat quand la fenêtre est écoulée (ou si force) et les vide"""
+        if not self._aggregats:
+            return []
+        if not force and time.monotonic() - self._fenetre_debut < self.aggregate_window:
+            return []
+        with self._lock:
+            aggregats, self._aggregats = self._aggregats, {}
+            self._fenetre_debut = time.monotonic()
+
+        rows = []
+        for (action, code, route, statut), (nombre, utilisateurs, debut, fin) in aggregats.items():
+            rows.append({
+                'date': fin,
+                'action': action,
+                'detail': f"{nombre} requête(s) agrégée(s) sur {route}",
+                'code': f"{code}_AGG",
+                'param': json.dumps({
+                    'aggregate': True,
+                    'count': nombre,
+                    'status': statut,
+                    'utilisateurs': len(utilisateurs),
+                    'debut': debut.isoformat(),
+                    'fin': fin.isoformat()
+                }, ensure_ascii=False),
+                'code_sql': None,
+                'end_point': route,
+                'route': route,
+                'id_utilisateur': next(iter(utilisateurs)) if len(utilisateurs) == 1 else None,
+                'trace_uuid': str(uuid.uuid4())
+            })
+        return rows
+
+
+trace_policy = TracePolicyEngine()
+
+cache_versions.subscribe('codification', trace_policy.invalidate)
@@ -0,0 +1,301 @@
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import delete, func, select, update
+from werkzeug.exceptions import HTTPException, MethodNotAllowed
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from app.common.models import db, Trace, TraceRollup, Utilisateur
+from app.common.services.db_routing_service import read_only
+
+# Dimensions de regroupement des statistiques -> colonne de trace_rollup
+DIMENSIONS = {
+    'action': TraceRollup.action,
+    'end_point': TraceRollup.end_point,
+    'utilisateur': TraceRollup.id_utilisateur
+}
+
+GRANULARITES = ('hour', 'day', 'month')
+
+_CLE = ('heure', 'action', 'end_point', 'id_utilisateur')
+
+
+def heure_de(date):
+    """Tronque une date à l'heure"""
+    return date.replace(minute=0, second=0, microsecond=0)
+
+
+def route_de(end_point, adapter):
+    """
+    Modèle de route d'un chemin tracé (traces antérieures à la colonne route),
+    ou le chemin lui-même s'il ne correspond à aucune route de l'application.
+    """
+    try:
+        regle, _ = adapter.match(end_point, return_rule=True)
+    except MethodNotAllowed as e:
+        # Route enregistrée pour d'autres méthodes que GET
+        try:
+            regle, _ = adapter.match(end_point, method=sorted(e.valid_methods or ['GET'])[0], return_rule=True)
+        except HTTPException:
+            return end_point
+    except HTTPException:
+        return end_point
+    return regle.rule
+
+
+def increments(rows):
+    """
+    Calcule les incréments d'agrégats d'un lot de traces (dicts des colonnes de Trace).
+
+    Le point d'entrée d'un agrégat est le modèle de la route (colonne route :
+    /api/utilisateurs/<int:id>), le chemin n'étant retenu qu'à défaut : le
+    nombre d'agrégats suit le nombre de routes, pas celui des ressources.
+
+    Une trace agrégée par les politiques de trace (param.aggregate) compte pour
+    param.count requêtes, une trace conservée par échantillonnage (sample:p,
+    param.sample_rate) pour 1/p requêtes, arrondi à l'entier. Une trace est en erreur si son code se termine par
+    _ERROR ou si son statut (param.status) est >= 400.
+
+    Returns:
+        dict: (heure, action, end_point, id_utilisateur) -> [nombre, erreurs]
+    """
+    resultat = {}
+    for row in rows:
+        date = row.get('date')
+        if date is None:
+            continue
+        nombre = 1
+        erreur = (row.get('code') or '').endswith('_ERROR')
+        param = row.get('param')
+        if param and ('"status"' in param or '"aggregate"' in param or '"sample_rate"' in param):
+            try:
+                valeurs = json.loads(param)
+            except ValueError:
+                valeurs = None
+            if isinstance(valeurs, dict):
+                if valeurs.get('aggregate'):
+                    nombre = int(valeurs.get('count') or 1)
+                taux = valeurs.get('sample_rate')
+                if isinstance(taux, (int, float)) and 0 < taux < 1:
+                    nombre = max(round(nombre / taux), 1)
+                statut = valeurs.get('status')
+                if isinstance(statut, int) and statut >= 400:
+                    erreur = True
+
+        end_point = row.get('route') or row.get('end_point') or ''
+        cle = (heure_de(date), row.get('action') or '', end_point, row.get('id_utilisateur') or 0)
+        agregat = resultat.get(cle)
+        if agregat is None:
+            resultat[cle] = [nombre, nombre if erreur else 0]
+        else:
+            agregat[0] += nombre
+            if erreur:
+                agregat[1] += nombre
+    return resultat
+
+
+class TraceRollupService:
+    """
+    Agrégats horaires des traces (table trace_rollup) : nombre de traces et
+    d'erreurs par heure, action, point d'entrée et utilisateur.
+
+    Le thread d'écriture des traces les met à jour dans la transaction de chaque
+    lot (upsert), l'écriture synchrone dans celle de la trace ; `flask traces
+    rollup` les recalcule depuis la table trace. Les statistiques sont lues
+    dans les agrégats, sans parcourir les traces.
+    """
+
+    def __init__(self):
+        self.enabled = False
+
+    def init_app(self, app):
+        from app.common.services.trace_writer_service import trace_writer
+        self.enabled = app.config.get('TRACE_ROLLUP_ENABLED', True)
+        if self.enabled:
+            trace_writer.add_batch_listener(self.apply_rows)
+
+    def apply_rows(self, connection, rows):
+        """Ajoute aux agrégats les traces d'un lot (dans la transaction de connection)"""
+        self.apply(connection, increments(rows))
+
+    def apply(self, connection, agregats):
+        """Ajoute des incréments {clé: [nombre, erreurs]} aux agrégats (upsert)"""
+        if not agregats:
+            return
+        table = TraceRollup.__table__
+        # Ordre stable des clés : limite les interblocages entre workers
+        valeurs = [
+            dict(zip(_CLE, cle), nombre=nombre, erreurs=erreurs)
+            for cle, (nombre, erreurs) in sorted(agregats.items())
+        ]
+        dialecte = connection.dialect.name
+
+        if dialecte in ('sqlite', 'postgresql'):
+            insert = sqlite.insert if dialecte == 'sqlite' else postgresql.insert
+            stmt = insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c[colonne] for colonne in _CLE],
+                set_={
+                    'nombre': table.c.nombre + stmt.excluded.nombre,
+                    'erreurs': table.c.erreurs + stmt.excluded.erreurs
+                }
+            )
+            connection.execute(stmt, valeurs)
+        elif dialecte in ('mysql', 'mariadb'):
+            stmt = mysql.insert(table)
+            stmt = stmt.on_duplicate_key_update(
+                nombre=table.c.nombre + stmt.inserted.nombre,
+                erreurs=table.c.erreurs + stmt.inserted.erreurs
+            )
+            connection.execute(stmt, valeurs)
+        else:
+            for valeur in valeurs:
+                result = connection.execute(
+                    update(table)
+                    .where(*(table.c[colonne] == valeur[colonne] for colonne in _CLE))
+                    .values(nombre=table.c.nombre + valeur['nombre'], erreurs=table.c.erreurs + valeur['erreurs'])
+                )
+                if result.rowcount == 0:
+                    connection.execute(table.insert(), valeur)
+
+    def rebuild(self, start=None, end=None, chunk_size=5000):
+        """
+        Recalcule les agrégats des heures [start, end[ depuis la table trace.
+
+        Les heures antérieures à la plus ancienne trace de la table (traces
+        archivées, dont les agrégats sont conservés) ne sont jamais touchées :
+        start est ramené à l'heure de cette trace. Les traces écrites avant la
+        colonne route sont rattachées à leur route par la table des routes de
+        l'application (blueprints chargés).
+
+        Returns:
+            dict: {'traces', 'agregats'}
+        """
+        table = Trace.__table__
+        rollup = TraceRollup.__table__
+        premiere = db.session.execute(select(func.min(table.c.date))).scalar()
+        if premiere is None:
+            return {'traces': 0, 'agregats': 0}
+        start = max(heure_de(start), heure_de(premiere)) if start is not None else heure_de(premiere)
+
+        requete = select(table.c.date, table.c.action, table.c.end_point, table.c.route, table.c.id_utilisateur,
+                         table.c.code, table.c.param).where(table.c.date >= start)
+        suppression = delete(rollup).where(rollup.c.heure >= start)
+        if end is not None:
+            end = heure_de(end)
+            requete = requete.where(table.c.date < end)
+            suppression = suppression.where(rollup.c.heure < end)
+
+        adapter = current_app.url_map.bind('localhost')
+        routes = {}
+        agregats = {}
+        traces = 0
+        with db.engine.begin() as connection:
+            result = connection.execution_options(yield_per=chunk_size, stream_results=True).execute(requete)
+            for partition in result.partitions():
+                lot = [row._asdict() for row in partition]
+                for trace in lot:
+                    if not trace['route'] and trace['end_point']:
+                        route = routes.get(trace['end_point'])
+                        if route is None:
+                            route = routes[trace['end_point']] = route_de(trace['end_point'], adapter)
+                        trace['route'] = route
+                traces += len(lot)
+                for cle, (nombre, erreurs) in increments(lot).items():
+                    agregat = agregats.setdefault(cle, [0, 0])
+                    agregat[0] += nombre
+                    agregat[1] += erreurs
+            connection.execute(suppression)
+            self.apply(connection, agregats)
+        return {'traces': traces, 'agregats': len(agregats)}
+
+    def _periode(self, granularite):
+        """Expression SQL de la période (début d'heure, de jour ou de mois) d'un agrégat"""
+        if granularite == 'hour':
+            return TraceRollup.heure
+        dialecte = db.engine.dialect.name
+        if dialecte == 'postgresql':
+            return func.date_trunc(granularite, TraceRollup.heure)
+        format_sql = '%Y-%m-%d 00:00:00' if granularite == 'day' else '%Y-%m-01 00:00:00'
+        if dialecte in ('mysql', 'mariadb'):
+            return func.date_format(TraceRollup.heure, format_sql)
+        return func.strftime(format_sql, TraceRollup.heure)
+
+    def _filtrer(self, query, start, end, filtres):
+        if start is not None:
+            query = query.where(TraceRollup.heure >= heure_de(start))
+        if end is not None:
+            query = query.where(TraceRollup.heure < end)
+        for dimension, valeur in (filtres or {}).items():
+            if valeur is not None:
+                query = query.where(DIMENSIONS[dimension] == valeur)
+        return query
+
+    @read_only()
+    def stats(self, start=None, end=None, granularite=None, group_by=None, filtres=None, limit=None):
+        """
+        Nombre de traces et d'erreurs, par période et/ou par dimensions.
+
+        Args:
+            start, end (datetime): Plage [start, end[
+            granularite (str, optional): 'hour', 'day' ou 'month'
+            group_by (list, optional): Dimensions parmi action, end_point, utilisateur
+            filtres (dict, optional): {dimension: valeur}
+            limit (int, optional): Nombre maximal de lignes
+
+        Returns:
+            list: [{periode?, <dimensions>, nombre, erreurs}]
+        """
+        group_by = list(group_by or [])
+        colonnes = []
+        if granularite:
+            colonnes.append(self._periode(granularite).label('periode'))
+        colonnes += [DIMENSIONS[dimension].label(dimension) for dimension in group_by]
+
+        query = select(
+            *colonnes,
+            func.sum(TraceRollup.nombre).label('nombre'),
+            func.sum(TraceRollup.erreurs).label('erreurs')
+        )
+        query = self._filtrer(query, start, end, filtres)
+        if colonnes:
+            query = query.group_by(*colonnes)
+            if granularite:
+                query = query.order_by(colonnes[0])
+            else:
+                query = query.order_by(func.sum(TraceRollup.nombre).desc())
+        if limit:
+            query = query.limit(limit)
+
+        return self._lignes(db.session.execute(query).mappings().all(), 'utilisateur' in group_by)
+
+    @read_only()
+    def top(self, dimension, start=None, end=None, filtres=None, limit=10):
+        """Valeurs d'une dimension les plus fréquentes sur la plage"""
+        return self.stats(start, end, group_by=[dimension], filtres=filtres, limit=limit)
+
+    def _lignes(self, rows, avec_utilisateur):
+        lignes = []
+        for row in rows:
+            ligne = dict(row)
+            if 'periode' in ligne and isinstance(ligne['periode'], datetime):
+                ligne['periode'] = ligne['periode'].isoformat()
+            elif 'periode' in ligne and ligne['periode'] is not None:
+                ligne['periode'] = str(ligne['periode']).replace(' ', 'T')
+            ligne['nombre'] = int(ligne['nombre'] or 0)
+            ligne['erreurs'] = int(ligne['erreurs'] or 0)
+            lignes.append(ligne)
+
+        if avec_utilisateur:
+            # Logins des utilisateurs en une requête ; 0 = traces sans utilisateur
+            ids = {ligne['utilisateur'] for ligne in lignes} - {0}
+            logins = dict(db.session.execute(
+                select(Utilisateur.id_utilisateur, Utilisateur.login).where(Utilisateur.id_utilisateur.in_(ids))
+            ).all()) if ids else {}
+            for ligne in lignes:
+                id_utilisateur = ligne.pop('utilisateur') or None
+                ligne['id_utilisateur'] = id_utilisateur
+                ligne['login'] = logins.get(id_utilisateur)
+        return lignes
+
+
+trace_rollup = TraceRollupService()
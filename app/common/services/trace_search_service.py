@@ -0,0 +1,221 @@
+import re
+import threading
+from sqlalchemy import column, or_, table, text
+from app.common.models import db, Trace
+
+# Colonnes indexées en texte intégral
+COLONNES = ('action', 'detail', 'code', 'end_point')
+
+FTS_TABLE = 'trace_fts'
+FULLTEXT_INDEX = 'ft_trace_search'
+
+FTS5 = 'fts5'
+FULLTEXT = 'fulltext'
+
+# Table FTS5 à contenu externe (la table trace) : seul l'index inversé est stocké
+_FTS5_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{', '.join(COLONNES)}, content='trace', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    # Déclencheurs : toute écriture sur trace (ORM, executemany du thread d'écriture, archivage) met l'index à jour
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON trace BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(COLONNES)}) "
+    f"VALUES (new.id, {', '.join('new.' + c for c in COLONNES)}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON trace BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(COLONNES)}) "
+    f"VALUES ('delete', old.id, {', '.join('old.' + c for c in COLONNES)}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON trace BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(COLONNES)}) "
+    f"VALUES ('delete', old.id, {', '.join('old.' + c for c in COLONNES)}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(COLONNES)}) "
+    f"VALUES (new.id, {', '.join('new.' + c for c in COLONNES)}); END",
+)
+
+_FTS5_DROP = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+# Termes d'une recherche : "expression exacte", mot ou préfixe (mot*)
+_TERME = re.compile(r'"([^"]+)"|(\S+)')
+_MOT = re.compile(r'\w+', re.UNICODE)
+
+_fts = table(FTS_TABLE, column('rowid'), column('rank'))
+
+
+def parse_search(terme):
+    """
+    Découpe une recherche en termes : [(mots, prefixe)].
+
+    'connexion "mot de passe" util*' -> [(['connexion'], False),
+    (['mot', 'de', 'passe'], False), (['util'], True)]
+    """
+    termes = []
+    for expression, mot in _TERME.findall(terme or ''):
+        brut = expression or mot
+        prefixe = not expression and brut.endswith('*')
+        mots = _MOT.findall(brut)
+        if mots:
+            termes.append((mots, prefixe))
+    return termes
+
+
+def fts5_query(termes):
+    """Requête MATCH FTS5 : chaque terme entre guillemets (aucun opérateur injecté), préfixe avec *"""
+    return ' '.join(f'"{" ".join(mots)}"' + ('*' if prefixe else '') for mots, prefixe in termes)
+
+
+def mysql_boolean_query(termes):
+    """Requête MATCH ... AGAINST en mode booléen : tous les termes requis (+)"""
+    parties = []
+    for mots, prefixe in termes:
+        if len(mots) > 1:
+            parties.append(f'+"{" ".join(mots)}"')
+        else:
+            parties.append(f"+{mots[0]}" + ('*' if prefixe else ''))
+    return ' '.join(parties)
+
+
+def _index_existant(connection):
+    """Index plein texte présent en base : 'fts5', 'fulltext' ou None"""
+    dialecte = connection.get_bind().dialect.name if hasattr(connection, 'get_bind') else connection.dialect.name
+    if dialecte == 'sqlite':
+        existe = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :nom"), {'nom': FTS_TABLE}
+        ).first()
+        return FTS5 if existe else None
+    if dialecte in ('mysql', 'mariadb'):
+        existe = connection.execute(
+            text("SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+                 "AND TABLE_NAME = 'trace' AND INDEX_NAME = :nom LIMIT 1"), {'nom': FULLTEXT_INDEX}
+        ).first()
+        return FULLTEXT if existe else None
+    return None
+
+
+class TraceSearchIndex:
+    """
+    Index de recherche en texte intégral des traces.
+
+    SQLite : table virtuelle FTS5 trace_fts à contenu externe, alimentée par des
+    déclencheurs sur la table trace (créée au démarrage). MySQL : index FULLTEXT
+    ft_trace_search sur (action, detail, code, end_point), créé par migration ou
+    par `flask traces reindex`. Les résultats sont triés par pertinence (bm25
+    pour FTS5, score MATCH pour MySQL). Sans index disponible, la recherche
+    revient au ilike('%terme%') sur les quatre colonnes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backend = None
+        self._detecte = False
+
+    def invalidate(self):
+        """Redétecter l'index à la prochaine recherche"""
+        with self._lock:
+            self._detecte = False
+            self._backend = None
+
+    def backend(self):
+        """Retourne 'fts5', 'fulltext' ou None si aucun index n'est disponible"""
+        if self._detecte:
+            return self._backend
+        with self._lock:
+            if not self._detecte:
+                self._backend = self._detecter()
+                self._detecte = True
+            return self._backend
+
+    def _detecter(self):
+        from flask import current_app
+        if not current_app.config.get('TRACE_SEARCH_FULLTEXT', True):
+            return None
+        return _index_existant(db.session)
+
+    def create_index(self, connection=None, rebuild=False):
+        """
+        Crée l'index du moteur courant (idempotent).
+
+        Args:
+            connection: Connexion à utiliser (transaction de l'appelant), engine sinon
+            rebuild (bool): Réindexer les traces existantes même si l'index existait
+
+        Returns:
+            str: Moteur d'index créé ('fts5', 'fulltext') ou None si non pris en charge
+        """
+        if connection is None:
+            with db.engine.begin() as connection:
+                return self.create_index(connection, rebuild)
+
+        dialecte = connection.dialect.name
+        if dialecte == 'sqlite':
+            existait = _index_existant(connection) == FTS5
+            for instruction in _FTS5_DDL:
+                connection.exec_driver_sql(instruction)
+            if rebuild or not existait:
+                connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            backend = FTS5
+        elif dialecte in ('mysql', 'mariadb'):
+            existe = _index_existant(connection) == FULLTEXT
+            if existe and rebuild:
+                connection.exec_driver_sql(f"ALTER TABLE trace DROP INDEX {FULLTEXT_INDEX}")
+                existe = False
+            if not existe:
+                connection.exec_driver_sql(
+                    f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON trace ({', '.join(COLONNES)})"
+                )
+            backend = FULLTEXT
+        else:
+            backend = None
+        self.invalidate()
+        return backend
+
+    def drop_index(self, connection=None):
+        """Supprime l'index du moteur courant"""
+        if connection is None:
+            with db.engine.begin() as connection:
+                return self.drop_index(connection)
+        dialecte = connection.dialect.name
+        if dialecte == 'sqlite':
+            for instruction in _FTS5_DROP:
+                connection.exec_driver_sql(instruction)
+        elif dialecte in ('mysql', 'mariadb') and _index_existant(connection) == FULLTEXT:
+            connection.exec_driver_sql(f"ALTER TABLE trace DROP INDEX {FULLTEXT_INDEX}")
+        self.invalidate()
+
+    def filter(self, query, terme):
+        """
+        Restreint une requête ORM sur Trace aux traces correspondant à la recherche.
+
+        Returns:
+            tuple: (requête filtrée, expression de pertinence à trier par ordre croissant ou None)
+        """
+        backend = self.backend()
+        termes = parse_search(terme) if backend else []
+        if backend == FTS5 and termes:
+            query = query.join(_fts, _fts.c.rowid == Trace.id).filter(
+                text(f"{FTS_TABLE} MATCH :fts_query").bindparams(fts_query=fts5_query(termes))
+            )
+            # rank (bm25) : plus petit = plus pertinent
+            return query, _fts.c.rank
+        if backend == FULLTEXT and termes:
+            score = text(
+                f"MATCH (trace.{', trace.'.join(COLONNES)}) AGAINST (:ft_query IN BOOLEAN MODE)"
+            ).bindparams(ft_query=mysql_boolean_query(termes))
+            query = query.filter(score)
+            return query, text(
+                f"MATCH (trace.{', trace.'.join(COLONNES)}) AGAINST (:ft_rank IN BOOLEAN MODE) DESC"
+            ).bindparams(ft_rank=mysql_boolean_query(termes))
+
+        return query.filter(
+            or_(
+                Trace.action.ilike(f'%{terme}%'),
+                Trace.detail.ilike(f'%{terme}%'),
+                Trace.code.ilike(f'%{terme}%'),
+                Trace.end_point.ilike(f'%{terme}%')
+            )
+        ), None
+
+
+trace_search = TraceSearchIndex()
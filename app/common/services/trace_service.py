@@ -1,9 +1,24 @@
-from app.common.models import Trace, db
+from app.common.models import Role, RolePermission, Trace, Utilisateur, UtilisateurRole, db
+from app.common.services.trace_writer_service import trace_writer
+from app.common.services.trace_spool_service import trace_spool
+from app.common.services.trace_archive_service import trace_archive, ArchivePagination
+from app.common.utils.keyset_pagination import paginate_keyset, estimate_count
+from app.common.services.trace_search_service import trace_search
 from datetime import datetime, timedelta, date
+import csv
+import io
 import json
-from flask import request
-from sqlalchemy.orm import joinedload
-from sqlalchemy import or_
+import time
+import uuid
+from flask import request, current_app
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+
+# Colonnes à plat de l'export (trace puis utilisateur, préfixées par utilisateur_)
+EXPORT_TRACE_COLONNES = ('id', 'date', 'action', 'detail', 'code', 'param', 'code_sql', 'end_point', 'id_utilisateur')
+EXPORT_UTILISATEUR_COLONNES = ('login', 'nom', 'prenom', 'email', 'profil')
 
 def json_serial(obj):
     """Helper function pour convertir les objets datetime en chaînes pour JSON"""
@@ -11,12 +26,34 @@ def json_serial(obj):
         return obj.isoformat()
     raise TypeError(f"Type {type(obj)} non sérialisable")
 
+def route_courante():
+    """Modèle de la route Flask de la requête (/api/utilisateurs/<int:id>), ou son chemin à défaut"""
+    regle = request.url_rule
+    return regle.rule if regle is not None else request.path
+
+def utilisateur_complet():
+    """
+    Chargement de l'utilisateur des traces avec tout ce que TraceSchema sérialise
+    (entité, rôles, applications, permissions) : un nombre de requêtes fixe par
+    page, quel que soit le nombre d'utilisateurs distincts
+    """
+    return joinedload(Trace.utilisateur).options(
+        joinedload(Utilisateur.entite),
+        selectinload(Utilisateur.utilisateur_roles).options(
+            joinedload(UtilisateurRole.application),
+            joinedload(UtilisateurRole.role).options(
+                joinedload(Role.application),
+                selectinload(Role.role_permissions).joinedload(RolePermission.permission)
+            )
+        )
+    )
+
 class TraceService:
     def get_all_traces(self):
         return Trace.query.options(joinedload(Trace.utilisateur)).all()
     
     def get_traces_paginated(self, page, per_page):
-        return Trace.query.options(joinedload(Trace.utilisateur)).order_by(Trace.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        return Trace.query.options(utilisateur_complet()).order_by(Trace.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
     def get_trace_by_id(self, trace_id):
         return Trace.query.options(joinedload(Trace.utilisateur)).get(trace_id)
@@ -56,10 +93,15 @@ class TraceService:
         return Trace.query.options(joinedload(Trace.utilisateur)).filter_by(action=action).order_by(Trace.date.desc()).all()
     
     def get_traces_by_date_range(self, start_date, end_date):
-        return Trace.query.options(joinedload(Trace.utilisateur)).filter(
+        """Traces de la plage de dates, en base puis dans les segments archivés"""
+        fin = end_date + timedelta(days=1)
+        traces = Trace.query.options(joinedload(Trace.utilisateur)).filter(
             Trace.date >= start_date,
-            Trace.date < end_date + timedelta(days=1)
+            Trace.date < fin
         ).order_by(Trace.date.desc()).all()
+        if trace_archive.has_archives_before(fin):
+            traces.extend(self._traces_archivees(trace_archive.read_range(start_date, fin)))
+        return traces
     
     def get_traces_by_utilisateur_paginated(self, utilisateur_id, page, per_page):
         return Trace.query.options(joinedload(Trace.utilisateur)).filter_by(id_utilisateur=utilisateur_id).order_by(Trace.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
@@ -68,23 +110,143 @@ class TraceService:
         return Trace.query.options(joinedload(Trace.utilisateur)).filter_by(action=action).order_by(Trace.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
     
     def get_traces_by_date_range_paginated(self, start_date, end_date, page, per_page):
-        return Trace.query.options(joinedload(Trace.utilisateur)).filter(
+        fin = end_date + timedelta(days=1)
+        traces_paginated = Trace.query.options(joinedload(Trace.utilisateur)).filter(
             Trace.date >= start_date,
-            Trace.date < end_date + timedelta(days=1)
+            Trace.date < fin
         ).order_by(Trace.date.desc()).paginate(page=page, per_page=per_page, error_out=False)
+        if not trace_archive.has_archives_before(fin):
+            return traces_paginated
+        
+        # Les traces archivées, plus anciennes, suivent celles de la base
+        total_base = traces_paginated.total
+        items = list(traces_paginated.items)
+        debut_archive = max((page - 1) * per_page - total_base, 0)
+        if len(items) < per_page:
+            items.extend(self._traces_archivees(
+                trace_archive.read_range(start_date, fin, offset=debut_archive, limit=per_page - len(items))
+            ))
+        total = total_base + trace_archive.count_range(start_date, fin)
+        return ArchivePagination(items, page, per_page, total)
+    
+    def _traces_archivees(self, rows):
+        """Convertit des traces archivées en objets Trace détachés, avec leur utilisateur"""
+        ids = {row['id_utilisateur'] for row in rows} - {None}
+        utilisateurs = {}
+        if ids:
+            utilisateurs = {
+                utilisateur.id_utilisateur: utilisateur
+                for utilisateur in Utilisateur.query.filter(Utilisateur.id_utilisateur.in_(ids)).all()
+            }
+        traces = []
+        for row in rows:
+            trace = Trace(**row)
+            # Sans événement ni cascade : la trace n'est pas ajoutée à la session
+            set_committed_value(trace, 'utilisateur', utilisateurs.get(row['id_utilisateur']))
+            traces.append(trace)
+        return traces
     
     def search_traces_paginated(self, search_term, page, per_page):
-        """Rechercher des traces avec pagination"""
-        query = Trace.query.options(joinedload(Trace.utilisateur)).filter(
-            or_(
-                Trace.action.ilike(f'%{search_term}%'),
-                Trace.detail.ilike(f'%{search_term}%'),
-                Trace.code.ilike(f'%{search_term}%'),
-                Trace.end_point.ilike(f'%{search_term}%')
-            )
-        ).order_by(Trace.date.desc())
+        """Rechercher des traces avec pagination (index plein texte si disponible, triées par pertinence)"""
+        query, pertinence = trace_search.filter(Trace.query.options(joinedload(Trace.utilisateur)), search_term)
+        if pertinence is not None:
+            query = query.order_by(pertinence, Trace.date.desc())
+        else:
+            query = query.order_by(Trace.date.desc())
         return query.paginate(page=page, per_page=per_page, error_out=False)
 
+    # Pagination par curseur sur (date, id) : ni OFFSET ni COUNT par page
+    def _keyset(self, query, cursor, per_page, with_total=False, estimation=False):
+        traces_page = paginate_keyset(query, Trace.date, Trace.id, per_page, cursor)
+        if with_total:
+            if estimation:
+                traces_page.total, traces_page.total_approximatif = estimate_count(db.session, Trace.__table__)
+            else:
+                traces_page.total = query.order_by(None).count()
+        return traces_page
+    
+    def get_traces_keyset(self, cursor, per_page, with_total=False):
+        query = Trace.query.options(joinedload(Trace.utilisateur))
+        return self._keyset(query, cursor, per_page, with_total, estimation=True)
+    
+    def get_traces_by_utilisateur_keyset(self, utilisateur_id, cursor, per_page, with_total=False):
+        query = Trace.query.options(joinedload(Trace.utilisateur)).filter_by(id_utilisateur=utilisateur_id)
+        return self._keyset(query, cursor, per_page, with_total)
+    
+    def get_traces_by_action_keyset(self, action, cursor, per_page, with_total=False):
+        query = Trace.query.options(joinedload(Trace.utilisateur)).filter_by(action=action)
+        return self._keyset(query, cursor, per_page, with_total)
+    
+    def get_traces_by_date_range_keyset(self, start_date, end_date, cursor, per_page, with_total=False):
+        query = Trace.query.options(joinedload(Trace.utilisateur)).filter(
+            Trace.date >= start_date,
+            Trace.date < end_date + timedelta(days=1)
+        )
+        return self._keyset(query, cursor, per_page, with_total)
+    
+    def search_traces_keyset(self, search_term, cursor, per_page, with_total=False):
+        """Rechercher des traces avec pagination par curseur (triées par date)"""
+        query, _ = trace_search.filter(Trace.query.options(joinedload(Trace.utilisateur)), search_term)
+        return self._keyset(query, cursor, per_page, with_total)
+
+    def iter_export(self, format_export='ndjson', utilisateur_id=None, action=None, start_date=None, end_date=None,
+                    chunk_size=1000):
+        """
+        Génère l'export des traces par morceaux encodés (NDJSON ou CSV).
+        
+        Lecture par curseur serveur (yield_per) de lignes à plat (colonnes de la
+        trace et de l'utilisateur) : la mémoire reste constante quel que soit le
+        nombre de traces exportées. Les filtres sont ceux des routes par
+        utilisateur, par action et par plage de dates.
+        
+        Args:
+            format_export (str): 'ndjson' ou 'csv'
+            chunk_size (int): Nombre de traces lues et émises par morceau
+        
+        Yields:
+            bytes: Morceau de l'export
+        """
+        trace_table = Trace.__table__
+        utilisateur_table = Utilisateur.__table__
+        stmt = (
+            select(*(trace_table.c[colonne] for colonne in EXPORT_TRACE_COLONNES),
+                   *(utilisateur_table.c[colonne].label(f'utilisateur_{colonne}') for colonne in EXPORT_UTILISATEUR_COLONNES))
+            .select_from(trace_table.outerjoin(
+                utilisateur_table, utilisateur_table.c.id_utilisateur == trace_table.c.id_utilisateur
+            ))
+            .order_by(trace_table.c.date.desc(), trace_table.c.id.desc())
+        )
+        if utilisateur_id is not None:
+            stmt = stmt.where(trace_table.c.id_utilisateur == utilisateur_id)
+        if action:
+            stmt = stmt.where(trace_table.c.action == action)
+        if start_date is not None:
+            stmt = stmt.where(trace_table.c.date >= start_date)
+        if end_date is not None:
+            stmt = stmt.where(trace_table.c.date < end_date + timedelta(days=1))
+        
+        colonnes = list(EXPORT_TRACE_COLONNES) + [f'utilisateur_{colonne}' for colonne in EXPORT_UTILISATEUR_COLONNES]
+        result = db.session.execute(stmt, execution_options={'yield_per': chunk_size, 'stream_results': True})
+        
+        if format_export == 'csv':
+            tampon = io.StringIO()
+            writer = csv.writer(tampon)
+            writer.writerow(colonnes)
+            for partition in result.partitions():
+                for row in partition:
+                    writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+                yield tampon.getvalue().encode('utf-8')
+                tampon.seek(0)
+                tampon.truncate()
+            if tampon.tell():
+                yield tampon.getvalue().encode('utf-8')
+        else:
+            for partition in result.partitions():
+                yield ''.join(
+                    json.dumps(dict(zip(colonnes, row)), default=json_serial, ensure_ascii=False) + '\n'
+                    for row in partition
+                ).encode('utf-8')
+
     @staticmethod
     def ajouter_trace(action, detail, code, id_utilisateur=None, params=None, code_sql=None):
         """Ajouter une nouvelle trace"""
@@ -97,22 +259,49 @@ class TraceService:
                 except (TypeError, ValueError) as e:
                     param_json = json.dumps(params, default=str, ensure_ascii=False)
             
-            trace = Trace(
-                date=datetime.utcnow(),
-                action=action,
-                detail=detail,
-                code=code,
-                param=param_json,
-                code_sql=code_sql,
-                end_point=request.path,
-                id_utilisateur=id_utilisateur
-            )
+            trace_data = {
+                'date': datetime.utcnow(),
+                'action': action,
+                'detail': detail,
+                'code': code,
+                'param': param_json,
+                'code_sql': code_sql,
+                'end_point': request.path,
+                'route': route_courante(),
+                'id_utilisateur': id_utilisateur,
+                # Identifiant stable : dédoublonne les traces rejouées depuis le spool
+                'trace_uuid': str(uuid.uuid4())
+            }
+            # Spool laissé par un processus précédent : relancer son rejeu
+            trace_spool.resume()
             
-            db.session.add(trace)
-            db.session.commit()
+            # Écriture asynchrone groupée : pas de commit pendant la requête
+            if current_app.config.get('TRACE_ASYNC_ENABLED', True) and trace_writer.app is not None:
+                trace_writer.enqueue(trace_data)
+                return Trace(**trace_data)
+            
+            # Base en échec ou lente récemment : la trace va au spool sans attendre la base
+            if trace_spool.circuit_open():
+                trace_spool.append([trace_data])
+                return Trace(**trace_data)
+            
+            debut = time.monotonic()
+            try:
+                trace = Trace(**trace_data)
+                db.session.add(trace)
+                # Agrégats (trace_rollup) mis à jour dans la même transaction
+                trace_writer.notify_batch(db.session.connection(), [trace_data])
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                current_app.logger.error(f"Erreur lors de l'écriture de la trace, conservée dans le spool: {str(e)}")
+                trace_spool.record_failure()
+                trace_spool.append([trace_data])
+                return Trace(**trace_data)
+            trace_spool.record_latency(time.monotonic() - debut)
             return trace
         except Exception as e:
             db.session.rollback()
-            print(f"Erreur lors de l'ajout de la trace: {str(e)}")
+            current_app.logger.error(f"Erreur lors de l'ajout de la trace: {str(e)}")
             # On ne lève pas l'exception pour ne pas bloquer l'opération principale
             return None
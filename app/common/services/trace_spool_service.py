@@ -0,0 +1,275 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import select
+from app.common.models import db, Trace
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou limité au processus
+    fcntl = None
+
+# En-tête d'un enregistrement : longueur du JSON puis CRC32 (détection d'une écriture tronquée)
+_ENTETE = struct.Struct('>II')
+
+
+class TraceSpool:
+    """
+    Spool local des traces, en ajout seul, quand la base est lente ou indisponible.
+
+    Chaque trace est écrite dans instance/traces.spool sous la forme d'un
+    enregistrement préfixé par sa longueur et son CRC32, sous verrou de fichier
+    (plusieurs workers partagent le spool). Une écriture en base en échec, ou
+    plus lente que TRACE_SPOOL_LATENCY_BUDGET_MS, ouvre un disjoncteur : pendant
+    TRACE_SPOOL_COOLDOWN_S secondes les traces vont directement au spool, sans
+    faire payer aux requêtes la latence d'une base en difficulté. Un thread de
+    rejeu, propre au processus, réinjecte ensuite le spool dans la table trace
+    par lots, en ignorant les traces déjà présentes (trace_uuid).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.app = None
+        self.path = None
+        self._thread = None
+        self._pid = None
+        self._pid_verifie = None
+        self._ouvert_jusqua = 0.0
+        self.spooled = 0
+        self.replayed = 0
+        self.duplicates = 0
+        self.corrupted = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.path = os.path.join(app.instance_path, 'traces.spool')
+        self.latency_budget = app.config.get('TRACE_SPOOL_LATENCY_BUDGET_MS', 200) / 1000
+        self.cooldown = app.config.get('TRACE_SPOOL_COOLDOWN_S', 30)
+        self.replay_interval = app.config.get('TRACE_SPOOL_REPLAY_INTERVAL_S', 10)
+        self.batch_size = max(app.config.get('TRACE_BATCH_SIZE', 200), 1)
+        self.fsync = app.config.get('TRACE_SPOOL_FSYNC', False)
+
+    # Disjoncteur
+
+    def circuit_open(self):
+        """Vrai tant que les écritures en base sont suspendues (échec ou lenteur récente)"""
+        return time.monotonic() < self._ouvert_jusqua
+
+    def record_failure(self):
+        self._ouvert_jusqua = time.monotonic() + self.cooldown
+
+    def record_latency(self, secondes):
+        """Ouvre le disjoncteur si une écriture en base a dépassé le budget de latence"""
+        if secondes > self.latency_budget:
+            self.record_failure()
+
+    # Écriture
+
+    def append(self, rows):
+        """
+        Ajoute des traces (dicts des colonnes de Trace) au spool.
+
+        Returns:
+            bool: True si les traces ont été écrites sur disque
+        """
+        if not rows:
+            return True
+        donnees = bytearray()
+        for row in rows:
+            contenu = json.dumps(row, default=_serialiser, ensure_ascii=False).encode('utf-8')
+            donnees += _ENTETE.pack(len(contenu), zlib.crc32(contenu))
+            donnees += contenu
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock:
+                spool = self._ouvrir_verrouille()
+                try:
+                    spool.write(donnees)
+                    spool.flush()
+                    if self.fsync:
+                        os.fsync(spool.fileno())
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(spool, fcntl.LOCK_UN)
+                    spool.close()
+        except OSError as e:
+            self.app.logger.error(f"Erreur lors de l'écriture de {len(rows)} trace(s) dans le spool: {str(e)}")
+            return False
+        self.spooled += len(rows)
+        self._ensure_replayer()
+        return True
+
+    def _ouvrir_verrouille(self):
+        """
+        Ouvre le spool en ajout sous verrou exclusif. Si le fichier a été renommé
+        pour rejeu entre l'ouverture et l'obtention du verrou, rouvre le nouveau.
+        """
+        while True:
+            spool = open(self.path, 'ab')
+            if fcntl is None:
+                return spool
+            fcntl.flock(spool, fcntl.LOCK_EX)
+            try:
+                if os.fstat(spool.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return spool
+            except FileNotFoundError:
+                pass
+            fcntl.flock(spool, fcntl.LOCK_UN)
+            spool.close()
+
+    # Rejeu
+
+    def resume(self):
+        """Relance, une fois par processus, le rejeu d'un spool laissé par un processus précédent"""
+        if self._pid_verifie == os.getpid() or self.app is None:
+            return
+        self._pid_verifie = os.getpid()
+        if self.pending():
+            self._ensure_replayer()
+
+    def _ensure_replayer(self):
+        # Le thread ne survit pas à un fork (workers gunicorn) : un par processus
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='trace-spool-replay', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.replay_interval)
+            if self.circuit_open():
+                continue
+            try:
+                restant = self.replay()
+            except Exception as e:
+                self.app.logger.error(f"Erreur lors du rejeu du spool des traces: {str(e)}")
+                self.record_failure()
+                continue
+            if not restant and not self.pending():
+                # Spool vidé : le thread sera relancé au prochain ajout
+                with self._lock:
+                    if not self.pending():
+                        self._thread = None
+                        return
+
+    def pending(self):
+        """Indique si des traces attendent d'être rejouées"""
+        for chemin in (self.path, f"{self.path}.replay"):
+            if chemin and os.path.exists(chemin) and os.path.getsize(chemin) > 0:
+                return True
+        return False
+
+    def replay(self):
+        """
+        Réinjecte le spool dans la table trace, par lots, en ignorant les traces
+        déjà présentes (trace_uuid). Un seul rejeu à la fois, tous processus
+        confondus ; le spool est renommé pour que les nouveaux ajouts aillent
+        dans un fichier neuf.
+
+        Returns:
+            int: Nombre de traces restant à rejouer (après un échec d'écriture)
+        """
+        replay_path = f"{self.path}.replay"
+        verrou_path = f"{self.path}.lock"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(verrou_path, 'a') as verrou:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(verrou, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Rejeu en cours dans un autre processus
+                    return 0
+            try:
+                # Un rejeu interrompu est repris avant le spool courant
+                if not os.path.exists(replay_path):
+                    if not os.path.exists(self.path):
+                        return 0
+                    with self._lock:
+                        spool = self._ouvrir_verrouille()
+                        try:
+                            os.replace(self.path, replay_path)
+                        finally:
+                            if fcntl is not None:
+                                fcntl.flock(spool, fcntl.LOCK_UN)
+                            spool.close()
+                return self._rejouer(replay_path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(verrou, fcntl.LOCK_UN)
+
+    def _rejouer(self, replay_path):
+        from app.common.services.trace_writer_service import trace_writer
+        enregistrements = self._lire(replay_path)
+        while True:
+            lot = list(islice(enregistrements, self.batch_size))
+            if not lot:
+                break
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        uuids = [row['trace_uuid'] for row in lot if row.get('trace_uuid')]
+                        existants = set(connection.execute(
+                            select(Trace.__table__.c.trace_uuid).where(Trace.__table__.c.trace_uuid.in_(uuids))
+                        ).scalars()) if uuids else set()
+                        nouveaux = []
+                        for row in lot:
+                            if row.get('trace_uuid') in existants:
+                                continue
+                            if row.get('trace_uuid'):
+                                existants.add(row['trace_uuid'])
+                            nouveaux.append(row)
+                        if nouveaux:
+                            trace_writer.write_rows(connection, nouveaux)
+                self.replayed += len(nouveaux)
+                self.duplicates += len(lot) - len(nouveaux)
+            except Exception as e:
+                # Base toujours indisponible : le reste retourne au spool
+                self.app.logger.error(f"Erreur lors du rejeu de {len(lot)} trace(s) du spool: {str(e)}")
+                self.record_failure()
+                restant = lot + list(enregistrements)
+                if self.append(restant):
+                    os.remove(replay_path)
+                return len(restant)
+        os.remove(replay_path)
+        return 0
+
+    def _lire(self, chemin):
+        """Lit les enregistrements d'un fichier de spool (s'arrête à un enregistrement tronqué ou corrompu)"""
+        with open(chemin, 'rb') as spool:
+            while True:
+                entete = spool.read(_ENTETE.size)
+                if not entete:
+                    return
+                if len(entete) < _ENTETE.size:
+                    self.corrupted += 1
+                    return
+                longueur, crc = _ENTETE.unpack(entete)
+                contenu = spool.read(longueur)
+                if len(contenu) < longueur or zlib.crc32(contenu) != crc:
+                    self.corrupted += 1
+                    self.app.logger.error(f"Enregistrement tronqué ou corrompu dans le spool des traces: {chemin}")
+                    return
+                row = json.loads(contenu)
+                # Traces écrites avant l'ajout de la colonne route : mêmes clés pour tout le lot inséré
+                row.setdefault('route', None)
+                if row.get('date'):
+                    row['date'] = datetime.fromisoformat(row['date'])
+                yield row
+
+
+def _serialiser(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type {type(obj)} non sérialisable")
+
+
+trace_spool = TraceSpool()
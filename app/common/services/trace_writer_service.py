@@ -0,0 +1,243 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from sqlalchemy import insert
+from app.common.models import db, Trace
+from app.common.services.trace_spool_service import trace_spool
+
+# Modes de contre-pression quand la file est pleine
+BACKPRESSURE_MODES = ('drop', 'block', 'spill')
+
+# Marqueur d'arrêt déposé dans la file
+_ARRET = object()
+
+
+class TraceWriter:
+    """
+    Écriture asynchrone et groupée des traces.
+
+    TraceService.ajouter_trace dépose les traces dans une file bornée, propre au
+    processus ; un thread d'écriture les insère en base par lots (executemany)
+    dès que TRACE_BATCH_SIZE traces sont en attente ou que TRACE_FLUSH_INTERVAL_MS
+    s'est écoulé. Quand la file est pleine, le mode TRACE_BACKPRESSURE décide :
+    'drop' abandonne la trace, 'block' attend une place (au plus
+    TRACE_BLOCK_TIMEOUT_MS), 'spill' l'écrit dans le spool local (trace_spool).
+    Un lot dont l'écriture échoue, ou écrit pendant que le disjoncteur du spool
+    est ouvert, va lui aussi au spool, rejoué quand la base répond de nouveau.
+    La file est vidée à l'arrêt du processus (atexit).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.batches = 0
+        # Fonctions appelées périodiquement par le thread, retournant des traces à écrire
+        self._periodiques = []
+        # Fonctions appelées dans la transaction de chaque lot inséré : callback(connection, rows)
+        self._ecouteurs_lot = []
+        # Autres tables écrites par le thread : [(table, collect(force) -> rows)]
+        self._tables = []
+
+    def init_app(self, app):
+        """Lit la configuration et enregistre la vidange de la file à l'arrêt"""
+        self.app = app
+        self.maxsize = app.config.get('TRACE_QUEUE_MAXSIZE', 10000)
+        self.batch_size = max(app.config.get('TRACE_BATCH_SIZE', 200), 1)
+        self.flush_interval = app.config.get('TRACE_FLUSH_INTERVAL_MS', 500) / 1000
+        self.block_timeout = app.config.get('TRACE_BLOCK_TIMEOUT_MS', 1000) / 1000
+        self.backpressure = app.config.get('TRACE_BACKPRESSURE', 'drop')
+        if self.backpressure not in BACKPRESSURE_MODES:
+            raise ValueError(
+                f"TRACE_BACKPRESSURE invalide: {self.backpressure} (valeurs possibles: {', '.join(BACKPRESSURE_MODES)})"
+            )
+        atexit.register(self.stop)
+
+    def add_periodic(self, callback):
+        """
+        Enregistre une fonction appelée par le thread d'écriture à chaque intervalle
+        (callback(force=False)) et à l'arrêt (callback(force=True)) ; elle retourne
+        une liste de traces à écrire.
+        """
+        if callback not in self._periodiques:
+            self._periodiques.append(callback)
+
+    def add_table_collector(self, table, collect):
+        """
+        Enregistre une table écrite par le thread à chaque intervalle et à l'arrêt :
+        collect(force) retourne les lignes à insérer (dans leur propre transaction,
+        abandonnées en cas d'échec). Le collecteur démarre le thread au besoin
+        (ensure_started).
+        """
+        if all(existant is not collect for _, existant in self._tables):
+            self._tables.append((table, collect))
+
+    def _flush_tables(self, force=False):
+        for table, collect in self._tables:
+            try:
+                rows = collect(force)
+                if not rows:
+                    continue
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(insert(table), rows)
+            except Exception as e:
+                self.app.logger.error(f"Erreur lors de l'écriture des lignes de {table.name}: {str(e)}")
+
+    def add_batch_listener(self, callback):
+        """
+        Enregistre une fonction appelée avec (connection, rows) dans la transaction
+        de chaque lot de traces inséré (agrégats tenus à jour avec les traces).
+        """
+        if callback not in self._ecouteurs_lot:
+            self._ecouteurs_lot.append(callback)
+
+    def notify_batch(self, connection, rows):
+        """Appelle les écouteurs de lot pour des traces insérées hors du thread (écriture synchrone)"""
+        for callback in self._ecouteurs_lot:
+            callback(connection, rows)
+
+    def write_rows(self, connection, rows):
+        """Insère des traces (executemany) et notifie les écouteurs, dans la transaction de connection"""
+        connection.execute(insert(Trace.__table__), rows)
+        self.notify_batch(connection, rows)
+
+    def _collect_periodic(self, force=False):
+        rows = []
+        for callback in self._periodiques:
+            try:
+                rows.extend(callback(force=force))
+            except Exception as e:
+                self.app.logger.error(f"Erreur lors de la collecte périodique des traces: {str(e)}")
+        return rows
+
+    def ensure_started(self):
+        """Démarre le thread d'écriture de ce processus s'il ne tourne pas"""
+        # Le thread ne survit pas à un fork (workers gunicorn) : un par processus
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._thread = threading.Thread(target=self._run, name='trace-writer', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, row):
+        """
+        Dépose une trace (dict des colonnes de Trace) dans la file.
+
+        Returns:
+            bool: True si la trace sera écrite (en base ou via le fichier de débordement)
+        """
+        self.ensure_started()
+        try:
+            if self.backpressure == 'block':
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            if self.backpressure == 'spill':
+                return self._spool([row])
+            self.dropped += 1
+            return False
+
+    def stop(self, timeout=10):
+        """Vide la file puis arrête le thread d'écriture"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_ARRET, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(timeout)
+
+    def _run(self):
+        batch = []
+        deadline = None
+        dernier_tick = time.monotonic()
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                row = self._queue.get(timeout=timeout if timeout is not None else self.flush_interval)
+            except queue.Empty:
+                row = None
+
+            if row is _ARRET:
+                self._drain(batch)
+                return
+            if row is not None:
+                batch.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if (self._periodiques or self._tables) and time.monotonic() - dernier_tick >= self.flush_interval:
+                dernier_tick = time.monotonic()
+                rows = self._collect_periodic()
+                if rows:
+                    batch.extend(rows)
+                    if deadline is None:
+                        deadline = time.monotonic()
+                self._flush_tables()
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+
+    def _drain(self, batch):
+        """Écrit le lot en cours et tout ce qui reste dans la file"""
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _ARRET:
+                batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._flush(batch)
+                batch = []
+        batch.extend(self._collect_periodic(force=True))
+        if batch:
+            self._flush(batch)
+        self._flush_tables(force=True)
+
+    def _flush(self, batch):
+        # Base en échec ou lente récemment : directement au spool
+        if trace_spool.circuit_open():
+            self._spool(batch)
+            return
+        debut = time.monotonic()
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    self.write_rows(connection, batch)
+            self.written += len(batch)
+            self.batches += 1
+            trace_spool.record_latency(time.monotonic() - debut)
+        except Exception as e:
+            self.app.logger.error(f"Erreur lors de l'écriture d'un lot de {len(batch)} traces: {str(e)}")
+            trace_spool.record_failure()
+            self._spool(batch)
+
+    def _spool(self, rows):
+        """Écrit des traces dans le spool local, rejoué quand la base répond de nouveau"""
+        if trace_spool.append(rows):
+            self.spilled += len(rows)
+            return True
+        self.dropped += len(rows)
+        return False
+
+
+trace_writer = TraceWriter()
@@ -0,0 +1,47 @@
+import math
+from hashlib import blake2b
+
+
+class BloomFilter:
+    """
+    Filtre de Bloom : test d'appartenance probabiliste en mémoire.
+
+    `x in filtre` vaut toujours True pour un élément ajouté ; pour un élément
+    absent, il vaut False sauf faux positif (probabilité ~ taux_faux_positifs
+    tant que le nombre d'éléments reste inférieur à la capacité).
+    """
+
+    def __init__(self, capacite, taux_faux_positifs=0.001):
+        capacite = max(int(capacite), 1)
+        # Taille optimale du tableau de bits et nombre de fonctions de hachage
+        self.nb_bits = max(int(-capacite * math.log(taux_faux_positifs) / (math.log(2) ** 2)), 64)
+        self.nb_hachages = max(int(round(self.nb_bits / capacite * math.log(2))), 1)
+        self.capacite = capacite
+        self.nb_elements = 0
+        self._bits = bytearray((self.nb_bits + 7) // 8)
+
+    def _hachages(self, element):
+        # Double hachage (Kirsch-Mitzenmacher) à partir d'un seul condensé de 128 bits
+        digest = int.from_bytes(blake2b(element.encode(), digest_size=16).digest(), 'little')
+        return digest & 0xFFFFFFFFFFFFFFFF, (digest >> 64) | 1
+
+    def add(self, element):
+        """Ajoute un élément (chaîne) au filtre"""
+        h1, h2 = self._hachages(element)
+        bits, nb_bits = self._bits, self.nb_bits
+        for i in range(self.nb_hachages):
+            position = (h1 + i * h2) % nb_bits
+            bits[position >> 3] |= 1 << (position & 7)
+        self.nb_elements += 1
+
+    def __contains__(self, element):
+        h1, h2 = self._hachages(element)
+        bits, nb_bits = self._bits, self.nb_bits
+        for i in range(self.nb_hachages):
+            position = (h1 + i * h2) % nb_bits
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.nb_elements
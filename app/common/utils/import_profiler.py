@@ -0,0 +1,89 @@
+import sys
+import time
+
+
+class ImportProfiler:
+    """
+    Mesure la durée d'exécution des modules importés pendant un bloc.
+
+    Un chercheur placé en tête de sys.meta_path enveloppe le chargeur de chaque
+    module importé pour la première fois : durée cumulée (imports imbriqués
+    compris) et durée propre (hors imports imbriqués). Les modules déjà chargés
+    ne coûtent rien et n'apparaissent pas.
+
+        with ImportProfiler() as profiler:
+            import_module('app.common.routes.trace')
+        profiler.top(10)  # [(module, cumulé ms, propre ms)]
+    """
+
+    def __init__(self):
+        self.resultats = {}
+        self._pile = []
+        self._finder = _Chronometre(self)
+
+    def __enter__(self):
+        sys.meta_path.insert(0, self._finder)
+        return self
+
+    def __exit__(self, *exc):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def _entrer(self, nom):
+        self._pile.append([nom, time.perf_counter(), 0.0])
+
+    def _sortir(self, nom):
+        nom, debut, enfants = self._pile.pop()
+        cumule = time.perf_counter() - debut
+        if self._pile:
+            self._pile[-1][2] += cumule
+        self.resultats[nom] = (cumule * 1000, (cumule - enfants) * 1000)
+
+    def top(self, n=None, par='propre'):
+        """Modules les plus coûteux : [(module, cumulé ms, propre ms)] triés par durée propre ou cumulée"""
+        indice = 1 if par == 'propre' else 0
+        lignes = sorted(self.resultats.items(), key=lambda item: -item[1][indice])
+        return [(nom, cumule, propre) for nom, (cumule, propre) in lignes[:n]]
+
+
+class _Chronometre:
+    """Chercheur de sys.meta_path : délègue aux autres chercheurs et enveloppe le chargeur trouvé"""
+
+    def __init__(self, profiler):
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _ChargeurChronometre(spec.loader, fullname, self._profiler)
+                return spec
+        return None
+
+
+class _ChargeurChronometre:
+    """Chargeur enveloppé : chronomètre exec_module puis rend au module son chargeur d'origine"""
+
+    def __init__(self, loader, nom, profiler):
+        self._loader = loader
+        self._nom = nom
+        self._profiler = profiler
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        module.__loader__ = self._loader
+        if getattr(module, '__spec__', None) is not None:
+            module.__spec__.loader = self._loader
+        self._profiler._entrer(self._nom)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._sortir(self._nom)
+
+    def __getattr__(self, attribut):
+        return getattr(self._loader, attribut)
@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, func, or_, select, text
+
+# Sens de lecture portés par le curseur
+SUIVANT = 'n'
+PRECEDENT = 'p'
+
+
+class InvalidCursorError(ValueError):
+    """Curseur de pagination illisible ou falsifié"""
+
+
+def encode_cursor(date, id_, sens=SUIVANT):
+    """Encode une position (date, id) et un sens de lecture en jeton opaque"""
+    brut = json.dumps({'d': date.isoformat(), 'i': id_, 's': sens}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(brut.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Décode un jeton produit par encode_cursor.
+
+    Returns:
+        tuple: (date, id, sens)
+
+    Raises:
+        InvalidCursorError: Jeton invalide
+    """
+    try:
+        brut = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position = json.loads(brut)
+        sens = position.get('s', SUIVANT)
+        if sens not in (SUIVANT, PRECEDENT):
+            raise ValueError(sens)
+        return datetime.fromisoformat(position['d']), int(position['i']), sens
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise InvalidCursorError(f"Curseur invalide: {cursor}") from e
+
+
+class KeysetPage:
+    """Page d'une pagination par curseur"""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None, total_approximatif=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_approximatif = total_approximatif
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def paginate_keyset(query, date_column, id_column, per_page, cursor=None):
+    """
+    Pagination par curseur sur (date, id) décroissants.
+
+    Chaque page est lue par l'index composite (date, id) à partir de la
+    position du curseur, sans OFFSET ni COUNT : son coût ne dépend pas de la
+    profondeur de la page.
+
+    Args:
+        query: Requête ORM (Model.query filtré, sans order_by)
+        date_column, id_column: Colonnes de tri
+        per_page (int): Taille de la page
+        cursor (str, optional): next_cursor ou prev_cursor d'une page précédente
+
+    Returns:
+        KeysetPage
+    """
+    sens = SUIVANT
+    if cursor:
+        date, id_, sens = decode_cursor(cursor)
+        if sens == SUIVANT:
+            query = query.filter(or_(date_column < date, and_(date_column == date, id_column < id_)))
+        else:
+            query = query.filter(or_(date_column > date, and_(date_column == date, id_column > id_)))
+
+    if sens == SUIVANT:
+        rows = query.order_by(date_column.desc(), id_column.desc()).limit(per_page + 1).all()
+        encore = len(rows) > per_page
+        items = rows[:per_page]
+        a_suivre, a_preceder = encore, cursor is not None
+    else:
+        # Page précédente : lecture en ordre croissant depuis le curseur, puis inversion
+        rows = query.order_by(date_column.asc(), id_column.asc()).limit(per_page + 1).all()
+        encore = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        a_suivre, a_preceder = True, encore
+
+    next_cursor = prev_cursor = None
+    if items and a_suivre:
+        dernier = items[-1]
+        next_cursor = encode_cursor(getattr(dernier, date_column.key), getattr(dernier, id_column.key), SUIVANT)
+    if items and a_preceder:
+        premier = items[0]
+        prev_cursor = encode_cursor(getattr(premier, date_column.key), getattr(premier, id_column.key), PRECEDENT)
+    return KeysetPage(items, per_page, next_cursor, prev_cursor)
+
+
+def estimate_count(session, table):
+    """
+    Nombre approximatif de lignes d'une table, lu dans les statistiques du
+    moteur (PostgreSQL, MySQL) ; COUNT(*) exact pour les autres moteurs.
+
+    Returns:
+        tuple: (nombre, approximatif)
+    """
+    dialecte = session.get_bind().dialect.name
+    if dialecte == 'postgresql':
+        estimation = session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {'table': table.name}
+        ).scalar()
+        if estimation is not None and estimation >= 0:
+            return int(estimation), True
+    elif dialecte in ('mysql', 'mariadb'):
+        estimation = session.execute(
+            text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                 "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"),
+            {'table': table.name}
+        ).scalar()
+        if estimation is not None:
+            return int(estimation), True
+    return session.execute(select(func.count()).select_from(table)).scalar(), False
@@ -0,0 +1,40 @@
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Fonctions appelées après chaque instruction SQL : f(statement, parameters, executemany, duree_s)
+_abonnes = []
+_ecoute = False
+
+
+def on_sql_executed(callback):
+    """
+    Abonne une fonction à la durée de chaque instruction SQL exécutée.
+
+    Une seule paire d'événements Engine (before/after_cursor_execute) chronomètre
+    les instructions pour tous les abonnés (diagnostic SQL, mesures par requête).
+    Le début est porté par le contexte d'exécution de l'instruction : une
+    instruction en échec n'a pas d'after_cursor_execute et ne laisse rien en
+    attente sur la connexion.
+    """
+    global _ecoute
+    if callback not in _abonnes:
+        _abonnes.append(callback)
+    if not _ecoute:
+        event.listen(Engine, 'before_cursor_execute', _avant_execution)
+        event.listen(Engine, 'after_cursor_execute', _apres_execution)
+        _ecoute = True
+
+
+def _avant_execution(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._sql_debut = time.perf_counter()
+
+
+def _apres_execution(conn, cursor, statement, parameters, context, executemany):
+    debut = getattr(context, '_sql_debut', None)
+    if debut is None:
+        return
+    duree_s = time.perf_counter() - debut
+    for abonne in _abonnes:
+        abonne(statement, parameters, executemany, duree_s)
@@ -5,6 +5,30 @@ from dotenv import load_dotenv
 # Charger les variables d'environnement depuis le fichier .env
 load_dotenv()
 
+def engine_options(pool_size, max_overflow, pool_timeout=30, pool_recycle=1800, pool_pre_ping=True):
+    """
+    Options de l'engine SQLAlchemy (pool de connexions), surchargeables par les variables
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE et DB_POOL_PRE_PING.
+    Les tailles s'entendent par processus : chaque worker gunicorn a son propre pool.
+    """
+    return {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', pool_timeout)),
+        # Connexions recyclées avant le wait_timeout du serveur MySQL
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', pool_recycle)),
+        # Connexion vérifiée à l'emprunt (coupures réseau, redémarrage de la base)
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', str(pool_pre_ping)) == 'True'
+    }
+
+def replica_binds():
+    """
+    Réplicas en lecture de DB_REPLICA_URLS (URLs séparées par des virgules), déclarés
+    dans SQLALCHEMY_BINDS sous les clés replica_1, replica_2, ...
+    """
+    urls = [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()]
+    return {f"replica_{numero}": url for numero, url in enumerate(urls, start=1)}
+
 class Config:
     """Configuration de base de l'application"""
     
@@ -18,6 +42,32 @@ class Config:
     # Configuration de la base de données
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Création des tables manquantes (db.create_all) au démarrage ; en production le schéma est géré
+    # par les migrations, dont la révision est contrôlée (DB_CHECK_MIGRATIONS, résultat en cache
+    # SCHEMA_CHECK_TTL_S secondes) ; DB_REQUIRE_MIGRATIONS_HEAD bloque le démarrage du serveur sur une base en retard
+    DB_CREATE_ALL = os.getenv('DB_CREATE_ALL', 'True') == 'True'
+    DB_CHECK_MIGRATIONS = os.getenv('DB_CHECK_MIGRATIONS', 'False') == 'True'
+    DB_REQUIRE_MIGRATIONS_HEAD = os.getenv('DB_REQUIRE_MIGRATIONS_HEAD', 'False') == 'True'
+    SCHEMA_CHECK_TTL_S = int(os.getenv('SCHEMA_CHECK_TTL_S', 86400))
+    
+    # Réplicas en lecture : les SELECT des requêtes GET y sont envoyés à tour de rôle ; un réplica
+    # en retard de plus de DB_REPLICA_MAX_LAG_S (contrôlé toutes les DB_REPLICA_CHECK_INTERVAL_S
+    # secondes, par DB_REPLICA_LAG_QUERY si fournie) est écarté ; un utilisateur lit la base
+    # principale pendant DB_READ_YOUR_WRITES_S après l'une de ses écritures
+    SQLALCHEMY_BINDS = replica_binds()
+    DB_READ_REPLICAS_ENABLED = os.getenv('DB_READ_REPLICAS_ENABLED', 'True') == 'True'
+    DB_REPLICA_MAX_LAG_S = float(os.getenv('DB_REPLICA_MAX_LAG_S', 5))
+    DB_REPLICA_CHECK_INTERVAL_S = float(os.getenv('DB_REPLICA_CHECK_INTERVAL_S', 5))
+    DB_REPLICA_LAG_QUERY = os.getenv('DB_REPLICA_LAG_QUERY', '')
+    DB_READ_YOUR_WRITES_S = float(os.getenv('DB_READ_YOUR_WRITES_S', 10))
+    
+    # Chargement des blueprints : eager (au démarrage), lazy (à la première requête) ou auto
+    # (lazy pour les commandes flask, qui n'importent alors aucun module de routes) ;
+    # au-delà de BLUEPRINTS_IMPORT_BUDGET_MS d'import (0 = sans budget), les plus lents sont journalisés ;
+    # STARTUP_IMPORT_PROFILE mesure chaque module importé (flask startup-profile --imports)
+    BLUEPRINTS_LOADING = os.getenv('BLUEPRINTS_LOADING', 'auto')
+    BLUEPRINTS_IMPORT_BUDGET_MS = int(os.getenv('BLUEPRINTS_IMPORT_BUDGET_MS', 0))
+    STARTUP_IMPORT_PROFILE = os.getenv('STARTUP_IMPORT_PROFILE', 'False') == 'True'
     
     # Configuration JWT
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
@@ -39,21 +89,122 @@ class Config:
     SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'False') == 'True'
     SESSION_COOKIE_HTTPONLY = os.getenv('SESSION_COOKIE_HTTPONLY', 'True') == 'True'
     SESSION_COOKIE_SAMESITE = os.getenv('SESSION_COOKIE_SAMESITE', 'Lax')
+    
+    # Matrice de permissions compilée en mémoire (vérifications sans SQL sur cache chaud)
+    PERMISSION_MATRIX_ENABLED = os.getenv('PERMISSION_MATRIX_ENABLED', 'True') == 'True'
+    
+    # Synchronisation des fonctions API déclarées (auto_register) au démarrage
+    RBAC_SYNC_ON_STARTUP = os.getenv('RBAC_SYNC_ON_STARTUP', 'True') == 'True'
+    
+    # Autorisation depuis les claims JWT (profil, id_utilisateur) contrôlés par l'époque de sécurité,
+    # sans relire l'utilisateur en base ; durée de validité (s) des époques gardées en mémoire
+    JWT_CLAIMS_AUTH_ENABLED = os.getenv('JWT_CLAIMS_AUTH_ENABLED', 'True') == 'True'
+    SECURITY_EPOCH_TTL = int(os.getenv('SECURITY_EPOCH_TTL', 30))
+    
+    # Révocation des tokens (logout) : liste de blocage des jti derrière un filtre de Bloom,
+    # rechargé toutes les TOKEN_BLOCKLIST_REFRESH_SECONDS, entrées expirées purgées toutes les TOKEN_BLOCKLIST_PRUNE_SECONDS
+    TOKEN_BLOCKLIST_ENABLED = os.getenv('TOKEN_BLOCKLIST_ENABLED', 'True') == 'True'
+    TOKEN_BLOCKLIST_REFRESH_SECONDS = int(os.getenv('TOKEN_BLOCKLIST_REFRESH_SECONDS', 30))
+    TOKEN_BLOCKLIST_PRUNE_SECONDS = int(os.getenv('TOKEN_BLOCKLIST_PRUNE_SECONDS', 3600))
+    
+    # Invalidation des caches en mémoire entre workers : table cache_version relue
+    # au plus une fois par CACHE_VERSION_POLL_INTERVAL_MS et par processus
+    CACHE_VERSION_ENABLED = os.getenv('CACHE_VERSION_ENABLED', 'True') == 'True'
+    CACHE_VERSION_POLL_INTERVAL_MS = int(os.getenv('CACHE_VERSION_POLL_INTERVAL_MS', 1000))
+    
+    # Écriture asynchrone des traces : file bornée vidée par lots par un thread d'écriture.
+    # Contre-pression quand la file est pleine : drop (abandon), block (attente) ou spill (spool local)
+    TRACE_ASYNC_ENABLED = os.getenv('TRACE_ASYNC_ENABLED', 'True') == 'True'
+    TRACE_QUEUE_MAXSIZE = int(os.getenv('TRACE_QUEUE_MAXSIZE', 10000))
+    TRACE_BATCH_SIZE = int(os.getenv('TRACE_BATCH_SIZE', 200))
+    TRACE_FLUSH_INTERVAL_MS = int(os.getenv('TRACE_FLUSH_INTERVAL_MS', 500))
+    TRACE_BLOCK_TIMEOUT_MS = int(os.getenv('TRACE_BLOCK_TIMEOUT_MS', 1000))
+    TRACE_BACKPRESSURE = os.getenv('TRACE_BACKPRESSURE', 'drop')
+    
+    # Spool local des traces (instance/traces.spool) : utilisé quand l'écriture en base échoue ou dépasse
+    # TRACE_SPOOL_LATENCY_BUDGET_MS (base contournée pendant TRACE_SPOOL_COOLDOWN_S), rejoué toutes les
+    # TRACE_SPOOL_REPLAY_INTERVAL_S secondes ; TRACE_SPOOL_FSYNC force l'écriture sur disque à chaque ajout
+    TRACE_SPOOL_LATENCY_BUDGET_MS = int(os.getenv('TRACE_SPOOL_LATENCY_BUDGET_MS', 200))
+    TRACE_SPOOL_COOLDOWN_S = int(os.getenv('TRACE_SPOOL_COOLDOWN_S', 30))
+    TRACE_SPOOL_REPLAY_INTERVAL_S = int(os.getenv('TRACE_SPOOL_REPLAY_INTERVAL_S', 10))
+    TRACE_SPOOL_FSYNC = os.getenv('TRACE_SPOOL_FSYNC', 'False') == 'True'
+    
+    # Politiques de trace des lectures : JSON {"action_type:code_prefix:methode:classe_statut": décision}
+    # avec décision keep, sample:<taux> ou aggregate ('*' pour tout segment), complétées par les
+    # codifications de paramètre TRACE_POLICY (libellé = clé, valeur par défaut = décision)
+    TRACE_POLICIES = os.getenv('TRACE_POLICIES', '{}')
+    TRACE_DEFAULT_POLICY = os.getenv('TRACE_DEFAULT_POLICY', 'keep')
+    TRACE_POLICY_CODIFICATION = os.getenv('TRACE_POLICY_CODIFICATION', 'True') == 'True'
+    TRACE_AGGREGATE_WINDOW_S = int(os.getenv('TRACE_AGGREGATE_WINDOW_S', 60))
+    
+    # Archivage des traces (flask traces archive) : traces de plus de TRACE_RETENTION_DAYS jours
+    # déplacées par lots dans des segments NDJSON gzip journaliers (instance/trace_archive par défaut)
+    TRACE_ARCHIVE_DIR = os.getenv('TRACE_ARCHIVE_DIR', '')
+    TRACE_RETENTION_DAYS = int(os.getenv('TRACE_RETENTION_DAYS', 90))
+    TRACE_ARCHIVE_BATCH_SIZE = int(os.getenv('TRACE_ARCHIVE_BATCH_SIZE', 5000))
+    
+    # Recherche des traces par index plein texte (FTS5 sous SQLite, FULLTEXT sous MySQL), ilike sinon
+    TRACE_SEARCH_FULLTEXT = os.getenv('TRACE_SEARCH_FULLTEXT', 'True') == 'True'
+    
+    # Export des traces en flux (GET /api/traces/export) : traces lues et émises par morceaux
+    TRACE_EXPORT_CHUNK_SIZE = int(os.getenv('TRACE_EXPORT_CHUNK_SIZE', 1000))
+    
+    # Agrégats horaires des traces (trace_rollup) tenus à jour à chaque écriture de traces
+    TRACE_ROLLUP_ENABLED = os.getenv('TRACE_ROLLUP_ENABLED', 'True') == 'True'
+    
+    # Mesures par requête (durée, temps et nombre de requêtes SQL, taille) dans request_metrics,
+    # enregistrées pour une fraction REQUEST_METRICS_SAMPLE_RATE des requêtes, hors chemins
+    # REQUEST_METRICS_EXCLUDED_PATHS (préfixes) ; purgées après REQUEST_METRICS_RETENTION_DAYS jours
+    # par flask traces archive (0 = conservées)
+    REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'True') == 'True'
+    REQUEST_METRICS_SAMPLE_RATE = float(os.getenv('REQUEST_METRICS_SAMPLE_RATE', 0.1))
+    REQUEST_METRICS_EXCLUDED_PATHS = os.getenv('REQUEST_METRICS_EXCLUDED_PATHS', '/metrics,/api/health')
+    REQUEST_METRICS_RETENTION_DAYS = int(os.getenv('REQUEST_METRICS_RETENTION_DAYS', 30))
+    
+    # Métriques Prometheus sur /metrics (si prometheus_client est installé), protégées par un
+    # jeton Bearer si PROMETHEUS_METRICS_TOKEN est renseigné ; avec PROMETHEUS_REQUIRE_TOKEN, /metrics
+    # n'est pas exposé sans jeton. Sous gunicorn, PROMETHEUS_MULTIPROC_DIR (positionné par
+    # gunicorn.conf.py) agrège les séries de tous les workers
+    PROMETHEUS_ENABLED = os.getenv('PROMETHEUS_ENABLED', 'True') == 'True'
+    PROMETHEUS_METRICS_TOKEN = os.getenv('PROMETHEUS_METRICS_TOKEN', '')
+    PROMETHEUS_REQUIRE_TOKEN = os.getenv('PROMETHEUS_REQUIRE_TOKEN', 'False') == 'True'
+    
+    # Diagnostic SQL : requêtes plus lentes que SQL_SLOW_QUERY_MS journalisées, N+1 signalé à partir de
+    # SQL_N_PLUS_ONE_THRESHOLD exécutions d'un même SELECT par requête HTTP, budgets de requêtes par
+    # endpoint (JSON {"endpoint": n}, 0 = sans budget) ; SQL_DIAGNOSTICS_STRICT lève une erreur au dépassement
+    SQL_DIAGNOSTICS_ENABLED = os.getenv('SQL_DIAGNOSTICS_ENABLED', 'True') == 'True'
+    SQL_SLOW_QUERY_MS = int(os.getenv('SQL_SLOW_QUERY_MS', 500))
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 10))
+    SQL_QUERY_BUDGETS = os.getenv('SQL_QUERY_BUDGETS', '{}')
+    SQL_QUERY_BUDGET_DEFAULT = int(os.getenv('SQL_QUERY_BUDGET_DEFAULT', 0))
+    SQL_DIAGNOSTICS_STRICT = os.getenv('SQL_DIAGNOSTICS_STRICT', 'False') == 'True'
 
 class DevelopmentConfig(Config):
     """Configuration pour le développement"""
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = True
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=5)
 
 class TestingConfig(Config):
     """Configuration pour les tests"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL_TEST', 'sqlite:///test.db')
+    # Petit pool et attente courte : un test qui garde des connexions échoue vite
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=2, pool_timeout=5)
+    # Les tests échouent sur un N+1 ou un budget de requêtes dépassé
+    SQL_DIAGNOSTICS_STRICT = os.getenv('SQL_DIAGNOSTICS_STRICT', 'True') == 'True'
     
 class ProductionConfig(Config):
     """Configuration pour la production"""
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL_PROD')
+    DB_CREATE_ALL = os.getenv('DB_CREATE_ALL', 'False') == 'True'
+    DB_CHECK_MIGRATIONS = os.getenv('DB_CHECK_MIGRATIONS', 'True') == 'True'
+    # Par worker gunicorn (synchrone : une requête à la fois, plus le thread d'écriture des traces
+    # et le rejeu du spool) ; workers x (pool_size + max_overflow) doit rester sous max_connections
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=10, pool_timeout=10, pool_recycle=1800)
+    # /metrics n'est jamais exposé sans authentification en production
+    PROMETHEUS_REQUIRE_TOKEN = os.getenv('PROMETHEUS_REQUIRE_TOKEN', 'True') == 'True'
     DEBUG = False
     TESTING = False
 
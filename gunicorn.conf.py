@@ -0,0 +1,48 @@
+# Configuration gunicorn : gunicorn run:app (fichier chargé automatiquement depuis la racine du projet)
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}")
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+# Application chargée une fois par le master avant le fork : les modules (routes, services, schémas)
+# sont partagés par les workers en copie sur écriture au lieu d'être importés par chacun
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Métriques Prometheus en mode multiprocessus : chaque worker écrit ses séries dans des
+# fichiers mmap de ce dossier, agrégés par /metrics quel que soit le worker interrogé.
+# Positionné avant le chargement de l'application (prometheus_client le lit à l'import).
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'gunicorn_prometheus'))
+# Créé dès maintenant : avec preload_app, le master crée ses séries avant on_starting
+os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+try:
+    # Importé après PROMETHEUS_MULTIPROC_DIR et non dans child_exit (appelé depuis le gestionnaire de SIGCHLD du master,
+    # un import à cet endroit peut être interrompu par la fin d'un autre worker)
+    from prometheus_client import multiprocess
+except ImportError:
+    multiprocess = None
+
+
+def on_starting(server):
+    """Repart d'un dossier de métriques vide (séries d'un lancement précédent et du préchargement)"""
+    dossier = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(dossier, ignore_errors=True)
+    os.makedirs(dossier, exist_ok=True)
+
+
+def post_fork(server, worker):
+    """Connexions ouvertes par le master (préchargement) : jamais réutilisées par les workers"""
+    if not server.cfg.preload_app:
+        return
+    from app import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Retire les jauges « live » d'un worker arrêté"""
+    if multiprocess is not None:
+        multiprocess.mark_process_dead(worker.pid)
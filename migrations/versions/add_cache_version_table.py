@@ -0,0 +1,36 @@
+"""Add cache_version table
+
+Revision ID: add_cache_version
+Revises: add_token_blocklist
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_cache_version'
+down_revision = 'add_token_blocklist'
+branch_labels = None
+depends_on = None
+
+DOMAINES = ('rbac', 'settings', 'codification', 'pages', 'blacklist', 'tokens')
+
+
+def upgrade():
+    cache_version = op.create_table('cache_version',
+    sa.Column('domaine', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('modifier_a', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('domaine')
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(cache_version, [
+        {'domaine': domaine, 'version': 0, 'modifier_a': now} for domaine in DOMAINES
+    ])
+
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,97 @@
+"""Add indexes on the RBAC, settings, blacklist and demande lookup paths
+
+Revision ID: add_hot_path_indexes
+Revises: add_request_metrics
+Create Date: 2026-10-17 00:00:00.000000
+
+Les recherches de trace par date et par (id_utilisateur, date) sont déjà
+couvertes par ix_trace_date_id et ix_trace_utilisateur_date_id
+(add_trace_keyset_indexes) : aucun index supplémentaire sur trace.
+
+Les associations en double ne sont pas supprimées : la migration s'arrête en
+listant leurs clés (voir flask dedupe).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_hot_path_indexes'
+down_revision = 'add_request_metrics'
+branch_labels = None
+depends_on = None
+
+
+# Associations rendues uniques : (table, clé primaire, contrainte, colonnes)
+UNIQUES = (
+    ('utilisateur_role', 'ur_id', 'uq_utilisateur_role_utilisateur_app_role', ['id_utilisateur', 'app_id', 'role_id']),
+    ('role_permission', 'rp_id', 'uq_role_permission_role_permission', ['role_id', 'permission_id']),
+    ('fonction_permission', 'fp_id', 'uq_fonction_permission_fonction_permission', ['fonction_id', 'permission_id']),
+    ('settings', 'id_set', 'uq_settings_utilisateur_codification', ['id_utilisateur', 'id_codification']),
+)
+
+# Index simples : (table, index, colonnes)
+INDEX = (
+    ('fonction_api', 'ix_fonction_api_nom_app', ['nom_fonction', 'app_id']),
+    ('black_list', 'ix_black_list_numero', ['numero']),
+    ('demande', 'ix_demande_statut', ['statut']),
+)
+
+
+# Nombre de clés en double citées par table dans le message d'erreur
+DOUBLONS_AFFICHES = 10
+
+
+def doublons():
+    """Clés des associations en double, par table : rien n'est supprimé par la migration"""
+    connection = op.get_bind()
+    trouves = {}
+    for table, cle, contrainte, colonnes in UNIQUES:
+        groupe = ', '.join(colonnes)
+        lignes = connection.execute(sa.text(
+            f"SELECT {groupe}, COUNT({cle}) AS nombre FROM {table} GROUP BY {groupe} HAVING COUNT({cle}) > 1"
+        )).all()
+        if lignes:
+            trouves[table] = (colonnes, lignes)
+    return trouves
+
+
+def upgrade():
+    trouves = doublons()
+    if trouves:
+        details = []
+        for table, (colonnes, lignes) in trouves.items():
+            cles = '; '.join(
+                ', '.join(f"{colonne}={valeur}" for colonne, valeur in zip(colonnes, ligne[:-1])) + f" ({ligne[-1]} lignes)"
+                for ligne in lignes[:DOUBLONS_AFFICHES]
+            )
+            suite = f" ... (+{len(lignes) - DOUBLONS_AFFICHES})" if len(lignes) > DOUBLONS_AFFICHES else ''
+            details.append(f"{table} : {cles}{suite}")
+        raise RuntimeError(
+            "Doublons incompatibles avec les contraintes d'unicité, à résoudre avant la migration "
+            "(flask dedupe pour le rapport, flask dedupe --apply pour les supprimer) :\n" + '\n'.join(details)
+        )
+
+    for table, cle, contrainte, colonnes in UNIQUES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_unique_constraint(contrainte, colonnes)
+
+    for table, index, colonnes in INDEX:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(index, colonnes, unique=False)
+
+
+def downgrade():
+    for table, index, colonnes in reversed(INDEX):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(index)
+
+    mysql = op.get_bind().dialect.name in ('mysql', 'mariadb')
+    for table, cle, contrainte, colonnes in reversed(UNIQUES):
+        if mysql:
+            # InnoDB a pu retirer l'index implicite de la clé étrangère de la première colonne,
+            # remplacé par la contrainte : le recréer avant de supprimer celle-ci
+            op.create_index(f"ix_{table}_{colonnes[0]}", table, [colonnes[0]], unique=False)
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_constraint(contrainte, type_='unique')
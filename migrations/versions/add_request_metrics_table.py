@@ -0,0 +1,47 @@
+"""Add request_metrics table
+
+Revision ID: add_request_metrics
+Revises: add_trace_uuid
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_request_metrics'
+down_revision = 'add_trace_uuid'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('request_metrics',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(), nullable=False),
+    sa.Column('methode', sa.String(length=10), nullable=False),
+    sa.Column('blueprint', sa.String(length=100), nullable=True),
+    sa.Column('endpoint', sa.String(length=200), nullable=True),
+    sa.Column('nom_fonction', sa.String(length=100), nullable=True),
+    sa.Column('statut', sa.Integer(), nullable=False),
+    sa.Column('duree_ms', sa.Float(), nullable=False),
+    sa.Column('db_ms', sa.Float(), nullable=False),
+    sa.Column('requetes', sa.Integer(), nullable=False),
+    sa.Column('taille', sa.Integer(), nullable=True),
+    sa.Column('id_utilisateur', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('request_metrics', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_request_metrics_date'), ['date'], unique=False)
+        batch_op.create_index('ix_request_metrics_blueprint_date', ['blueprint', 'date'], unique=False)
+        batch_op.create_index('ix_request_metrics_fonction_date', ['nom_fonction', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('request_metrics', schema=None) as batch_op:
+        batch_op.drop_index('ix_request_metrics_fonction_date')
+        batch_op.drop_index('ix_request_metrics_blueprint_date')
+        batch_op.drop_index(batch_op.f('ix_request_metrics_date'))
+
+    op.drop_table('request_metrics')
@@ -0,0 +1,40 @@
+"""Add security_epoch field to Utilisateur model
+
+Revision ID: add_security_epoch
+Revises: add_ordre_page
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.engine import reflection
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_security_epoch'
+down_revision = 'add_ordre_page'
+branch_labels = None
+depends_on = None
+
+
+def column_exists(table_name, column_name):
+    """Vérifie si une colonne existe dans une table"""
+    inspector = reflection.Inspector.from_engine(op.get_bind())
+    if inspector.has_table(table_name):
+        columns = [c['name'] for c in inspector.get_columns(table_name)]
+        return column_name in columns
+    return False
+
+
+def upgrade():
+    # Ajouter la colonne security_epoch à la table utilisateur si elle n'existe pas déjà
+    if not column_exists('utilisateur', 'security_epoch'):
+        with op.batch_alter_table('utilisateur', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('security_epoch', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    # Retirer la colonne security_epoch de la table utilisateur
+    if column_exists('utilisateur', 'security_epoch'):
+        with op.batch_alter_table('utilisateur', schema=None) as batch_op:
+            batch_op.drop_column('security_epoch')
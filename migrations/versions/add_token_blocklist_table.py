@@ -0,0 +1,40 @@
+"""Add token_blocklist table
+
+Revision ID: add_token_blocklist
+Revises: add_security_epoch
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_token_blocklist'
+down_revision = 'add_security_epoch'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('token_blocklist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('jti', sa.String(length=36), nullable=False),
+    sa.Column('type_token', sa.String(length=16), nullable=False),
+    sa.Column('id_utilisateur', sa.Integer(), nullable=True),
+    sa.Column('expire_a', sa.DateTime(), nullable=False),
+    sa.Column('creer_a', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['id_utilisateur'], ['utilisateur.id_utilisateur'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('token_blocklist', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_token_blocklist_jti'), ['jti'], unique=True)
+        batch_op.create_index(batch_op.f('ix_token_blocklist_expire_a'), ['expire_a'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('token_blocklist', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_token_blocklist_expire_a'))
+        batch_op.drop_index(batch_op.f('ix_token_blocklist_jti'))
+
+    op.drop_table('token_blocklist')
@@ -0,0 +1,75 @@
+"""Add full-text search index on trace
+
+Revision ID: add_trace_fulltext_index
+Revises: add_trace_keyset_indexes
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_trace_fulltext_index'
+down_revision = 'add_trace_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+# DDL figé à cette révision (indépendant de trace_search_service)
+# Table FTS5 à contenu externe (la table trace) et déclencheurs qui la tiennent à jour
+FTS5_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS trace_fts USING fts5("
+    "action, detail, code, end_point, content='trace', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS trace_fts_ai AFTER INSERT ON trace BEGIN "
+    "INSERT INTO trace_fts(rowid, action, detail, code, end_point) "
+    "VALUES (new.id, new.action, new.detail, new.code, new.end_point); END",
+    "CREATE TRIGGER IF NOT EXISTS trace_fts_ad AFTER DELETE ON trace BEGIN "
+    "INSERT INTO trace_fts(trace_fts, rowid, action, detail, code, end_point) "
+    "VALUES ('delete', old.id, old.action, old.detail, old.code, old.end_point); END",
+    "CREATE TRIGGER IF NOT EXISTS trace_fts_au AFTER UPDATE ON trace BEGIN "
+    "INSERT INTO trace_fts(trace_fts, rowid, action, detail, code, end_point) "
+    "VALUES ('delete', old.id, old.action, old.detail, old.code, old.end_point); "
+    "INSERT INTO trace_fts(rowid, action, detail, code, end_point) "
+    "VALUES (new.id, new.action, new.detail, new.code, new.end_point); END",
+    # Indexation des traces existantes
+    "INSERT INTO trace_fts(trace_fts) VALUES ('rebuild')",
+)
+
+FTS5_DROP = (
+    "DROP TRIGGER IF EXISTS trace_fts_ai",
+    "DROP TRIGGER IF EXISTS trace_fts_ad",
+    "DROP TRIGGER IF EXISTS trace_fts_au",
+    "DROP TABLE IF EXISTS trace_fts",
+)
+
+
+def fulltext_existant(connection):
+    return connection.execute(sa.text(
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() "
+        "AND TABLE_NAME = 'trace' AND INDEX_NAME = 'ft_trace_search' LIMIT 1"
+    )).first() is not None
+
+
+def upgrade():
+    # FTS5 + déclencheurs sous SQLite, index FULLTEXT sous MySQL, rien pour les autres moteurs
+    connection = op.get_bind()
+    dialecte = connection.dialect.name
+    if dialecte == 'sqlite':
+        for instruction in FTS5_DDL:
+            connection.exec_driver_sql(instruction)
+    elif dialecte in ('mysql', 'mariadb') and not fulltext_existant(connection):
+        connection.exec_driver_sql(
+            "CREATE FULLTEXT INDEX ft_trace_search ON trace (action, detail, code, end_point)"
+        )
+
+
+def downgrade():
+    connection = op.get_bind()
+    dialecte = connection.dialect.name
+    if dialecte == 'sqlite':
+        for instruction in FTS5_DROP:
+            connection.exec_driver_sql(instruction)
+    elif dialecte in ('mysql', 'mariadb') and fulltext_existant(connection):
+        connection.exec_driver_sql("ALTER TABLE trace DROP INDEX ft_trace_search")
@@ -0,0 +1,29 @@
+"""Add composite indexes for trace keyset pagination
+
+Revision ID: add_trace_keyset_indexes
+Revises: add_cache_version
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_trace_keyset_indexes'
+down_revision = 'add_cache_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trace', schema=None) as batch_op:
+        batch_op.create_index('ix_trace_date_id', ['date', 'id'], unique=False)
+        batch_op.create_index('ix_trace_utilisateur_date_id', ['id_utilisateur', 'date', 'id'], unique=False)
+        batch_op.create_index('ix_trace_action_date_id', ['action', 'date', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trace', schema=None) as batch_op:
+        batch_op.drop_index('ix_trace_action_date_id')
+        batch_op.drop_index('ix_trace_utilisateur_date_id')
+        batch_op.drop_index('ix_trace_date_id')
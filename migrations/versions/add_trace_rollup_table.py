@@ -0,0 +1,39 @@
+"""Add trace_rollup table
+
+Revision ID: add_trace_rollup
+Revises: add_trace_fulltext_index
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_trace_rollup'
+down_revision = 'add_trace_fulltext_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trace_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('heure', sa.DateTime(), nullable=False),
+    sa.Column('action', sa.String(length=100), nullable=False),
+    sa.Column('end_point', sa.String(length=400), nullable=False),
+    sa.Column('id_utilisateur', sa.Integer(), nullable=False),
+    sa.Column('nombre', sa.Integer(), nullable=False),
+    sa.Column('erreurs', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('heure', 'action', 'end_point', 'id_utilisateur', name='uq_trace_rollup_cle')
+    )
+    with op.batch_alter_table('trace_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_trace_rollup_utilisateur_heure', ['id_utilisateur', 'heure'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trace_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_trace_rollup_utilisateur_heure')
+
+    op.drop_table('trace_rollup')
@@ -0,0 +1,29 @@
+"""Add route to trace
+
+Revision ID: add_trace_route
+Revises: unique_fonction_api
+Create Date: 2026-10-17 00:00:00.000000
+
+Modèle de la route Flask de la requête tracée (/api/utilisateurs/<int:id>),
+clé des agrégats trace_rollup à la place du chemin (/api/utilisateurs/123).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_trace_route'
+down_revision = 'unique_fonction_api'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trace', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('route', sa.String(length=400), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('trace', schema=None) as batch_op:
+        batch_op.drop_column('route')
@@ -0,0 +1,28 @@
+"""Add trace_uuid to trace
+
+Revision ID: add_trace_uuid
+Revises: add_trace_rollup
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_trace_uuid'
+down_revision = 'add_trace_rollup'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trace', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('trace_uuid', sa.String(length=36), nullable=True))
+        batch_op.create_index(batch_op.f('ix_trace_trace_uuid'), ['trace_uuid'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('trace', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_trace_trace_uuid'))
+        batch_op.drop_column('trace_uuid')
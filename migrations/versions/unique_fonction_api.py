@@ -0,0 +1,45 @@
+"""Make fonction_api (nom_fonction, app_id) unique
+
+Revision ID: unique_fonction_api
+Revises: add_hot_path_indexes
+Create Date: 2026-10-17 00:00:00.000000
+
+La synchronisation des fonctions API au démarrage de chaque worker compte sur
+cette contrainte pour ne pas créer deux fois la même fonction. Elle remplace
+l'index ix_fonction_api_nom_app. Les doublons existants ne sont pas supprimés :
+la migration s'arrête en listant leurs clés (voir flask dedupe).
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'unique_fonction_api'
+down_revision = 'add_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    doublons = op.get_bind().execute(sa.text(
+        "SELECT nom_fonction, app_id, COUNT(fonction_id) AS nombre FROM fonction_api "
+        "GROUP BY nom_fonction, app_id HAVING COUNT(fonction_id) > 1"
+    )).all()
+    if doublons:
+        cles = '; '.join(f"nom_fonction={nom}, app_id={app_id} ({nombre} lignes)" for nom, app_id, nombre in doublons[:10])
+        suite = f" ... (+{len(doublons) - 10})" if len(doublons) > 10 else ''
+        raise RuntimeError(
+            "Fonctions API en double, à fusionner avant la migration "
+            f"(flask dedupe --table fonction_api [--apply]) : {cles}{suite}"
+        )
+
+    with op.batch_alter_table('fonction_api', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_fonction_api_nom_app', ['nom_fonction', 'app_id'])
+        batch_op.drop_index('ix_fonction_api_nom_app')
+
+
+def downgrade():
+    with op.batch_alter_table('fonction_api', schema=None) as batch_op:
+        batch_op.create_index('ix_fonction_api_nom_app', ['nom_fonction', 'app_id'], unique=False)
+        batch_op.drop_constraint('uq_fonction_api_nom_app', type_='unique')
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la vérification des permissions des fonctions API.
+
+Compare, sur une base SQLite remplie de données synthétiques, la méthode
+historique Utilisateur.has_permission_for_fonction (quatre requêtes) et
+Utilisateur.has_permission_for_fonction_single_query (une requête), avec les
+index déclarés par les modèles (migration add_hot_path_indexes).
+
+Usage :
+    python scripts/bench_permission_check.py --users 1000 10000 100000 --checks 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NB_APPLICATIONS = 5
+NB_ROLES_PAR_APP = 10
+NB_PERMISSIONS = 200
+NB_FONCTIONS_PAR_APP = 100
+
+
+def seed(db, nb_users, rng):
+    """Remplit la base avec nb_users utilisateurs et un graphe RBAC réaliste"""
+    from app.common.models import (
+        Application, Entite, Utilisateur, Role, Permission, RolePermission,
+        UtilisateurRole, FonctionAPI, FonctionPermission
+    )
+    now = datetime.utcnow()
+    audit = {'creer_par': 1, 'modifier_par': 1, 'creer_a': now, 'modifier_a': now}
+
+    def bulk(model, rows):
+        if rows:
+            db.session.execute(model.__table__.insert(), rows)
+
+    bulk(Entite, [{'id': 1, 'nom': 'Entite', 'code': 'ENT', 'email': 'ent@example.com', **audit}])
+    bulk(Application, [
+        {'app_id': app_id, 'nom': f'App {app_id}', 'description': '-', 'app_color': '#000', **audit}
+        for app_id in range(1, NB_APPLICATIONS + 1)
+    ])
+    bulk(Permission, [
+        {'permission_id': pid, 'nom': f'perm_{pid}', 'description': '-', **audit}
+        for pid in range(1, NB_PERMISSIONS + 1)
+    ])
+
+    roles, role_permissions, fonctions, fonction_permissions = [], [], [], []
+    role_id = fonction_id = 0
+    roles_par_app = {}
+    for app_id in range(1, NB_APPLICATIONS + 1):
+        for _ in range(NB_ROLES_PAR_APP):
+            role_id += 1
+            roles.append({'role_id': role_id, 'nom': f'role_{role_id}', 'description': '-', 'app_id': app_id, **audit})
+            roles_par_app.setdefault(app_id, []).append(role_id)
+            for pid in rng.sample(range(1, NB_PERMISSIONS + 1), 15):
+                role_permissions.append({'role_id': role_id, 'permission_id': pid, **audit})
+        for index in range(NB_FONCTIONS_PAR_APP):
+            fonction_id += 1
+            fonctions.append({'fonction_id': fonction_id, 'nom_fonction': f'fonction_{index}', 'description': '-', 'app_id': app_id, **audit})
+            # Environ 10 % des fonctions n'ont aucune permission (accès libre)
+            if rng.random() >= 0.1:
+                for pid in rng.sample(range(1, NB_PERMISSIONS + 1), rng.randint(1, 3)):
+                    fonction_permissions.append({'fonction_id': fonction_id, 'permission_id': pid, **audit})
+    bulk(Role, roles)
+    bulk(RolePermission, role_permissions)
+    bulk(FonctionAPI, fonctions)
+    bulk(FonctionPermission, fonction_permissions)
+
+    batch_size = 10000
+    for start in range(1, nb_users + 1, batch_size):
+        users, user_roles = [], []
+        for uid in range(start, min(start + batch_size, nb_users + 1)):
+            users.append({
+                'id_utilisateur': uid, 'nom': 'Nom', 'prenom': 'Prenom', 'login': f'user{uid}',
+                'email': f'user{uid}@example.com', 'statut': 'Actif', 'profil': 'Utilisateur',
+                'id_entite': 1, **audit
+            })
+            for app_id in rng.sample(range(1, NB_APPLICATIONS + 1), 2):
+                user_roles.append({
+                    'id_utilisateur': uid, 'role_id': rng.choice(roles_par_app[app_id]),
+                    'app_id': app_id, **audit
+                })
+        bulk(Utilisateur, users)
+        bulk(UtilisateurRole, user_roles)
+    db.session.commit()
+
+
+def run(nb_users, nb_checks, seed_value):
+    from sqlalchemy import event
+    from app import create_app, db
+    from app.config import TestingConfig
+    from app.common.models import Utilisateur
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench_perm_'), 'bench.db')
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        SECRET_KEY = 'bench'
+        # Fonctions API créées par le remplissage (identifiants fixes), pas par les routes
+        RBAC_SYNC_ON_STARTUP = False
+
+    app = create_app(BenchConfig)
+    rng = random.Random(seed_value)
+    with app.app_context():
+        started = time.perf_counter()
+        seed(db, nb_users, rng)
+        seed_time = time.perf_counter() - started
+
+        statements = [0]
+
+        def count_statement(*args):
+            statements[0] += 1
+
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+
+        users = [db.session.get(Utilisateur, rng.randint(1, nb_users)) for _ in range(min(nb_checks, 500))]
+        checks = [
+            (rng.choice(users), rng.randint(1, NB_APPLICATIONS), f'fonction_{rng.randrange(NB_FONCTIONS_PAR_APP)}')
+            for _ in range(nb_checks)
+        ]
+
+        results = {}
+        for label, method in (
+            ('4 requêtes', Utilisateur.has_permission_for_fonction),
+            ('1 requête', Utilisateur.has_permission_for_fonction_single_query),
+        ):
+            statements[0] = 0
+            decisions = []
+            started = time.perf_counter()
+            for user, app_id, nom_fonction in checks:
+                decisions.append(method(user, app_id, nom_fonction))
+            elapsed = time.perf_counter() - started
+            results[label] = (elapsed, statements[0], decisions)
+
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    legacy, single = results['4 requêtes'], results['1 requête']
+    print(f"\n{nb_users} utilisateurs ({nb_checks} vérifications, remplissage {seed_time:.1f} s)")
+    for label, (elapsed, nb_statements, _) in results.items():
+        print(f"  {label:<11} {elapsed / nb_checks * 1e6:9.1f} µs/vérif  {nb_statements / nb_checks:4.2f} requêtes/vérif")
+    print(f"  gain       x{legacy[0] / single[0]:.2f}")
+    if legacy[2] != single[2]:
+        print("  ATTENTION : les deux méthodes divergent sur certaines décisions")
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--checks', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    ok = all([run(nb_users, args.checks, args.seed) for nb_users in args.users])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
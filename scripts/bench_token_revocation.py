@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la vérification de révocation des tokens JWT.
+
+Mesure, sur une base SQLite contenant N jti révoqués, le coût par token de
+TokenBlocklistService.is_revoked (filtre de Bloom en mémoire devant la table
+token_blocklist) comparé à une requête directe sur la table, ainsi que le taux
+de faux positifs observé du filtre.
+
+Usage :
+    python scripts/bench_token_revocation.py --revoked 1000 100000 --checks 20000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seuil attendu pour un token non révoqué (cas courant)
+SEUIL_US = 5.0
+
+
+def run(nb_revoked, nb_checks):
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.config import TestingConfig
+    from app.common.models import TokenBlocklist
+    from app.common.services.token_blocklist_service import TokenBlocklistService
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench_tokens_'), 'bench.db')
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_path}'
+        SECRET_KEY = 'bench'
+        RBAC_SYNC_ON_STARTUP = False
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        expire_a = datetime.utcnow() + timedelta(days=1)
+        revoked = [str(uuid.uuid4()) for _ in range(nb_revoked)]
+        db.session.execute(TokenBlocklist.__table__.insert(), [
+            {'jti': jti, 'type_token': 'access', 'expire_a': expire_a, 'creer_a': datetime.utcnow()}
+            for jti in revoked
+        ])
+        db.session.commit()
+
+        service = TokenBlocklistService()
+        started = time.perf_counter()
+        service.refresh()
+        refresh_time = time.perf_counter() - started
+
+        valid = [str(uuid.uuid4()) for _ in range(nb_checks)]
+
+        started = time.perf_counter()
+        decisions = [service.is_revoked(jti) for jti in valid]
+        bloom_time = (time.perf_counter() - started) / nb_checks
+        faux_positifs = service.verifications_base
+
+        started = time.perf_counter()
+        for jti in valid[:min(nb_checks, 2000)]:
+            db.session.execute(select(TokenBlocklist.id).where(TokenBlocklist.jti == jti)).first()
+        db_time = (time.perf_counter() - started) / min(nb_checks, 2000)
+
+        sample = revoked[:min(nb_revoked, 2000)]
+        started = time.perf_counter()
+        revoked_ok = all(service.is_revoked(jti) for jti in sample)
+        revoked_time = (time.perf_counter() - started) / len(sample)
+
+    print(f"\n{nb_revoked} jti révoqués ({nb_checks} vérifications, chargement du filtre {refresh_time * 1e3:.1f} ms)")
+    print(f"  token valide, filtre de Bloom   {bloom_time * 1e6:8.2f} µs/vérif  (faux positifs : {faux_positifs})")
+    print(f"  token valide, requête directe   {db_time * 1e6:8.2f} µs/vérif")
+    print(f"  token révoqué (filtre + base)   {revoked_time * 1e6:8.2f} µs/vérif")
+
+    ok = revoked_ok and not any(decisions)
+    if not ok:
+        print("  ATTENTION : décision de révocation incorrecte")
+    if bloom_time * 1e6 > SEUIL_US:
+        print(f"  ATTENTION : surcoût supérieur à {SEUIL_US} µs pour un token valide")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--revoked', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--checks', type=int, default=20000)
+    args = parser.parse_args()
+
+    ok = all([run(nb_revoked, args.checks) for nb_revoked in args.revoked])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
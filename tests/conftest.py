@@ -0,0 +1,166 @@
+import itertools
+import pytest
+from flask_jwt_extended import create_access_token
+from app import create_app, db
+from app.config import TestingConfig
+from app.common.models import (
+    Application, CacheVersion, Entite, FonctionAPI, FonctionPermission, Permission, Role, RolePermission,
+    Utilisateur, UtilisateurRole
+)
+from app.common.services.cache_version_service import DOMAINES, cache_versions
+
+_compteur = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    dossier = tmp_path_factory.mktemp('instance')
+    url = f"sqlite:///{dossier / 'test.db'}"
+
+    class Config(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = url
+        # Réplicas en lecture sur la même base : le routage est actif sans changer les données lues
+        SQLALCHEMY_BINDS = {'replica_a': url, 'replica_b': url}
+        SECRET_KEY = 'tests'
+        BLUEPRINTS_LOADING = 'eager'
+        RBAC_SYNC_ON_STARTUP = False
+        # Traces écrites dans la requête : visibles dès la réponse
+        TRACE_ASYNC_ENABLED = False
+        CACHE_VERSION_POLL_INTERVAL_MS = 0
+        TRACE_ARCHIVE_DIR = str(dossier / 'trace_archive')
+
+    application = create_app(Config)
+    with application.app_context():
+        # Tables des modèles importés par les blueprints (après le create_all du démarrage)
+        db.create_all()
+    from app.common.services.trace_spool_service import trace_spool
+    trace_spool.path = str(dossier / 'traces.spool')
+    return application
+
+
+@pytest.fixture(autouse=True)
+def base_propre(app):
+    """Chaque test part de tables vides (hors versions de cache) et d'une session neuve"""
+    with app.app_context():
+        yield
+        db.session.remove()
+        with db.engine.begin() as connection:
+            for table in reversed(db.metadata.sorted_tables):
+                if table.name != CacheVersion.__tablename__:
+                    connection.execute(table.delete())
+        # Caches en mémoire du processus : comme après une écriture de tous les domaines
+        cache_versions.notify_local(DOMAINES)
+        # Versions relues : les écritures du test ne seront pas prises pour celles d'un autre worker
+        cache_versions.poll(0)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def utilisateur(app):
+    """Crée un utilisateur actif (avec son entité)"""
+    def creer(**champs):
+        numero = next(_compteur)
+        entite = Entite(nom='Entité', code='E', email='entite@test', creer_par=1, modifier_par=1)
+        db.session.add(entite)
+        db.session.flush()
+        valeurs = dict(
+            nom='Nom', prenom='Prénom', login=f"user{numero}", email=f"user{numero}@test",
+            statut='Actif', profil='USER', creer_par=1, modifier_par=1, id_entite=entite.id
+        )
+        valeurs.update(champs)
+        utilisateur = Utilisateur(**valeurs)
+        db.session.add(utilisateur)
+        db.session.commit()
+        return utilisateur
+    return creer
+
+
+@pytest.fixture
+def token():
+    """Token d'accès portant les claims émis par AuthService.authenticate_user"""
+    def creer(utilisateur):
+        return create_access_token(identity=utilisateur.login, additional_claims={
+            'profil': utilisateur.profil,
+            'id_utilisateur': utilisateur.id_utilisateur,
+            'id_entite': utilisateur.id_entite,
+            'sec_epoch': utilisateur.security_epoch or 0
+        })
+    return creer
+
+
+@pytest.fixture
+def grille_rbac(utilisateur):
+    """
+    Rôles, permissions et fonctions de deux applications, et des utilisateurs
+    couvrant chaque cas (sans rôle, rôle sans permission, rôles cumulés).
+
+    Returns:
+        dict: {'apps', 'fonctions', 'utilisateurs', 'roles', 'permissions'} (objets par nom)
+    """
+    audit = dict(creer_par=1, modifier_par=1)
+    # app1 porte l'app_id 1 des routes du socle (api_fonction(app_id=1))
+    apps = {
+        nom: Application(app_id=app_id, nom=nom, description=nom, app_color='#000', **audit)
+        for app_id, nom in ((1, 'app1'), (2, 'app2'))
+    }
+    db.session.add_all(apps.values())
+    db.session.flush()
+
+    permissions = {nom: Permission(nom=nom, description=nom, **audit) for nom in ('lire', 'ecrire', 'publier', 'auditer')}
+    db.session.add_all(permissions.values())
+    roles = {
+        'lecteur': Role(nom='lecteur', description='', app_id=apps['app1'].app_id, **audit),
+        'editeur': Role(nom='editeur', description='', app_id=apps['app1'].app_id, **audit),
+        'vide': Role(nom='vide', description='', app_id=apps['app1'].app_id, **audit),
+        'lecteur_app2': Role(nom='lecteur_app2', description='', app_id=apps['app2'].app_id, **audit),
+    }
+    db.session.add_all(roles.values())
+    db.session.flush()
+    for role, noms in (('lecteur', ['lire']), ('editeur', ['ecrire', 'publier']), ('lecteur_app2', ['lire'])):
+        db.session.add_all([
+            RolePermission(role_id=roles[role].role_id, permission_id=permissions[nom].permission_id, **audit)
+            for nom in noms
+        ])
+
+    # (application, fonction) -> permissions requises ; aucune : accessible à tout rôle de l'application
+    requises = {
+        ('app1', 'get_lire'): ['lire'],
+        ('app1', 'post_ecrire'): ['ecrire'],
+        ('app1', 'post_publier'): ['ecrire', 'publier'],
+        ('app1', 'get_publique'): [],
+        ('app1', 'get_audit'): ['auditer'],
+        ('app2', 'get_lire'): ['lire'],
+        ('app2', 'post_ecrire'): ['ecrire'],
+    }
+    fonctions = {}
+    for (app, nom), noms in requises.items():
+        fonction = FonctionAPI(nom_fonction=nom, description=nom, app_id=apps[app].app_id, **audit)
+        db.session.add(fonction)
+        db.session.flush()
+        db.session.add_all([
+            FonctionPermission(fonction_id=fonction.fonction_id, permission_id=permissions[p].permission_id, **audit)
+            for p in noms
+        ])
+        fonctions[(app, nom)] = fonction
+    db.session.commit()
+
+    utilisateurs = {}
+    for nom, roles_utilisateur in (
+        ('sans_role', []), ('lecteur', ['lecteur']), ('editeur', ['editeur']), ('vide', ['vide']),
+        ('cumul', ['lecteur', 'editeur', 'lecteur_app2']),
+    ):
+        compte = utilisateur()
+        db.session.add_all([
+            UtilisateurRole(id_utilisateur=compte.id_utilisateur, role_id=roles[role].role_id,
+                            app_id=roles[role].app_id, **audit)
+            for role in roles_utilisateur
+        ])
+        utilisateurs[nom] = compte
+    db.session.commit()
+
+    return {'apps': apps, 'fonctions': fonctions, 'utilisateurs': utilisateurs, 'roles': roles,
+            'permissions': permissions}
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from app import db
+from app.common.models import CacheVersion, Role
+from app.common.services.cache_version_service import cache_versions
+from app.common.services.page_navigation_service import navigation_cache
+from app.common.services.permission_matrix_service import permission_matrix
+from app.common.services.security_epoch_service import security_epochs
+from app.common.services.token_blocklist_service import token_blocklist
+
+
+def version(domaine):
+    return db.session.get(CacheVersion, domaine).version
+
+
+def test_ecriture_validee_incremente_la_version_et_invalide_localement():
+    avant = version('rbac')
+    generation = permission_matrix._generation
+
+    db.session.add(Role(nom='Lecteur', description='Lecture', app_id=1, creer_par=1, modifier_par=1))
+    db.session.commit()
+
+    assert version('rbac') == avant + 1
+    assert permission_matrix._generation == generation + 1
+
+
+def test_ecriture_annulee_n_invalide_rien():
+    avant = version('rbac')
+    generation = permission_matrix._generation
+
+    db.session.add(Role(nom='Annulé', description='Rollback', app_id=1, creer_par=1, modifier_par=1))
+    db.session.flush()
+    db.session.rollback()
+
+    assert version('rbac') == avant
+    assert permission_matrix._generation == generation
+
+
+def test_poll_invalide_les_domaines_modifies_par_un_autre_worker():
+    cache_versions.poll(0)
+    generation = permission_matrix._generation
+
+    # Écriture d'un autre worker : seule la table cache_version change
+    table = CacheVersion.__table__
+    with db.engine.begin() as connection:
+        connection.execute(
+            table.update().where(table.c.domaine == 'rbac').values(version=table.c.version + 1)
+        )
+
+    assert cache_versions.poll(0) == ['rbac']
+    assert permission_matrix._generation == generation + 1
+    # Versions déjà vues : rien à invalider
+    assert cache_versions.poll(0) == []
+
+
+def test_revocation_d_un_token_ne_vide_pas_les_caches_par_utilisateur(utilisateur):
+    user = utilisateur()
+    security_epochs.get(user.id_utilisateur)
+    navigation = navigation_cache.generation()
+    tokens, revocations = version('tokens'), version('revocations')
+
+    token_blocklist.revoke('jti-logout', datetime.utcnow() + timedelta(hours=1), user.id_utilisateur)
+
+    assert (version('tokens'), version('revocations')) == (tokens, revocations + 1)
+    assert user.id_utilisateur in security_epochs._entries
+    assert navigation_cache.generation() == navigation
@@ -0,0 +1,50 @@
+import re
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import db
+from app.common.services.request_metrics_service import request_metrics
+from app.common.services.security_epoch_service import security_epochs
+
+SELECT_UTILISATEUR = re.compile(r'^\s*SELECT\b.*\bFROM utilisateur\b', re.IGNORECASE | re.DOTALL)
+
+
+@pytest.fixture
+def selects_utilisateur():
+    """Liste des SELECT sur la table utilisateur exécutés pendant le test"""
+    requetes = []
+
+    def compter(conn, cursor, statement, parameters, context, executemany):
+        if SELECT_UTILISATEUR.match(statement):
+            requetes.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', compter)
+    yield requetes
+    event.remove(db.engine, 'before_cursor_execute', compter)
+
+
+def test_utilisateur_charge_une_fois_par_requete(client, utilisateur, selects_utilisateur, monkeypatch):
+    # Mesure de la requête enregistrée : relit l'utilisateur après le commit de la trace
+    monkeypatch.setattr(request_metrics, 'sample_rate', 1.0)
+    compte = utilisateur()
+    # Token sans époque de sécurité : trace_action et la route résolvent l'utilisateur en base
+    entete = {'Authorization': f"Bearer {create_access_token(identity=compte.login)}"}
+    selects_utilisateur.clear()
+
+    reponse = client.get('/api/applications/mes-apps', headers=entete)
+
+    assert reponse.status_code == 200
+    assert len(selects_utilisateur) == 1
+
+
+def test_identite_des_claims_sans_requete_supplementaire(client, utilisateur, token, selects_utilisateur):
+    compte = utilisateur()
+    entete = {'Authorization': f"Bearer {token(compte)}"}
+    # Époque déjà en mémoire : trace_action lit l'identité dans les claims
+    security_epochs.get(compte.id_utilisateur)
+    selects_utilisateur.clear()
+
+    reponse = client.get('/api/applications/mes-apps', headers=entete)
+
+    # Seule la route charge l'utilisateur complet (get_current_utilisateur)
+    assert reponse.status_code == 200
+    assert len(selects_utilisateur) == 1
@@ -0,0 +1,88 @@
+from unittest import mock
+import pytest
+from app import db
+from app.common.models import Trace
+from app.common.services.db_routing_service import db_router, read_only
+
+
+@pytest.fixture(autouse=True)
+def replicas_a_controler():
+    """Réplicas disponibles, contrôlés à la première lecture de chaque test"""
+    for replica in db_router._replicas:
+        replica.verifie_a = 0.0
+        replica.disponible = True
+        replica.erreur = None
+    yield
+    db_router._ecrivains.clear()
+    for replica in db_router._replicas:
+        replica.verifie_a = 0.0
+        replica.disponible = True
+
+
+def lectures_replicas():
+    return sum(replica['lectures'] for replica in db_router.status()['replicas'])
+
+
+def test_lecture_read_only_servie_par_un_replica():
+    assert db_router.enabled
+    avant = lectures_replicas()
+
+    with read_only():
+        assert Trace.query.count() == 0
+        assert db.session.info['db_replica'].startswith('replica')
+
+    assert lectures_replicas() == avant + 1
+    # Fin de transaction : le réplica est choisi à nouveau à la lecture suivante
+    db.session.rollback()
+    assert 'db_replica' not in db.session.info
+
+
+def test_hors_read_only_lecture_sur_la_base_principale():
+    avant = lectures_replicas()
+    Trace.query.count()
+
+    assert 'db_replica' not in db.session.info
+    assert lectures_replicas() == avant
+
+
+@pytest.mark.parametrize('retard', [lambda engine: 60.0, mock.Mock(side_effect=OSError('injoignable'))])
+def test_replica_en_retard_ou_injoignable_ecarte(retard):
+    avant = db_router.lectures_principales
+
+    with mock.patch.object(db_router, '_retard', retard), read_only():
+        Trace.query.count()
+
+    assert 'db_replica' not in db.session.info
+    assert db_router.lectures_principales == avant + 1
+    replicas = db_router.status()['replicas']
+    assert not any(replica['disponible'] for replica in replicas)
+    if isinstance(retard, mock.Mock):
+        assert all(replica['erreur'] == 'injoignable' for replica in replicas)
+    else:
+        assert all(replica['retard_s'] == 60.0 for replica in replicas)
+
+
+def test_apres_une_ecriture_la_session_reste_sur_la_base_principale():
+    db.session.add(Trace(action='ECRITURE'))
+    db.session.flush()
+
+    with read_only():
+        assert Trace.query.count() == 1
+    assert 'db_replica' not in db.session.info
+
+
+def test_lecture_de_ses_ecritures(client, utilisateur, token):
+    compte = utilisateur()
+    entete = {'Authorization': f"Bearer {token(compte)}"}
+    # Session des requêtes neuve, comme pour chaque requête servie
+    db.session.remove()
+
+    avant = lectures_replicas()
+    assert client.get('/api/applications/mes-apps', headers=entete).status_code == 200
+    assert lectures_replicas() > avant
+
+    # Pendant la fenêtre qui suit une écriture, les lectures de l'utilisateur restent sur la base principale
+    db_router.record_write(compte.login)
+    avant = lectures_replicas()
+    assert client.get('/api/applications/mes-apps', headers=entete).status_code == 200
+    assert lectures_replicas() == avant
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+import pytest
+from app import db
+from app.common.models import Trace
+from app.common.utils.keyset_pagination import (
+    InvalidCursorError, decode_cursor, encode_cursor, paginate_keyset
+)
+
+
+@pytest.fixture
+def traces():
+    """25 traces dont plusieurs à la même date (départage par id)"""
+    debut = datetime(2026, 1, 1)
+    db.session.add_all([
+        Trace(date=debut + timedelta(minutes=numero // 3), action='LECTURE', detail=str(numero))
+        for numero in range(25)
+    ])
+    db.session.commit()
+    return Trace.query.order_by(Trace.date.desc(), Trace.id.desc()).all()
+
+
+def page(cursor=None, per_page=10):
+    return paginate_keyset(Trace.query, Trace.date, Trace.id, per_page, cursor)
+
+
+def test_parcours_complet_sans_doublon_ni_oubli(traces):
+    lues = []
+    courante = page()
+    assert not courante.has_prev
+    while True:
+        lues += courante.items
+        if not courante.has_next:
+            break
+        courante = page(courante.next_cursor)
+
+    assert [trace.id for trace in lues] == [trace.id for trace in traces]
+
+
+def test_page_precedente_rend_la_meme_page(traces):
+    premiere = page()
+    deuxieme = page(premiere.next_cursor)
+    retour = page(deuxieme.prev_cursor)
+
+    assert [trace.id for trace in retour.items] == [trace.id for trace in premiere.items]
+    assert not retour.has_prev
+    assert retour.has_next
+
+
+def test_trace_ajoutee_en_tete_ne_decale_pas_la_page_suivante(traces):
+    premiere = page()
+    db.session.add(Trace(date=datetime(2027, 1, 1), action='LECTURE'))
+    db.session.commit()
+
+    deuxieme = page(premiere.next_cursor)
+    assert [trace.id for trace in deuxieme.items] == [trace.id for trace in traces[10:20]]
+
+
+def test_curseur_aller_retour():
+    date = datetime(2026, 5, 4, 3, 2, 1, 123)
+    assert decode_cursor(encode_cursor(date, 42)) == (date, 42, 'n')
+
+
+@pytest.mark.parametrize('cursor', ['pas-un-curseur', encode_cursor(datetime(2026, 1, 1), 1)[:-4]])
+def test_curseur_invalide(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
@@ -0,0 +1,51 @@
+from sqlalchemy import delete
+from app import db
+from app.common.models import FonctionAPI, FonctionPermission, RolePermission
+from app.common.services.permission_matrix_service import permission_matrix
+
+
+def test_matrice_equivalente_a_has_permission_for_fonction(grille_rbac):
+    noms = {nom for _, nom in grille_rbac['fonctions']} | {'inconnue'}
+
+    for compte in grille_rbac['utilisateurs'].values():
+        for app in grille_rbac['apps'].values():
+            for nom in noms:
+                attendu = compte.has_permission_for_fonction(app.app_id, nom)
+                assert permission_matrix.is_allowed(compte.id_utilisateur, app.app_id, nom) == attendu, \
+                    (compte.login, app.nom, nom)
+
+
+def evaluer(client, entete, nom_fonction):
+    reponse = client.post('/api/permissions/evaluate', headers=entete, json={'fonctions': [nom_fonction], 'app_id': 1})
+    assert reponse.status_code == 200
+    return reponse.get_json()['data']['1'][nom_fonction]
+
+
+def test_ajout_et_suppression_en_masse_d_une_permission_invalident_la_matrice(client, token, grille_rbac):
+    # get_applications (GET /api/applications/, app 1) exige la permission 'publier'
+    audit = dict(creer_par=1, modifier_par=1)
+    fonction = FonctionAPI(nom_fonction='get_applications', description='', app_id=1, **audit)
+    db.session.add(fonction)
+    db.session.flush()
+    publier = grille_rbac['permissions']['publier'].permission_id
+    db.session.add(FonctionPermission(fonction_id=fonction.fonction_id, permission_id=publier, **audit))
+    db.session.commit()
+
+    lecteur = grille_rbac['utilisateurs']['lecteur']
+    role_id = grille_rbac['roles']['lecteur'].role_id
+    entete = {'Authorization': f"Bearer {token(lecteur)}"}
+    assert evaluer(client, entete, 'get_applications') is False
+    assert client.get('/api/applications/', headers=entete).status_code == 403
+
+    db.session.add(RolePermission(role_id=role_id, permission_id=publier, **audit))
+    db.session.commit()
+    assert evaluer(client, entete, 'get_applications') is True
+    assert client.get('/api/applications/', headers=entete).status_code == 200
+
+    # Suppression en masse : ne passe pas par le flush
+    db.session.execute(delete(RolePermission).where(
+        RolePermission.role_id == role_id, RolePermission.permission_id == publier
+    ))
+    db.session.commit()
+    assert evaluer(client, entete, 'get_applications') is False
+    assert client.get('/api/applications/', headers=entete).status_code == 403
@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.mark.parametrize('compte, application, nom_fonction, attendu', [
+    # Aucun rôle dans l'application
+    ('sans_role', 'app1', 'get_lire', False),
+    ('editeur', 'app2', 'get_lire', False),
+    # Fonction inconnue
+    ('lecteur', 'app1', 'inconnue', False),
+    # Fonction sans permission associée : accessible à tout rôle de l'application
+    ('vide', 'app1', 'get_publique', True),
+    # Permission accordée (l'une des permissions requises suffit)
+    ('lecteur', 'app1', 'get_lire', True),
+    ('editeur', 'app1', 'post_publier', True),
+    ('cumul', 'app2', 'get_lire', True),
+    # Permission non accordée
+    ('lecteur', 'app1', 'post_ecrire', False),
+    ('vide', 'app1', 'get_lire', False),
+    ('cumul', 'app1', 'get_audit', False),
+    ('cumul', 'app2', 'post_ecrire', False),
+])
+def test_requete_unique_equivalente(grille_rbac, compte, application, nom_fonction, attendu):
+    utilisateur = grille_rbac['utilisateurs'][compte]
+    app_id = grille_rbac['apps'][application].app_id
+
+    assert utilisateur.has_permission_for_fonction(app_id, nom_fonction) is attendu
+    assert utilisateur.has_permission_for_fonction_single_query(app_id, nom_fonction) is attendu
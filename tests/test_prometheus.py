@@ -0,0 +1,24 @@
+from flask import Flask
+from app.common.services.prometheus_service import PrometheusMetrics, prometheus_metrics
+
+
+def test_metrics_non_expose_sans_jeton_quand_il_est_exige():
+    application = Flask(__name__)
+    application.config.update(PROMETHEUS_ENABLED=True, PROMETHEUS_METRICS_TOKEN='', PROMETHEUS_REQUIRE_TOKEN=True)
+    metriques = PrometheusMetrics()
+
+    metriques.init_app(application)
+
+    assert not metriques.enabled
+    assert 'prometheus_metrics' not in application.view_functions
+    assert application.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_exige_le_jeton_configure(client):
+    assert prometheus_metrics.enabled
+    ancien, prometheus_metrics.token = prometheus_metrics.token, 'secret'
+    try:
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+    finally:
+        prometheus_metrics.token = ancien
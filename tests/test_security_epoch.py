@@ -0,0 +1,109 @@
+from sqlalchemy import update
+from app import db
+from app.common.models import Utilisateur, UtilisateurRole
+from app.common.services.security_epoch_service import security_epochs
+
+
+def entete(token):
+    return {'Authorization': f"Bearer {token}"}
+
+
+def test_token_valide_tant_que_l_epoque_ne_change_pas(client, utilisateur, token):
+    user = utilisateur()
+    jeton = token(user)
+
+    assert security_epochs.is_valid(user.id_utilisateur, 0)
+    assert client.get('/api/pages/me', headers=entete(jeton)).status_code == 200
+
+
+def test_modification_du_profil_revoque_les_tokens_emis(client, utilisateur, token):
+    user = utilisateur()
+    jeton = token(user)
+    assert security_epochs.is_valid(user.id_utilisateur, 0)
+
+    user.profil = 'ADMIN'
+    db.session.commit()
+
+    # Entrée en mémoire vidée au commit : la nouvelle époque est relue
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 1
+    assert not security_epochs.is_valid(user.id_utilisateur, 0)
+    assert security_epochs.is_valid(user.id_utilisateur, 1)
+
+    reponse = client.get('/api/pages/me', headers=entete(jeton))
+    assert reponse.status_code == 401
+    assert reponse.get_json()['error'] is True
+
+
+def test_compte_desactive_refuse_meme_a_la_bonne_epoque(utilisateur):
+    user = utilisateur()
+    Utilisateur.query.filter_by(id_utilisateur=user.id_utilisateur).update({'statut': 'Inactif'})
+    db.session.commit()
+
+    epoque = db.session.get(Utilisateur, user.id_utilisateur).security_epoch
+    assert epoque == 1
+    assert not security_epochs.is_valid(user.id_utilisateur, epoque)
+
+
+def test_attribution_d_un_role_incremente_l_epoque(utilisateur):
+    user = utilisateur()
+    db.session.add(UtilisateurRole(
+        id_utilisateur=user.id_utilisateur, app_id=1, role_id=1, creer_par=1, modifier_par=1
+    ))
+    db.session.commit()
+
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 1
+    assert not security_epochs.is_valid(user.id_utilisateur, 0)
+
+
+def test_attributs_sans_effet_sur_la_securite_ne_revoquent_pas(utilisateur):
+    user = utilisateur()
+    user.nom = 'Autre'
+    db.session.commit()
+
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 0
+    assert security_epochs.is_valid(user.id_utilisateur, 0)
+
+
+def test_mise_a_jour_en_masse_sans_attribut_de_securite(client, utilisateur, token):
+    user = utilisateur()
+    jeton = token(user)
+    db.session.execute(
+        update(Utilisateur).where(Utilisateur.id_utilisateur == user.id_utilisateur).values(email='autre@test')
+    )
+    db.session.commit()
+
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 0
+    assert client.get('/api/pages/me', headers=entete(jeton)).status_code == 200
+
+
+def test_mise_a_jour_en_masse_par_cle_primaire(utilisateur):
+    users = [utilisateur(), utilisateur()]
+    db.session.execute(update(Utilisateur), [
+        {'id_utilisateur': users[0].id_utilisateur, 'profil': 'ADMIN'},
+        {'id_utilisateur': users[1].id_utilisateur, 'nom': 'Autre'},
+    ])
+    db.session.commit()
+
+    epoques = [db.session.get(Utilisateur, user.id_utilisateur).security_epoch for user in users]
+    # Seules les lignes qui modifient un attribut de sécurité changent l'époque
+    assert epoques == [1, 0]
+    assert not security_epochs.is_valid(users[0].id_utilisateur, 0)
+
+
+def test_modification_d_un_role_attribue(utilisateur):
+    user, autre = utilisateur(), utilisateur()
+    attribution = UtilisateurRole(id_utilisateur=user.id_utilisateur, app_id=1, role_id=1, creer_par=1, modifier_par=1)
+    db.session.add(attribution)
+    db.session.commit()
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 1
+
+    # Colonnes d'audit : sans effet sur les droits
+    attribution.modifier_par = 2
+    db.session.commit()
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 1
+
+    # Rôle transféré à un autre utilisateur : l'ancien et le nouveau titulaire sont révoqués
+    attribution.id_utilisateur = autre.id_utilisateur
+    db.session.commit()
+    assert db.session.get(Utilisateur, user.id_utilisateur).security_epoch == 2
+    assert db.session.get(Utilisateur, autre.id_utilisateur).security_epoch == 1
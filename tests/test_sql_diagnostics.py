@@ -0,0 +1,68 @@
+import pytest
+from flask import Response
+from sqlalchemy import select
+from app import db
+from app.common.decorators import query_budget
+from app.common.models import Role, Trace, UtilisateurRole
+from app.common.services.fonction_registry_service import FonctionRegistryService
+from app.common.services.sql_diagnostics_service import QueryBudgetExceeded, sql_diagnostics
+
+
+def test_budget_depasse_leve_query_budget_exceeded(app):
+    @query_budget(2)
+    def vue():
+        for _ in range(3):
+            db.session.execute(select(1))
+
+    with app.test_request_context('/api/diagnostic'):
+        sql_diagnostics._debut()
+        vue()
+        with pytest.raises(QueryBudgetExceeded, match=r'Budget de requêtes SQL dépassé : 3 > 2'):
+            sql_diagnostics._fin(Response())
+
+
+def test_chargement_paresseux_dans_une_boucle_signale_comme_n_plus_un(app):
+    audit = dict(creer_par=1, modifier_par=1)
+    db.session.add_all([Role(nom=f"role{i}", description='', app_id=1, **audit) for i in range(12)])
+    db.session.commit()
+
+    with app.test_request_context('/api/diagnostic'):
+        sql_diagnostics._debut()
+        # Une requête par rôle pour ses role_permissions
+        assert all(role.role_permissions == [] for role in Role.query.all())
+        with pytest.raises(QueryBudgetExceeded, match=r'N\+1 probable : 12 exécutions de SELECT .* FROM role_permission'):
+            sql_diagnostics._fin(Response())
+
+
+def test_roles_d_une_application_dans_leur_budget(client, token, grille_rbac):
+    # Sans chargement groupé des permissions, le mode strict lèverait QueryBudgetExceeded (N+1)
+    FonctionRegistryService().sync()
+    audit = dict(creer_par=1, modifier_par=1)
+    db.session.add_all([Role(nom=f"role{i}", description='', app_id=1, **audit) for i in range(12)])
+    db.session.commit()
+    entete = {'Authorization': f"Bearer {token(grille_rbac['utilisateurs']['cumul'])}"}
+    db.session.remove()
+
+    reponse = client.get('/api/roles/application/1', headers=entete)
+
+    assert reponse.status_code == 200
+    assert len(reponse.get_json()['data']['items']) == 10
+
+
+def test_traces_de_nombreux_utilisateurs_dans_leur_budget(client, utilisateur, token, grille_rbac):
+    # Utilisateurs des traces sérialisés avec leurs rôles et permissions : chargés par lots
+    FonctionRegistryService().sync()
+    role = grille_rbac['roles']['editeur']
+    audit = dict(creer_par=1, modifier_par=1)
+    for _ in range(10):
+        compte = utilisateur()
+        db.session.add(UtilisateurRole(id_utilisateur=compte.id_utilisateur, role_id=role.role_id, app_id=role.app_id, **audit))
+        db.session.add(Trace(action='LECTURE', id_utilisateur=compte.id_utilisateur))
+    db.session.commit()
+    entete = {'Authorization': f"Bearer {token(grille_rbac['utilisateurs']['cumul'])}"}
+    db.session.remove()
+
+    reponse = client.get('/api/traces/', headers=entete)
+
+    assert reponse.status_code == 200
+    assert all(trace['utilisateur']['utilisateur_roles'] for trace in reponse.get_json()['data'])
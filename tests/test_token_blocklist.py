@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from app import db
+from app.common.models import TokenBlocklist
+from app.common.services.cache_version_service import cache_versions
+from app.common.services.token_blocklist_service import token_blocklist
+from app.common.utils.bloom_filter import BloomFilter
+
+
+def test_filtre_de_bloom_sans_faux_negatif():
+    filtre = BloomFilter(1000)
+    for numero in range(1000):
+        filtre.add(f"jti-{numero}")
+
+    assert all(f"jti-{numero}" in filtre for numero in range(1000))
+    faux_positifs = sum(f"autre-{numero}" in filtre for numero in range(10000))
+    # Taux visé 0,1 % : large marge pour un test déterministe
+    assert faux_positifs < 100
+
+
+def test_token_non_revoque_valide_sans_requete():
+    token_blocklist.refresh()
+    verifications = token_blocklist.verifications_base
+
+    assert token_blocklist.is_revoked('jamais-revoque') is False
+    assert token_blocklist.verifications_base == verifications
+
+
+def test_revocation_confirmee_en_base():
+    token_blocklist.revoke('jti-revoque', datetime.utcnow() + timedelta(hours=1), type_token='access')
+
+    assert token_blocklist.is_revoked('jti-revoque') is True
+    # Deuxième révocation du même token : ignorée
+    token_blocklist.revoke('jti-revoque', datetime.utcnow() + timedelta(hours=1))
+    assert TokenBlocklist.query.filter_by(jti='jti-revoque').count() == 1
+
+
+def test_revocation_d_un_autre_processus_vue_apres_invalidation():
+    token_blocklist.refresh()
+    # Révocation écrite par un autre worker : absente du filtre de ce processus
+    with db.engine.begin() as connection:
+        connection.execute(TokenBlocklist.__table__.insert().values(
+            jti='jti-autre-worker', type_token='access', expire_a=datetime.utcnow() + timedelta(hours=1),
+            creer_a=datetime.utcnow()
+        ))
+    assert token_blocklist.is_revoked('jti-autre-worker') is False
+
+    # Domaine 'revocations' relu dans cache_version : seules les nouvelles entrées sont ajoutées
+    cache_versions.notify_local(['revocations'])
+    assert token_blocklist.is_revoked('jti-autre-worker') is True
+
+
+def test_logout_revoque_le_token(client, utilisateur, token):
+    jeton = token(utilisateur())
+    entete = {'Authorization': f"Bearer {jeton}"}
+    assert client.get('/api/pages/me', headers=entete).status_code == 200
+
+    assert client.post('/api/auth/logout', headers=entete).status_code == 200
+
+    reponse = client.get('/api/pages/me', headers=entete)
+    assert reponse.status_code == 401
+    assert reponse.get_json()['error'] is True
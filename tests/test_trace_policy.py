@@ -0,0 +1,64 @@
+import json
+from unittest import mock
+import pytest
+from app.common.models import Trace
+from app.common.services.trace_policy_service import (
+    AGGREGATE, KEEP, SAMPLE, SKIP, parse_decision, parse_key, trace_policy
+)
+
+
+@pytest.fixture
+def politiques(app):
+    """Remplace TRACE_POLICIES le temps d'un test"""
+    precedentes = app.config['TRACE_POLICIES']
+
+    def definir(valeurs):
+        app.config['TRACE_POLICIES'] = json.dumps(valeurs)
+        trace_policy.invalidate()
+    yield definir
+    app.config['TRACE_POLICIES'] = precedentes
+    trace_policy.invalidate()
+
+
+def test_parse_decision_et_cle():
+    assert parse_decision('keep') == (KEEP, 1.0)
+    assert parse_decision('sample:0.05') == (SAMPLE, 0.05)
+    assert parse_decision('aggregate') == (AGGREGATE, 0.0)
+    with pytest.raises(ValueError):
+        parse_decision('sample:2')
+    assert parse_key('TRACE::get') == ('TRACE', '*', 'GET', '*')
+
+
+def test_la_cle_la_plus_precise_l_emporte(politiques):
+    politiques({'TRACE:*:GET': 'aggregate', 'TRACE:TRC:GET:2xx': 'keep'})
+
+    assert trace_policy.decide('TRACE', 'TRC', 'GET', 200) == (KEEP, 1.0)
+    assert trace_policy.decide('TRACE', 'AUTRE', 'GET', 200) == (AGGREGATE, 0.0)
+
+
+def test_ecritures_et_erreurs_toujours_tracees(politiques):
+    politiques({'*': 'aggregate'})
+
+    assert trace_policy.decide('ROLE', 'ROL', 'POST', 201) == (KEEP, 1.0)
+    assert trace_policy.decide('ROLE', 'ROL', 'GET', 500) == (KEEP, 1.0)
+    assert trace_policy.decide('ROLE', 'ROL', 'GET', 200) == (AGGREGATE, 0.0)
+
+
+def test_echantillonnage(politiques):
+    politiques({'TRACE:*:GET': 'sample:0.25'})
+
+    with mock.patch('app.common.services.trace_policy_service.random.random', return_value=0.1):
+        assert trace_policy.decide('TRACE', 'TRC', 'GET', 200) == (KEEP, 0.25)
+    with mock.patch('app.common.services.trace_policy_service.random.random', return_value=0.9):
+        assert trace_policy.decide('TRACE', 'TRC', 'GET', 200) == (SKIP, 0.25)
+
+
+def test_agregats_ecrits_en_une_trace():
+    for id_utilisateur in (1, 2, 2):
+        trace_policy.aggregate('TRACE_GET', 'TRC_GET', '/api/traces', 200, id_utilisateur)
+    trace_policy.flush_aggregates(force=True)
+
+    trace = Trace.query.filter_by(code='TRC_GET_AGG').one()
+    param = json.loads(trace.param)
+    assert (param['count'], param['utilisateurs']) == (3, 2)
+    assert trace.id_utilisateur is None
@@ -0,0 +1,83 @@
+import json
+from datetime import datetime
+from app import db
+from app.common.models import Trace, TraceRollup
+from app.common.services.trace_rollup_service import increments, trace_rollup
+
+
+def test_increments_ponderes():
+    heure = datetime(2026, 1, 1, 10)
+    lignes = [
+        {'date': heure.replace(minute=5), 'action': 'A', 'param': json.dumps({'status': 200})},
+        {'date': heure.replace(minute=6), 'action': 'A', 'param': json.dumps({'aggregate': True, 'count': 7})},
+        {'date': heure.replace(minute=7), 'action': 'A', 'param': json.dumps({'status': 200, 'sample_rate': 0.1})},
+        {'date': heure.replace(minute=8), 'action': 'A', 'code': 'X_ERROR'},
+        {'date': heure.replace(minute=9), 'action': 'A', 'param': json.dumps({'status': 404})},
+    ]
+
+    assert increments(lignes) == {(heure, 'A', '', 0): [1 + 7 + 10 + 1 + 1, 2]}
+
+
+def test_upsert_cumule_les_agregats():
+    heure = datetime(2026, 1, 1, 10)
+    for _ in range(2):
+        with db.engine.begin() as connection:
+            trace_rollup.apply(connection, {(heure, 'A', '/api', 1): [3, 1]})
+
+    agregat = TraceRollup.query.one()
+    assert (agregat.nombre, agregat.erreurs) == (6, 2)
+
+
+def test_rebuild_conserve_les_heures_archivees():
+    # Agrégat d'une heure dont les traces sont archivées (absentes de la table trace)
+    db.session.add(TraceRollup(heure=datetime(2026, 1, 1, 9), action='ARCHIVE', end_point='', id_utilisateur=0,
+                               nombre=50, erreurs=0))
+    db.session.add_all([
+        Trace(date=datetime(2026, 1, 2, 10, minute), action='A', end_point='/api') for minute in (1, 2)
+    ])
+    db.session.commit()
+
+    assert trace_rollup.rebuild() == {'traces': 2, 'agregats': 1}
+    agregats = {(agregat.heure, agregat.action): agregat.nombre for agregat in TraceRollup.query.all()}
+    assert agregats == {(datetime(2026, 1, 1, 9), 'ARCHIVE'): 50, (datetime(2026, 1, 2, 10), 'A'): 2}
+
+
+def test_stats_par_jour_et_par_action():
+    with db.engine.begin() as connection:
+        trace_rollup.apply(connection, {
+            (datetime(2026, 1, 1, 9), 'A', '', 0): [2, 0],
+            (datetime(2026, 1, 1, 15), 'A', '', 0): [3, 1],
+            (datetime(2026, 1, 1, 15), 'B', '', 0): [4, 0],
+        })
+
+    par_action = sorted(trace_rollup.stats(granularite='day', group_by=['action']), key=lambda ligne: ligne['action'])
+    assert par_action == [
+        {'periode': '2026-01-01T00:00:00', 'action': 'A', 'nombre': 5, 'erreurs': 1},
+        {'periode': '2026-01-01T00:00:00', 'action': 'B', 'nombre': 4, 'erreurs': 0},
+    ]
+    assert trace_rollup.top('action', limit=1) == [{'action': 'A', 'nombre': 5, 'erreurs': 1}]
+
+
+def test_agregats_par_modele_de_route(client, utilisateur, token):
+    entete = {'Authorization': f"Bearer {token(utilisateur(profil='Administrateur'))}"}
+    for app_id in (101, 102, 103):
+        client.get(f'/api/applications/{app_id}', headers=entete)
+
+    traces = Trace.query.filter(Trace.end_point.like('/api/applications/10%')).all()
+    assert {trace.route for trace in traces} == {'/api/applications/<int:id>'}
+    agregats = TraceRollup.query.filter(TraceRollup.end_point.like('/api/applications%')).all()
+    assert [(agregat.end_point, agregat.nombre) for agregat in agregats] == [('/api/applications/<int:id>', 3)]
+
+
+def test_rebuild_rattache_les_traces_sans_route_a_leur_route():
+    # Traces écrites avant la colonne route : seul le chemin est connu
+    db.session.add_all([
+        Trace(date=datetime(2026, 1, 2, 10, 5), action='APPLICATION_GET', end_point=f'/api/applications/{app_id}')
+        for app_id in (1, 2)
+    ] + [Trace(date=datetime(2026, 1, 2, 10, 6), action='AUTRE', end_point='/hors/application')])
+    db.session.commit()
+
+    trace_rollup.rebuild()
+
+    agregats = {agregat.end_point: agregat.nombre for agregat in TraceRollup.query.all()}
+    assert agregats == {'/api/applications/<int:id>': 2, '/hors/application': 1}